@@ -1,18 +1,46 @@
 # System parameters
+from .pv_system import PVSystem
+from .pv_system import PVSite
+from .pv_system import PanelArray
+# fleet engine
+from .fleet_engine import Fleet
+from .fleet_engine import simulate_fleet
+from .fleet_engine import simulate_fleet_df
+# output formats
+from .output_formats import convert_output
+from .output_formats import write_parquet
 
 # debug
 from .pv_forecaster import force_clear_fmi_cache
+from .pv_forecaster import get_fmi_cache_stats
+from .pv_forecaster import set_profiling
+from .pv_forecaster import get_profiling_stats
 from .pv_forecaster import get_clearsky_estimate_for_interval
+from .pv_forecaster import get_clearsky_estimate_chunks
+from .pv_forecaster import write_clearsky_estimate_for_interval
 # Forecast functions
 from .pv_forecaster import get_default_fmi_forecast
 from .pv_forecaster import get_fmi_forecast_at_interpolated_time
+from .pv_forecaster import get_fmi_forecast_at_interpolated_times
+from .pv_forecaster import get_default_fmi_forecast_for_site
+from .pv_forecaster import get_clearsky_estimate_for_interval_for_site
 from .pv_forecaster import get_fmi_forecast_for_interval
 from .pv_forecaster import get_default_clearsky_forecast
+from .pv_forecaster import get_default_clearsky_estimate
 from .pv_forecaster import get_fmi_radiation_forecast
+from .pv_forecaster import get_fmi_radiation_forecast_for_sites
+from .pv_forecaster import async_get_default_fmi_forecast
+from .pv_forecaster import async_get_fmi_radiation_forecast
 # external usage
 from .pv_forecaster import process_radiation_df
+from .pv_forecaster import process_radiation_df_for_site
+from .pv_forecaster import interpolate_to_times
 from .pv_forecaster import set_angles
 from .pv_forecaster import set_cache
+from .pv_forecaster import set_disk_cache
+from .pv_forecaster import set_ephemeris_cache
+from .pv_forecaster import set_clearsky_engine
+from .pv_forecaster import set_solar_position_backend
 from .pv_forecaster import set_default_air_temp
 # clearsky system parameters
 from .pv_forecaster import set_default_albedo
@@ -21,12 +49,20 @@ from .pv_forecaster import set_default_wind_speed
 from .pv_forecaster import set_extended_output
 from .pv_forecaster import set_location
 from .pv_forecaster import set_snow_sliding
+from .pv_forecaster import set_precision
 # optional system parameters
 from .pv_forecaster import set_module_elevation
 from .pv_forecaster import set_nominal_power_kw
 
 __all__ = [
     # system parameters
+    "PVSystem",
+    "PVSite",
+    "PanelArray",
+    # fleet engine
+    "Fleet",
+    "simulate_fleet",
+    "simulate_fleet_df",
     "set_angles",
     "set_location",
     "set_nominal_power_kw",
@@ -42,21 +78,42 @@ __all__ = [
     # forecast functions
     "get_default_fmi_forecast",
     "get_clearsky_estimate_for_interval",
+    "get_clearsky_estimate_chunks",
+    "write_clearsky_estimate_for_interval",
     "get_fmi_forecast_for_interval",
     "get_fmi_forecast_at_interpolated_time",
+    "get_fmi_forecast_at_interpolated_times",
+    "get_default_fmi_forecast_for_site",
+    "get_clearsky_estimate_for_interval_for_site",
     "get_default_clearsky_forecast",
+    "get_default_clearsky_estimate",
     "get_fmi_radiation_forecast",
+    "get_fmi_radiation_forecast_for_sites",
+    "async_get_default_fmi_forecast",
+    "async_get_fmi_radiation_forecast",
 
     # toggles
     "set_extended_output",
     "set_cache",
+    "set_disk_cache",
+    "set_ephemeris_cache",
+    "set_clearsky_engine",
+    "set_solar_position_backend",
     "set_snow_sliding",
+    "set_precision",
 
     # external usage
     "process_radiation_df",
+    "process_radiation_df_for_site",
+    "interpolate_to_times",
+    "convert_output",
+    "write_parquet",
 
     # debug
-    "force_clear_fmi_cache"
+    "force_clear_fmi_cache",
+    "get_fmi_cache_stats",
+    "set_profiling",
+    "get_profiling_stats"
 ]
 
 __version__ = "0.1.0"
@@ -0,0 +1,144 @@
+"""
+This file contains an asyncio version of the FMI open data retrieval in meps_loader.py.
+
+meps_loader.collect_fmi_opendata() blocks while fmiopendata downloads the forecast. Async applications, such as web
+servers running on aiohttp, would have to run every forecast in a thread executor. The functions here download the
+forecast with aiohttp instead:
+
+- All requests share a pooled HTTP session.
+- At most max_concurrent_requests requests are made at the same time, extra requests wait for their turn.
+- Each request has a timeout of request_timeout_seconds.
+- Concurrent requests for the same site and weather model run are coalesced, only the first caller makes a server call
+and the rest wait for its result.
+
+Forecasts are stored in the same caches as forecasts retrieved with meps_loader, so sync and async callers share
+cached forecasts.
+
+Requires aiohttp, which is an optional dependency: pip install aiohttp
+"""
+
+import asyncio
+
+from fmi_pv_forecaster import meps_loader
+from fmi_pv_forecaster import profiling
+from fmi_pv_forecaster import wfs_parser
+
+# maximum number of simultaneous FMI requests
+max_concurrent_requests = 8
+
+# timeout for a single FMI request
+request_timeout_seconds = 30
+
+# shared session and request state, created for the running event loop on first use
+__session = None
+__semaphore = None
+__event_loop = None
+
+# cache key -> asyncio.Task of a request in progress
+__in_flight = {}
+
+
+async def async_collect_fmi_opendata(latitude: float, longitude: float, start_time, end_time):
+    """
+    Async version of meps_loader.collect_fmi_opendata().
+    :param latitude:  wgs84 latitude of the pv system
+    :param longitude: wgs84 longitude of the pv system
+    :param start_time:  2013-03-05T12:00:00Z ISO TIME
+    :param end_time:    2013-03-05T12:00:00Z ISO TIME
+    :return: Pandas dataframe with columns ["dni", "dhi", "ghi", "albedo", "T", "wind", "cloud_cover"]
+    """
+
+    cache_key = meps_loader.__get_cache_key(latitude, longitude)
+
+    if meps_loader.cache_enabled:
+        cached_data = meps_loader.__read_cache(cache_key, start_time, end_time)
+
+        if cached_data is not None:
+            return cached_data
+
+    task = __in_flight.get(cache_key)
+
+    if task is None:
+        task = asyncio.ensure_future(__download_and_cache(cache_key, latitude, longitude, start_time, end_time))
+        __in_flight[cache_key] = task
+        task.add_done_callback(lambda done_task: __in_flight.pop(cache_key, None))
+    else:
+        print("Joined an FMI server call in progress.")
+
+    # shielded so that a cancelled caller does not cancel the request other callers are waiting for
+    return await asyncio.shield(task)
+
+
+async def close_session():
+    """
+    Closes the shared HTTP session. Call before the event loop is closed, a new session is created if needed.
+    """
+    global __session
+
+    if __session is not None and not __session.closed:
+        await __session.close()
+
+    __session = None
+
+
+async def __download_and_cache(cache_key, latitude, longitude, start_time, end_time):
+    # includes time spent waiting for a free request slot
+    with profiling.stage("fmi_download", 1):
+        xml = await __download_xml([(latitude, longitude)], start_time, end_time)
+
+    print("Server call done.")
+
+    with profiling.stage("fmi_parse", 1):
+        coverage = wfs_parser.parse_multipointcoverage(xml)
+
+    if len(coverage) == 0:
+        meps_loader.__raise_no_data_error()
+
+    times, columns = coverage.get_location(coverage.location_names[0])
+
+    with profiling.stage("fmi_processing", len(times)):
+        df = meps_loader.__fmi_columns_to_df(times, columns, latitude, longitude)
+
+    if meps_loader.cache_enabled:
+        meps_loader.__write_cache(cache_key, df, start_time, end_time)
+
+    return df
+
+
+async def __download_xml(sites, start_time, end_time) -> bytes:
+    """
+    Downloads the multipointcoverage response for given sites using the shared session.
+    """
+    import aiohttp
+
+    session, semaphore = __get_session()
+
+    url = meps_loader.__get_query_url(sites, start_time, end_time)
+
+    async with semaphore:
+        async with session.get(url, timeout=aiohttp.ClientTimeout(total=request_timeout_seconds)) as response:
+            response.raise_for_status()
+            return await response.read()
+
+
+def __get_session():
+    """
+    Returns the shared session and concurrency limiting semaphore for the running event loop.
+    """
+    global __session, __semaphore, __event_loop
+
+    try:
+        import aiohttp
+    except ImportError:
+        raise ImportError("Async FMI forecasts require aiohttp, install it with: pip install aiohttp")
+
+    event_loop = asyncio.get_running_loop()
+
+    if __session is None or __session.closed or __event_loop is not event_loop:
+        # sessions can not be shared between event loops, connections of the old loop are left for it to clean up
+        __session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=max_concurrent_requests))
+        __semaphore = asyncio.Semaphore(max_concurrent_requests)
+        __event_loop = event_loop
+        __in_flight.clear()
+
+    return __session, __semaphore
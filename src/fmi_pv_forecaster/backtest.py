@@ -0,0 +1,365 @@
+"""
+This file contains a backtest runner which replays archived FMI forecasts through the PV model.
+
+Forecast skill is evaluated over long archives of past weather model runs. Calling get_default_fmi_forecast() for
+each archived run does not work for this, it always asks FMI for the latest run and the results depend on global
+settings and caches. Here each archived run is read from files, turned into radiation dataframes with the same
+processing as live FMI data and simulated with process_radiation_df() for every given PVSystem. Nothing is read from
+or written to the FMI caches and no global settings are changed.
+
+Archive directories can contain, in any subdirectory structure:
+- FMI multipointcoverage responses as .xml files. One file can contain any number of sites, and one run can be split
+into multiple files.
+- Processed radiation dataframes as .npz files written by disk_cache.py, one site per file. Disk cache file names
+contain the site coordinates and the model run, so a disk cache directory can be used as an archive as is.
+
+The model run of each file is read from its file name, which has to contain the run time as YYYYMMDDHH or YYYYMMDDTHH,
+for example "meps_2025060106.xml". Files are grouped into runs by this time. Other files are ignored.
+
+Each system is matched to the nearest archived location of a run, locations further than max_location_distance
+degrees away are not used. Systems without a location in a run produce no rows for that run.
+
+Output is a long table with one row per run, site and forecast time:
+time: forecast time, index. FMI rows are timed at the middle of their hour, see meps_loader.fmi_index_shift.
+model_run: model run time, UTC
+site: site id, index of the system in the systems list unless site ids are given
+horizon_hours: hours from model run to the end of the hour the row represents, 1 for the first forecast hour
+output columns: "output" by default, see process_radiation_df()
+
+Runs are processed in parallel in a process pool. Only a limited number of runs are in progress at once and results
+are written to file in model run order as soon as they are ready, so memory use does not grow with archive length.
+
+Example:
+runs = backtest.find_archived_runs("/data/meps_archive")
+rows = backtest.run_backtest(runs, systems, "backtest.parquet", max_workers=8)
+"""
+
+import collections
+import logging
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy
+import pandas
+
+from fmi_pv_forecaster import disk_cache as disk_cache_module
+from fmi_pv_forecaster import meps_loader
+from fmi_pv_forecaster import pv_forecaster
+from fmi_pv_forecaster import stream_writer
+from fmi_pv_forecaster import upsampling as upsampling_module
+from fmi_pv_forecaster import wfs_parser
+
+# file extension -> archive file format
+archive_formats = {".xml": "xml", ".npz": "npz"}
+
+# systems further than this from every archived location of a run are left out of the run, degrees. MEPS grid spacing
+# is 2.5km, roughly 0.02 to 0.05 degrees in Finland
+max_location_distance = 0.1
+
+logger = logging.getLogger(__name__)
+
+# model run time in file names, 2025060106 or 20250601T06
+__model_run_pattern = re.compile(r"(?<!\d)(\d{8})T?(\d{2})(?!\d)")
+
+# site coordinates of disk cache file names, see disk_cache.DiskCache.path_for()
+__disk_cache_site_pattern = re.compile(r"^fmi_(-?\d+\.\d+)_(-?\d+\.\d+)_")
+
+
+class ArchivedRun:
+    """
+    Archived files of a single weather model run.
+
+    Attributes:
+    model_run: model run time as a timezone naive UTC pandas Timestamp
+    paths: list of archive file paths
+    """
+
+    def __init__(self, model_run, paths):
+        self.model_run = pandas.Timestamp(model_run)
+        self.paths = list(paths)
+
+    def __repr__(self):
+        return "ArchivedRun(" + str(self.model_run) + ", " + str(len(self.paths)) + " files)"
+
+
+def find_archived_runs(directory, start_time=None, end_time=None) -> list:
+    """
+    Finds archived forecast files in directory and its subdirectories and groups them by model run.
+    :param directory: Archive directory.
+    :param start_time: Optional first model run to include, timezone naive UTC.
+    :param end_time: Optional last model run to include, timezone naive UTC.
+    :return: List of ArchivedRuns in model run order.
+    """
+
+    if not os.path.isdir(directory):
+        raise ValueError("Archive directory " + str(directory) + " does not exist.")
+
+    paths_by_run = {}
+
+    for root, directories, filenames in os.walk(directory):
+        # sorted so that the files of a run are always in the same order
+        directories.sort()
+
+        for filename in sorted(filenames):
+            if os.path.splitext(filename)[1].lower() not in archive_formats:
+                continue
+
+            model_run = get_model_run(filename)
+            if start_time is not None and model_run < pandas.Timestamp(start_time):
+                continue
+            if end_time is not None and model_run > pandas.Timestamp(end_time):
+                continue
+
+            paths_by_run.setdefault(model_run, []).append(os.path.join(root, filename))
+
+    return [ArchivedRun(model_run, paths_by_run[model_run]) for model_run in sorted(paths_by_run)]
+
+
+def get_model_run(filename) -> pandas.Timestamp:
+    """
+    Returns the model run time in an archive file name, see module docstring.
+    """
+    match = __model_run_pattern.search(os.path.basename(str(filename)))
+
+    if match is None:
+        raise ValueError("Can not tell model run time from file name " + str(filename) + ", file name should contain "
+                         "the model run as YYYYMMDDHH or YYYYMMDDTHH.")
+
+    return pandas.Timestamp(match.group(1) + "T" + match.group(2))
+
+
+def backtest_run(run: ArchivedRun, systems: list, site_ids=None, columns=None, interpolate=False,
+                 upsampling="linear", max_horizon_hours=None) -> pandas.DataFrame:
+    """
+    Simulates every system with the forecast of a single archived run.
+    :param run: ArchivedRun.
+    :param systems: List of PVSystems.
+    :param site_ids: Optional list of site ids, one per system. Indices of systems are used if not given.
+    :param columns: List of output columns, ["output"] if not given.
+    :param interpolate: False or a pandas frequency string such as "15min", see get_default_fmi_forecast().
+    :param upsampling: Interpolation method when interpolate is set, "linear" or "clearsky_index".
+    :param max_horizon_hours: Optional longest horizon to include. Hours which end at or before the model run are always
+    left out.
+    :return: Long dataframe of the run, see module docstring.
+    """
+
+    if site_ids is None:
+        site_ids = list(range(len(systems)))
+    if len(site_ids) != len(systems):
+        raise ValueError("Got " + str(len(site_ids)) + " site ids for " + str(len(systems)) + " systems.")
+
+    if columns is None:
+        columns = ["output"]
+
+    radiation_dfs = __load_radiation_dfs(run, systems)
+
+    outputs = []
+    for system, site_id, data in zip(systems, site_ids, radiation_dfs):
+        if data is None:
+            continue
+
+        horizon_hours = __get_horizon_hours(data.index, run.model_run)
+        in_horizon = horizon_hours > 0
+        if max_horizon_hours is not None:
+            in_horizon &= horizon_hours <= max_horizon_hours
+        data = data[in_horizon]
+
+        if len(data) < 2:
+            continue
+
+        geometry = None
+        if interpolate is not False:
+            data, geometry = upsampling_module.upsample_radiation(data, interpolate, system.latitude, system.longitude,
+                                                                  upsampling, return_geometry=True)
+
+        output = pv_forecaster.process_radiation_df(data, system, columns=columns, inplace=True, geometry=geometry)
+        output.insert(0, "model_run", run.model_run)
+        output.insert(1, "site", site_id)
+        output.insert(2, "horizon_hours", __get_horizon_hours(output.index, run.model_run))
+        outputs.append(output)
+
+    if len(outputs) == 0:
+        return __empty_output(columns)
+
+    result = pandas.concat(outputs)
+    result.index.name = "time"
+    return result
+
+
+def iter_backtest(runs, systems: list, site_ids=None, columns=None, interpolate=False, upsampling="linear",
+                  max_horizon_hours=None, max_workers=None, runs_in_progress=None, skip_errors=False,
+                  mp_context=None):
+    """
+    Generator version of the backtest, yields the output dataframe of each run in model run order. Runs without any
+    rows are not yielded.
+    :param runs: List of ArchivedRuns or an archive directory.
+    :param systems: List of PVSystems.
+    :param site_ids, columns, interpolate, upsampling, max_horizon_hours: See backtest_run().
+    :param max_workers: Number of worker processes, os.cpu_count() if None. 1 runs everything in the calling process.
+    :param runs_in_progress: Maximum number of runs being processed or waiting to be yielded, limits memory use.
+    2 * max_workers if not given.
+    :param skip_errors: True -> runs whose files can not be read or processed are logged and skipped. False -> errors
+    are raised.
+    :param mp_context: Optional multiprocessing context, for example multiprocessing.get_context("spawn").
+    """
+
+    if not isinstance(runs, (list, tuple)):
+        runs = find_archived_runs(runs)
+
+    for system in systems:
+        system.check_location()
+        system.check_angles()
+
+    arguments = (systems, site_ids, columns, interpolate, upsampling, max_horizon_hours)
+
+    if max_workers == 1 or len(runs) <= 1:
+        for run in runs:
+            output = __run_or_skip(lambda: backtest_run(run, *arguments), run, skip_errors)
+            if output is not None and len(output) > 0:
+                yield output
+        return
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    if runs_in_progress is None:
+        runs_in_progress = 2 * max_workers
+    if runs_in_progress < 1:
+        raise ValueError("runs_in_progress should be 1 or more, got " + str(runs_in_progress))
+
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=mp_context) as executor:
+        pending = collections.deque()
+        next_run = 0
+
+        while next_run < len(runs) or len(pending) > 0:
+            # keeping a bounded number of runs in progress, results are yielded in submission order
+            while next_run < len(runs) and len(pending) < runs_in_progress:
+                pending.append((runs[next_run], executor.submit(backtest_run, runs[next_run], *arguments)))
+                next_run += 1
+
+            run, future = pending.popleft()
+            output = __run_or_skip(future.result, run, skip_errors)
+            if output is not None and len(output) > 0:
+                yield output
+
+
+def run_backtest(runs, systems: list, path, file_format=None, **kwargs) -> int:
+    """
+    Runs the backtest and streams the output to a file, one run at a time. Existing file is overwritten.
+    :param runs: List of ArchivedRuns or an archive directory.
+    :param systems: List of PVSystems.
+    :param path: Output file path.
+    :param file_format: "csv" or "parquet", read from file extension if not given. Each run becomes one parquet row
+    group.
+    :param kwargs: Passed to iter_backtest().
+    :return: Number of rows written.
+    """
+    return stream_writer.write_chunks(iter_backtest(runs, systems, **kwargs), path, file_format)
+
+
+def __run_or_skip(function, run, skip_errors):
+    """
+    Returns function(), or None if it raises and skip_errors is set.
+    """
+    if not skip_errors:
+        return function()
+
+    try:
+        return function()
+    except Exception as error:
+        logger.warning("Skipping model run %s: %s", run.model_run, error)
+        return None
+
+
+def __load_radiation_dfs(run: ArchivedRun, systems: list) -> list:
+    """
+    Reads the radiation dataframe of each system from the files of a run.
+    :return: List of dataframes in the same order as systems, None for systems without an archived location.
+    """
+
+    radiation_dfs = [None] * len(systems)
+
+    system_coordinates = numpy.array([[system.latitude, system.longitude] for system in systems], dtype=float)
+
+    for path in run.paths:
+        missing = [i for i, data in enumerate(radiation_dfs) if data is None]
+        if len(missing) == 0:
+            break
+
+        if archive_formats[os.path.splitext(path)[1].lower()] == "xml":
+            __read_xml(path, systems, system_coordinates, missing, radiation_dfs)
+        else:
+            __read_npz(path, system_coordinates, missing, radiation_dfs)
+
+    return radiation_dfs
+
+
+def __read_xml(path, systems, system_coordinates, missing, radiation_dfs):
+    """
+    Fills radiation_dfs of missing systems from an FMI multipointcoverage response.
+    """
+
+    coverage = wfs_parser.parse_multipointcoverage(path)
+    if len(coverage) == 0:
+        return
+
+    location_coordinates = numpy.column_stack([coverage.latitudes, coverage.longitudes])
+
+    # (location name, latitude, longitude) -> dataframe, systems at the same place share the processed dataframe
+    processed = {}
+
+    for i in missing:
+        distances = numpy.hypot(*(location_coordinates - system_coordinates[i]).T)
+        nearest = int(numpy.argmin(distances))
+        if distances[nearest] > max_location_distance:
+            continue
+
+        key = (coverage.location_names[nearest], systems[i].latitude, systems[i].longitude)
+        if key not in processed:
+            times, columns = coverage.get_location(key[0])
+            processed[key] = meps_loader.__fmi_columns_to_df(times, columns, systems[i].latitude,
+                                                             systems[i].longitude)
+
+        radiation_dfs[i] = processed[key]
+
+
+def __read_npz(path, system_coordinates, missing, radiation_dfs):
+    """
+    Fills radiation_dfs of missing systems from a disk cache file.
+    """
+
+    match = __disk_cache_site_pattern.search(os.path.basename(path))
+    if match is None:
+        raise ValueError("Can not tell site coordinates from file name " + str(path) + ", .npz archive files should "
+                         "be named like disk cache files.")
+
+    site_coordinates = numpy.array([float(match.group(1)), float(match.group(2))])
+    distances = numpy.hypot(*(system_coordinates[missing] - site_coordinates).T)
+
+    matching = [i for i, distance in zip(missing, distances) if distance <= max_location_distance]
+    if len(matching) == 0:
+        return
+
+    data = disk_cache_module.read_dataframe(path)[0]
+    for i in matching:
+        radiation_dfs[i] = data
+
+
+def __get_horizon_hours(index: pandas.DatetimeIndex, model_run: pandas.Timestamp) -> numpy.ndarray:
+    """
+    Hours from model run to the end of the hour each row represents, undoing the FMI index shift.
+    """
+    if index.tz is not None:
+        index = index.tz_convert("UTC").tz_localize(None)
+
+    return ((index - meps_loader.fmi_index_shift - model_run) / pandas.Timedelta(hours=1)).to_numpy(dtype=float)
+
+
+def __empty_output(columns) -> pandas.DataFrame:
+    output = pandas.DataFrame({"model_run": pandas.Series(dtype="datetime64[ns]"),
+                               "site": pandas.Series(dtype=object),
+                               "horizon_hours": pandas.Series(dtype=float)},
+                              index=pandas.DatetimeIndex([], name="time"))
+    for column in columns:
+        output[column] = pandas.Series(dtype=float)
+    return output
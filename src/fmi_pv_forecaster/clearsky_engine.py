@@ -0,0 +1,267 @@
+"""
+This file contains a per-site clear sky irradiance engine.
+
+pvlib Location.get_clearsky() looks up site altitude and Linke turbidity from data files shipped with pvlib on every
+call, and computes every requested timestamp again. Clear sky baselines are requested for the same sites over and over
+with mostly the same timestamps, so this engine keeps per site:
+- altitude and the 12 monthly Linke turbidity values, looked up once
+- already computed clear sky rows, requests only compute timestamps which have not been computed before
+
+The Linke turbidity climatology is a gzip compressed HDF5 file. By default the file is opened once and kept open, and
+only the monthly values of each new site are read from it. Alternatively turbidity_file can point to an uncompressed
+.npy copy of the climatology, 112MB. The copy is written on first use if it does not exist and is then memory-mapped,
+so it is loaded by the operating system only once even when many worker processes use it.
+
+Clear sky model is Ineichen-Perez with daily interpolated Linke turbidity and solar position from
+astronomical_calculations, same as pvlib Location.get_clearsky() with its defaults.
+"""
+
+import calendar
+import os
+import threading
+from collections import OrderedDict
+
+import h5py
+import numpy
+import pandas
+import pvlib
+from pvlib import atmosphere, clearsky, location
+
+from fmi_pv_forecaster.helpers import astronomical_calculations
+
+default_turbidity_path = os.path.join(os.path.dirname(pvlib.__file__), "data", "LinkeTurbidities.h5")
+
+# turbidity grid, 1/12 degree steps from 90N to 90S and from 180W to 180E
+turbidity_grid_steps_per_degree = 12
+
+
+def month_middles(year) -> numpy.ndarray:
+    """
+    Returns the middle day of year of each month, with december of the previous year and january of the next year at
+    the ends. Monthly turbidity values are interpolated between these days, same as in pvlib.
+    """
+    days_in_months = numpy.array(calendar.mdays[1:], dtype=float)
+    if calendar.isleap(year):
+        days_in_months[1] += 1
+
+    return numpy.concatenate([[-31 / 2], numpy.cumsum(days_in_months) - days_in_months / 2,
+                              [days_in_months.sum() + 31 / 2]])
+
+
+leap_year_month_middles = month_middles(2016)
+month_middles_of_year = month_middles(2015)
+
+
+class ClearskySite:
+    """
+    Per-site values of the clear sky engine.
+
+    Attributes:
+    altitude: site altitude in meters
+    monthly_turbidity: Linke turbidity for each month of the year
+    data: computed clear sky rows, dataframe with columns ghi, dni and dhi indexed by UTC time
+    """
+
+    def __init__(self, latitude, longitude, altitude, monthly_turbidity):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.altitude = altitude
+        self.monthly_turbidity = monthly_turbidity
+        self.data = None
+
+    def get_turbidity(self, times_utc: pandas.DatetimeIndex) -> numpy.ndarray:
+        """
+        Returns daily interpolated Linke turbidity for given UTC times.
+        """
+        turbidity = numpy.concatenate([[self.monthly_turbidity[-1]], self.monthly_turbidity,
+                                       [self.monthly_turbidity[0]]])
+        day_of_year = times_utc.dayofyear.to_numpy()
+
+        return numpy.where(times_utc.is_leap_year,
+                           numpy.interp(day_of_year, leap_year_month_middles, turbidity),
+                           numpy.interp(day_of_year, month_middles_of_year, turbidity))
+
+
+class ClearskyEngine:
+    """
+    Thread safe per-site clear sky model. Least recently used sites are dropped when max_sites sites are held.
+    """
+
+    def __init__(self, turbidity_file=None, max_sites=256, max_rows_per_site=20000, coordinate_decimals=4):
+        """
+        :param turbidity_file: Optional path of an uncompressed .npy copy of the turbidity climatology, see module
+        docstring. None reads the pvlib HDF5 file.
+        :param max_sites: Maximum number of sites held in memory.
+        :param max_rows_per_site: Computed rows kept per site, the latest rows are kept.
+        :param coordinate_decimals: Sites are rounded to this many decimals, 4 decimals is roughly 10m.
+        """
+        self.turbidity_file = turbidity_file
+        self.max_sites = max_sites
+        self.max_rows_per_site = max_rows_per_site
+        self.coordinate_decimals = coordinate_decimals
+
+        # (latitude, longitude) -> ClearskySite
+        self.__sites = OrderedDict()
+        self.__lock = threading.Lock()
+
+        # memory-mapped array or open HDF5 dataset with shape (2160, 4320, 12), opened on first use
+        self.__turbidity_table = None
+        self.__turbidity_h5_file = None
+
+        self.rows_computed = 0
+        self.rows_reused = 0
+
+    def get_clearsky(self, times, latitude, longitude) -> pandas.DataFrame:
+        """
+        Returns clear sky irradiance for given times and site.
+        :param times: pandas DatetimeIndex, timezone naive values are assumed to be UTC.
+        :return: Dataframe with columns ghi, dni and dhi indexed by times.
+        """
+        times = pandas.DatetimeIndex(times)
+        times_utc = times.tz_convert("UTC") if times.tz is not None else times.tz_localize("UTC")
+
+        site = self.get_site(latitude, longitude)
+
+        stored = site.data
+        missing = times_utc.unique() if stored is None else times_utc.unique().difference(stored.index)
+
+        if len(missing) > 0:
+            computed = self.__compute(site, missing.sort_values())
+
+            with self.__lock:
+                stored = computed if site.data is None else pandas.concat([site.data, computed])
+                stored = stored[~stored.index.duplicated(keep="last")].sort_index()
+                site.data = stored.iloc[-self.max_rows_per_site:]
+                self.rows_computed += len(missing)
+
+        with self.__lock:
+            self.rows_reused += len(times) - len(missing)
+
+        data = stored.reindex(times_utc)
+        data.index = times
+
+        return data
+
+    def get_site(self, latitude, longitude) -> ClearskySite:
+        """
+        Returns the per-site values of a site, looking them up on first use.
+        """
+        key = (round(float(latitude), self.coordinate_decimals), round(float(longitude), self.coordinate_decimals))
+
+        with self.__lock:
+            site = self.__sites.get(key)
+            if site is not None:
+                self.__sites.move_to_end(key)
+                return site
+
+        site = ClearskySite(key[0], key[1], location.lookup_altitude(key[0], key[1]),
+                            self.__read_monthly_turbidity(key[0], key[1]))
+
+        with self.__lock:
+            # another thread may have added the site meanwhile, the first one is kept
+            site = self.__sites.setdefault(key, site)
+            self.__sites.move_to_end(key)
+
+            while len(self.__sites) > self.max_sites:
+                self.__sites.popitem(last=False)
+
+        return site
+
+    def clear(self):
+        """
+        Removes all sites and computed rows. Counters are kept.
+        """
+        with self.__lock:
+            self.__sites.clear()
+
+    def __len__(self):
+        return len(self.__sites)
+
+    def stats(self) -> dict:
+        """
+        Returns counters as a dict with keys "rows_computed", "rows_reused", "sites" and "max_sites".
+        """
+        with self.__lock:
+            return {"rows_computed": self.rows_computed,
+                    "rows_reused": self.rows_reused,
+                    "sites": len(self.__sites),
+                    "max_sites": self.max_sites}
+
+    def get_clearsky_for_geometry(self, geometry) -> pandas.DataFrame:
+        """
+        Returns clear sky irradiance computed from an existing SolarGeometry, so that solar position computed for
+        the PV model is reused. Rows are not stored.
+        :param geometry: astronomical_calculations.SolarGeometry, timezone naive times are assumed to be UTC.
+        :return: Dataframe with columns ghi, dni and dhi indexed by the times of geometry.
+        """
+        site = self.get_site(geometry.latitude, geometry.longitude)
+
+        with self.__lock:
+            self.rows_computed += len(geometry.times)
+
+        return self.__ineichen(site, geometry)
+
+    def __compute(self, site: ClearskySite, times_utc: pandas.DatetimeIndex) -> pandas.DataFrame:
+        """
+        Ineichen-Perez clear sky for given UTC times.
+        """
+        return self.__ineichen(site, astronomical_calculations.get_solar_geometry(times_utc, site.latitude,
+                                                                                 site.longitude))
+
+    @staticmethod
+    def __ineichen(site: ClearskySite, geometry) -> pandas.DataFrame:
+        times = pandas.DatetimeIndex(geometry.times)
+
+        air_mass_absolute = atmosphere.get_absolute_airmass(numpy.asarray(geometry.air_mass, dtype=float),
+                                                            atmosphere.alt2pres(site.altitude))
+
+        # numpy arrays instead of series, pvlib does the same arithmetic without pandas overhead. Divisions by zero
+        # for the sun below the horizon are masked by pvlib, pandas would not warn about them either.
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            data = clearsky.ineichen(numpy.asarray(geometry.solar_apparent_zenith, dtype=float), air_mass_absolute,
+                                     site.get_turbidity(times), altitude=site.altitude,
+                                     dni_extra=numpy.asarray(geometry.dni_extra, dtype=float))
+
+        return pandas.DataFrame({"ghi": data["ghi"], "dni": data["dni"], "dhi": data["dhi"]}, index=times)
+
+    def __read_monthly_turbidity(self, latitude, longitude) -> numpy.ndarray:
+        """
+        Returns the 12 monthly Linke turbidity values of the grid cell containing the site.
+        """
+        table = self.__get_turbidity_table()
+
+        steps = turbidity_grid_steps_per_degree
+        latitude_index = int(numpy.clip(numpy.around((90 - latitude) * steps - 0.5), 0, 180 * steps - 1))
+        longitude_index = int(numpy.clip(numpy.around((longitude + 180) * steps - 0.5), 0, 360 * steps - 1))
+
+        # values in the file are 20 times the turbidity
+        return numpy.array(table[latitude_index, longitude_index], dtype=float) / 20
+
+    def __get_turbidity_table(self):
+        with self.__lock:
+            if self.__turbidity_table is not None:
+                return self.__turbidity_table
+
+            if self.turbidity_file is None:
+                self.__turbidity_h5_file = h5py.File(default_turbidity_path, "r")
+                self.__turbidity_table = self.__turbidity_h5_file["LinkeTurbidity"]
+            else:
+                if not os.path.exists(self.turbidity_file):
+                    self.__write_turbidity_file(self.turbidity_file)
+                self.__turbidity_table = numpy.load(self.turbidity_file, mmap_mode="r")
+
+            return self.__turbidity_table
+
+    @staticmethod
+    def __write_turbidity_file(path):
+        """
+        Decompresses the pvlib turbidity climatology into an .npy file. Written to a temporary file first so that
+        processes starting at the same time never read a partially written file.
+        """
+        with h5py.File(default_turbidity_path, "r") as h5_file:
+            table = h5_file["LinkeTurbidity"][:]
+
+        temporary_path = path + "." + str(os.getpid()) + ".tmp"
+        with open(temporary_path, "wb") as file:
+            numpy.save(file, table)
+        os.replace(temporary_path, path)
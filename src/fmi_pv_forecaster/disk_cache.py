@@ -0,0 +1,140 @@
+"""
+This file contains a disk backed cache for processed FMI open data forecasts.
+
+The in-memory cache in forecast_cache.py is lost when the python process exits. Processes which restart frequently
+would then download the same forecast again and again. This cache stores each processed forecast dataframe as a
+NumPy .npz file in a shared directory so that new processes can reuse it.
+
+Files are named after the cache key(geolocation, weather model run and parameters). Writes are atomic, a file is
+first written under a temporary name and then renamed, so concurrent readers never see half written files.
+Files older than the time-to-live are ignored and removed by cleanup().
+"""
+
+import os
+import tempfile
+import time
+import zlib
+from datetime import datetime
+from datetime import timedelta
+
+import numpy
+import pandas
+
+
+class DiskCache:
+    """
+    Directory of cached forecast dataframes.
+    """
+
+    def __init__(self, directory, ttl_seconds=900):
+        """
+        :param directory: Cache directory, created if it does not exist. Can be shared by multiple processes.
+        :param ttl_seconds: Files older than this are not used. FMI forecasts update every 3 hours, but new model runs
+        become available with a delay of a couple of hours so this should be well below 3 hours.
+        """
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        os.makedirs(directory, exist_ok=True)
+
+    def path_for(self, key) -> str:
+        """
+        Returns the file path used for cache key (latitude, longitude, model run, parameters).
+        """
+        latitude, longitude, model_run, parameters = key
+        parameter_hash = zlib.crc32(",".join(parameters).encode("utf-8"))
+        filename = ("fmi_" + format(latitude, ".4f") + "_" + format(longitude, ".4f") + "_"
+                    + model_run.strftime("%Y%m%d%H") + "_" + format(parameter_hash, "08x") + ".npz")
+        return os.path.join(self.directory, filename)
+
+    def get(self, key, start_time: datetime, end_time: datetime):
+        """
+        Returns cached dataframe for key or None if there is no fresh file for the key or if the file does not cover the
+        requested time window.
+        """
+        path = self.path_for(key)
+
+        try:
+            file_age = time.time() - os.path.getmtime(path)
+        except OSError:
+            return None
+
+        if file_age > self.ttl_seconds:
+            return None
+
+        try:
+            df, cached_start, cached_end = read_dataframe(path)
+        except (OSError, ValueError, KeyError):
+            # file removed by cleanup in another process or otherwise unreadable, treating as a miss
+            return None
+
+        if start_time < cached_start or end_time > cached_end + timedelta(seconds=self.ttl_seconds):
+            return None
+
+        return df
+
+    def put(self, key, df: pandas.DataFrame, start_time: datetime, end_time: datetime):
+        """
+        Writes dataframe to cache atomically.
+        """
+        write_dataframe(self.path_for(key), df, start_time, end_time)
+
+    def cleanup(self) -> int:
+        """
+        Removes cache files older than the time-to-live.
+        :return: Number of removed files.
+        """
+        removed = 0
+        time_now = time.time()
+
+        for filename in os.listdir(self.directory):
+            if not (filename.startswith("fmi_") and filename.endswith(".npz")):
+                continue
+
+            path = os.path.join(self.directory, filename)
+            try:
+                if time_now - os.path.getmtime(path) > self.ttl_seconds:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                # removed by another process
+                pass
+
+        return removed
+
+
+def write_dataframe(path, df: pandas.DataFrame, start_time: datetime, end_time: datetime):
+    """
+    Writes a dataframe with a datetime index and numeric columns to a .npz file. The file is written under a temporary
+    name in the same directory and renamed in place, which is atomic.
+    """
+    arrays = {"index": df.index.to_numpy(dtype="datetime64[ns]"),
+              "index_name": numpy.array([df.index.name or ""]),
+              "columns": numpy.array([str(column) for column in df.columns]),
+              "window": numpy.array([start_time, end_time], dtype="datetime64[ns]")}
+
+    for i, column in enumerate(df.columns):
+        arrays["column_" + str(i)] = df[column].to_numpy(dtype=float)
+
+    file_descriptor, temp_path = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(path) or ".")
+    try:
+        with os.fdopen(file_descriptor, "wb") as file:
+            numpy.savez(file, **arrays)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def read_dataframe(path):
+    """
+    Reads a dataframe written by write_dataframe().
+    :return: dataframe, window start time, window end time
+    """
+    with numpy.load(path, allow_pickle=False) as arrays:
+        columns = [str(column) for column in arrays["columns"]]
+        index = pandas.DatetimeIndex(arrays["index"], name=str(arrays["index_name"][0]) or None)
+        df = pandas.DataFrame({column: arrays["column_" + str(i)] for i, column in enumerate(columns)}, index=index)
+        window = arrays["window"]
+
+    return df, pandas.Timestamp(window[0]).to_pydatetime(), pandas.Timestamp(window[1]).to_pydatetime()
@@ -0,0 +1,336 @@
+"""
+This file contains a vectorized version of the PV model for large fleets of PV systems.
+
+process_radiation_df() simulates one system at a time with a dataframe. Simulating tens of thousands of systems that
+way spends most of the time in python and pandas overhead. Here the same model steps are computed for a whole fleet at
+once as 2-D NumPy arrays with shape (time, system):
+
+1. Solar position. Time dependent parts of the NREL SPA algorithm are computed once for all systems, only the location
+dependent parts(hour angle, parallax, refraction) are computed per system. This is the same algorithm pvlib uses by
+default, so results match process_radiation_df().
+2. Irradiance transpositions, dni with angle of incidence, dhi with perez-driesse and ghi with albedo.
+3. Reflection losses.
+4. King 2004 panel temperature.
+5. Huld 2010 output.
+
+Weather can be shared by all systems, given per system or given for clusters of systems. For clustered systems, such
+as systems close to each other which use the same FMI forecast point, weather has one column per cluster and
+weather_index tells which column each system uses. Only geometry then differs between systems of the same cluster.
+
+Example:
+fleet = Fleet(latitudes, longitudes, tilts, azimuths, power_ratings)
+output = simulate_fleet(fleet, times, dni, dhi, ghi, air_temperature=T, wind=wind)
+# output[i, j] is the output of system j at times[i] in watts
+"""
+
+import os
+
+import h5py
+import numpy
+import pandas
+import pvlib.atmosphere
+import pvlib.irradiance
+from pvlib import spa
+
+from fmi_pv_forecaster.helpers import default_parameters
+from fmi_pv_forecaster.helpers import output_estimator
+from fmi_pv_forecaster.helpers import panel_temperature_estimator
+from fmi_pv_forecaster.helpers import reflection_estimator
+
+# systems simulated at once, limits memory use. Each (time, system) float array of a 72 hour forecast for 10000
+# systems takes 5.8MB and the model uses a few dozen of those.
+default_chunk_size = 10000
+
+# pvlib get_solarposition() defaults
+__spa_temperature = 12
+__spa_atmos_refract = 0.5667
+
+# pvlib site altitude map, used by pvlib.location.lookup_altitude()
+altitude_path = os.path.join(os.path.dirname(pvlib.__file__), "data", "Altitude.h5")
+altitude_grid_steps_per_degree = 12
+
+
+class Fleet:
+    """
+    Parameters of M PV systems stored as arrays of length M.
+
+    Parameters are the same as in PVSystem, scalar values are used for every system. Altitude in meters is used for
+    solar position refraction corrections. If not given, it is looked up from the pvlib altitude map for each system,
+    same as process_radiation_df() does through pvlib.
+    """
+
+    def __init__(self, latitude, longitude, tilt, azimuth, power_rating=1,
+                 module_elevation=default_parameters.panel_elevation, albedo=default_parameters.albedo, altitude=None):
+
+        self.latitude = numpy.atleast_1d(numpy.asarray(latitude, dtype=float))
+        size = len(self.latitude)
+
+        self.longitude = self.__as_array(longitude, size, "longitude")
+
+        if altitude is None:
+            altitude = lookup_altitudes(self.latitude, self.longitude)
+
+        self.tilt = self.__as_array(tilt, size, "tilt")
+        self.azimuth = self.__as_array(azimuth, size, "azimuth")
+        self.power_rating = self.__as_array(power_rating, size, "power_rating")
+        self.module_elevation = self.__as_array(module_elevation, size, "module_elevation")
+        self.albedo = self.__as_array(albedo, size, "albedo")
+        self.altitude = self.__as_array(altitude, size, "altitude")
+
+    @staticmethod
+    def __as_array(values, size, name) -> numpy.ndarray:
+        values = numpy.asarray(values, dtype=float)
+        if values.ndim == 0:
+            return numpy.full(size, float(values))
+        if values.shape != (size,):
+            raise ValueError("Fleet parameter " + name + " has shape " + str(values.shape) + ", expected ("
+                             + str(size) + ",) or a single value.")
+        return values
+
+    @classmethod
+    def from_systems(cls, systems, altitude=None):
+        """
+        Builds a fleet from a list of PVSystem objects.
+        :param altitude: Site altitudes in meters, looked up if not given, see Fleet.
+        """
+        for system in systems:
+            system.check_location()
+            system.check_angles()
+
+        return cls([system.latitude for system in systems],
+                   [system.longitude for system in systems],
+                   [system.tilt for system in systems],
+                   [system.azimuth for system in systems],
+                   [system.power_rating for system in systems],
+                   [system.module_elevation for system in systems],
+                   [system.albedo for system in systems],
+                   altitude)
+
+    def __len__(self):
+        return len(self.latitude)
+
+
+def lookup_altitudes(latitude, longitude) -> numpy.ndarray:
+    """
+    Array version of pvlib.location.lookup_altitude(). The altitude map is read once for all sites instead of once per
+    site, which takes about 1 ms per site with pvlib.
+    :param latitude: Array of WGS84 latitudes.
+    :param longitude: Array of WGS84 longitudes.
+    :return: Array of altitudes in meters, 0 where the map has no data.
+    """
+
+    steps = altitude_grid_steps_per_degree
+    latitude_index = numpy.clip(numpy.around((90 - numpy.asarray(latitude, dtype=float)) * steps - 0.5), 0,
+                                180 * steps - 1).astype(int)
+    longitude_index = numpy.clip(numpy.around((numpy.asarray(longitude, dtype=float) + 180) * steps - 0.5), 0,
+                                 360 * steps - 1).astype(int)
+
+    with h5py.File(altitude_path, "r") as file:
+        table = file["Altitude"][()]
+
+    # values are 28 meter steps from -450 meters, 255 means no data
+    values = table[latitude_index, longitude_index].astype(float)
+    return numpy.where(values == 255, 0.0, values * 28 - 450)
+
+
+def simulate_fleet(fleet: Fleet, times, dni, dhi, ghi, air_temperature=default_parameters.air_temperature,
+                   wind=default_parameters.wind_speed, albedo=None, weather_index=None,
+                   chunk_size=default_chunk_size, extended_output=False, dtype=float):
+    """
+    Simulates the output of every system of the fleet.
+
+    Weather parameters dni, dhi, ghi, air_temperature, wind and albedo can each be:
+    - a single value, used for all times and systems
+    - an array of shape (time,), shared by all systems
+    - an array of shape (time, clusters) if weather_index is given
+    - an array of shape (time, system) otherwise
+
+    :param fleet: Fleet of M systems.
+    :param times: pandas DatetimeIndex in UTC, timezone naive values are assumed to be UTC.
+    :param dni, dhi, ghi: Irradiance components in W/m².
+    :param air_temperature: Air temperature at 2m in Celsius.
+    :param wind: Wind speed in m/s.
+    :param albedo: Ground albedo, fleet.albedo is used if not given.
+    :param weather_index: Optional integer array of length M, weather column of each system.
+    :param chunk_size: Number of systems simulated at once, limits memory use.
+    :param extended_output: False -> output array is returned. True -> dict of (time, system) arrays "poa",
+    "poa_ref_cor", "module_temp" and "output" is returned.
+    :param dtype: Numpy dtype of the model arrays, numpy.float32 halves memory use. Solar position, air mass and
+    transpositions are always computed in float64 and cast to dtype.
+    :return: Array of system outputs in watts with shape (time, system) or dict of arrays, see extended_output.
+    """
+
+    times = pandas.DatetimeIndex(times)
+    system_count = len(fleet)
+
+    if weather_index is not None:
+        weather_index = numpy.asarray(weather_index, dtype=int)
+        if weather_index.shape != (system_count,):
+            raise ValueError("weather_index should have one value per fleet system.")
+
+    # time dependent values, shared by all systems
+    sun = __get_time_dependent_sun_values(times)
+    dni_extra = pvlib.irradiance.get_extra_radiation(times).to_numpy()[:, numpy.newaxis]
+
+    dtype = numpy.dtype(dtype)
+
+    results = {"poa": [], "poa_ref_cor": [], "module_temp": [], "output": []}
+
+    for start in range(0, system_count, chunk_size):
+        systems = slice(start, min(start + chunk_size, system_count))
+
+        chunk_results = __simulate_chunk(
+            fleet, systems, sun, dni_extra,
+            __weather_block(dni, weather_index, systems, len(times), "dni"),
+            __weather_block(dhi, weather_index, systems, len(times), "dhi"),
+            __weather_block(ghi, weather_index, systems, len(times), "ghi"),
+            __weather_block(air_temperature, weather_index, systems, len(times), "air_temperature", dtype),
+            __weather_block(wind, weather_index, systems, len(times), "wind", dtype),
+            fleet.albedo[numpy.newaxis, systems] if albedo is None
+            else __weather_block(albedo, weather_index, systems, len(times), "albedo"), dtype)
+
+        for key in results:
+            results[key].append(chunk_results[key])
+
+    if len(results["output"]) == 0:
+        results = {key: numpy.empty((len(times), 0), dtype=dtype) for key in results}
+    else:
+        results = {key: numpy.hstack(values) for key, values in results.items()}
+
+    if extended_output:
+        return results
+
+    return results["output"]
+
+
+def simulate_fleet_df(data: pandas.DataFrame, fleet: Fleet, system_names=None) -> pandas.DataFrame:
+    """
+    Simulates the fleet with weather from a radiation dataframe shared by all systems, such as one returned by
+    get_fmi_radiation_forecast(). Columns "T", "wind" and "albedo" are used if they exist.
+    :param data: Radiation dataframe with "dni", "dhi" and "ghi" columns.
+    :param fleet: Fleet of M systems.
+    :param system_names: Optional column names for the systems, system indices are used if not given.
+    :return: Dataframe of system outputs in watts with one column per system.
+    """
+
+    output = simulate_fleet(fleet, data.index, data["dni"].to_numpy(), data["dhi"].to_numpy(), data["ghi"].to_numpy(),
+                            air_temperature=data["T"].to_numpy() if "T" in data.columns
+                            else default_parameters.air_temperature,
+                            wind=data["wind"].to_numpy() if "wind" in data.columns else default_parameters.wind_speed,
+                            albedo=data["albedo"].to_numpy() if "albedo" in data.columns else None)
+
+    return pandas.DataFrame(output, index=data.index, columns=system_names)
+
+
+def __weather_block(values, weather_index, systems: slice, time_count, name, dtype=float) -> numpy.ndarray:
+    """
+    Returns weather values for the given systems as an array which broadcasts to (time, system).
+    """
+    values = numpy.asarray(values, dtype=dtype)
+
+    if values.ndim == 0:
+        return values.reshape(1, 1)
+
+    if values.ndim == 1:
+        if len(values) != time_count:
+            raise ValueError(name + " should have one value per timestamp, got " + str(len(values)) + " values for "
+                             + str(time_count) + " timestamps.")
+        return values[:, numpy.newaxis]
+
+    if values.ndim == 2 and values.shape[0] == time_count:
+        if weather_index is not None:
+            return values[:, weather_index[systems]]
+        return values[:, systems]
+
+    raise ValueError(name + " has unsupported shape " + str(values.shape) + ".")
+
+
+def __get_time_dependent_sun_values(times: pandas.DatetimeIndex) -> dict:
+    """
+    Computes the time dependent part of the NREL SPA algorithm, same as pvlib.solarposition.spa_python() up to the
+    location dependent steps.
+    :return: dict with sidereal time "v", right ascension "alpha", declination "delta" and radius vector "R" as column
+    arrays of shape (time, 1).
+    """
+    if times.tz is not None:
+        times_utc = times.tz_convert("UTC")
+    else:
+        times_utc = times
+
+    unixtime = (times_utc.tz_localize(None).to_numpy(dtype="datetime64[ns]").astype("int64") / 1e9)
+    delta_t = spa.calculate_deltat(times_utc.year.to_numpy(), times_utc.month.to_numpy())
+
+    v, alpha, delta = spa.solar_position_numpy(unixtime, 0, 0, 0, 1013.25, __spa_temperature, delta_t,
+                                               __spa_atmos_refract, 0, sst=True)
+    (R,) = spa.solar_position_numpy(unixtime, 0, 0, 0, 1013.25, __spa_temperature, delta_t, __spa_atmos_refract, 0,
+                                    esd=True)
+
+    return {"v": v[:, numpy.newaxis], "alpha": alpha[:, numpy.newaxis], "delta": delta[:, numpy.newaxis],
+            "R": R[:, numpy.newaxis]}
+
+
+def __get_solar_position(sun: dict, latitude, longitude, altitude) -> (numpy.ndarray, numpy.ndarray):
+    """
+    Location dependent part of the NREL SPA algorithm for arrays of systems.
+    :return: solar azimuth, apparent solar zenith. Arrays of shape (time, system) in degrees.
+    """
+    pressure = pvlib.atmosphere.alt2pres(altitude) / 100
+
+    H = spa.local_hour_angle(sun["v"], longitude, sun["alpha"])
+    xi = spa.equatorial_horizontal_parallax(sun["R"])
+    u = spa.uterm(latitude)
+    x = spa.xterm(u, latitude, altitude)
+    y = spa.yterm(u, latitude, altitude)
+    delta_alpha = spa.parallax_sun_right_ascension(x, xi, H, sun["delta"])
+    delta_prime = spa.topocentric_sun_declination(sun["delta"], x, y, xi, delta_alpha, H)
+    H_prime = spa.topocentric_local_hour_angle(H, delta_alpha)
+    e0 = spa.topocentric_elevation_angle_without_atmosphere(latitude, delta_prime, H_prime)
+    delta_e = spa.atmospheric_refraction_correction(pressure, __spa_temperature, e0, __spa_atmos_refract)
+    e = spa.topocentric_elevation_angle(e0, delta_e)
+    apparent_zenith = spa.topocentric_zenith_angle(e)
+    gamma = spa.topocentric_astronomers_azimuth(H_prime, delta_prime, latitude)
+    azimuth = spa.topocentric_azimuth_angle(gamma)
+
+    return azimuth, apparent_zenith
+
+
+def __simulate_chunk(fleet, systems: slice, sun, dni_extra, dni, dhi, ghi, air_temperature, wind, albedo,
+                     dtype=float) -> dict:
+    """
+    Model steps for the systems of one chunk, see module docstring.
+    """
+
+    tilt = fleet.tilt[systems]
+    azimuth = fleet.azimuth[systems]
+
+    # step 1. solar geometry
+    solar_azimuth, solar_zenith = __get_solar_position(sun, fleet.latitude[systems], fleet.longitude[systems],
+                                                       fleet.altitude[systems])
+    angle_of_incidence = numpy.clip(pvlib.irradiance.aoi(tilt, azimuth, solar_zenith, solar_azimuth), 0, 90)
+    air_mass = pvlib.atmosphere.get_relative_airmass(solar_zenith)
+
+    # step 2. transpositions. Geometry, air mass and transpositions are computed in float64, the rest of the model in
+    # dtype
+    dni_poa = numpy.abs(dni * numpy.cos(numpy.radians(angle_of_incidence))).astype(dtype, copy=False)
+    dhi_poa = pvlib.irradiance.perez_driesse(tilt, azimuth, dhi, dni, dni_extra, solar_zenith, solar_azimuth, air_mass,
+                                             return_components=False).astype(dtype, copy=False)
+    ghi_poa = (ghi * albedo * (1.0 - numpy.cos(numpy.radians(tilt))) / 2).astype(dtype, copy=False)
+    poa = dni_poa + dhi_poa + ghi_poa
+
+    angle_of_incidence = angle_of_incidence.astype(dtype, copy=False)
+    tilt = tilt.astype(dtype)
+
+    # step 3. reflections
+    poa_ref_cor = ((1 - reflection_estimator.dni_reflected_array(angle_of_incidence)) * dni_poa
+                   + (1 - reflection_estimator.dhi_reflected_array(tilt, dtype)) * dhi_poa
+                   + (1 - reflection_estimator.ghi_reflected_array(tilt, dtype)) * ghi_poa)
+
+    # step 4. panel temperature
+    module_temp = panel_temperature_estimator.temperature_of_module_array(
+        poa_ref_cor, wind, fleet.module_elevation[systems], air_temperature, dtype)
+
+    # step 5. output, negative absorbed radiation is filtered out like in output_estimator.add_output_to_df()
+    output = output_estimator.estimate_output_array(numpy.maximum(poa_ref_cor, 0), module_temp,
+                                                    fleet.power_rating[systems], dtype)
+
+    return {"poa": poa, "poa_ref_cor": poa_ref_cor, "module_temp": module_temp, "output": output}
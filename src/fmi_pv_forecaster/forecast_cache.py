@@ -0,0 +1,206 @@
+"""
+This file contains the in-memory cache used for FMI open data forecasts.
+
+Cache entries are keyed by request, meaning rounded geolocation, weather model run and the list of requested
+parameters. Entries expire after a time-to-live and the least recently used entries are evicted when the cache is
+full. This way forecasts for multiple sites can be cached at the same time and changing the site does not wipe the
+cache.
+
+ProcessedForecastCache holds PV model outputs computed from the cached forecasts, so that repeated requests for the same
+system do not run the PV model again.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from datetime import timedelta
+
+
+def model_run_time(time_utc: datetime, model_run_interval_hours=3) -> datetime:
+    """
+    Returns the start of the model run slot given time belongs to. FMI weather models are run every 3 hours starting
+    from 00 UTC so 13:41 UTC would return 12:00 UTC of the same day.
+    :param time_utc: Timezone naive or aware UTC datetime.
+    :param model_run_interval_hours: Hours between weather model runs.
+    :return: Datetime floored to the model run interval.
+    """
+    floored_hour = time_utc.hour - time_utc.hour % model_run_interval_hours
+    return time_utc.replace(hour=floored_hour, minute=0, second=0, microsecond=0)
+
+
+def make_cache_key(latitude, longitude, model_run: datetime, parameters, coordinate_decimals=4) -> tuple:
+    """
+    Builds a cache key for an FMI request. Coordinates are rounded so that tiny floating point differences in the
+    geolocation do not result in new server calls, 4 decimals is roughly 10m.
+    """
+    return (round(float(latitude), coordinate_decimals),
+            round(float(longitude), coordinate_decimals),
+            model_run,
+            tuple(parameters))
+
+
+class CacheEntry:
+    """
+    Single cached forecast with the time window it was fetched for.
+    """
+
+    def __init__(self, data, start_time: datetime, end_time: datetime, load_time: float):
+        self.data = data
+        self.start_time = start_time
+        self.end_time = end_time
+        # time.monotonic() timestamp
+        self.load_time = load_time
+
+    def covers(self, start_time: datetime, end_time: datetime, tolerance: timedelta) -> bool:
+        """
+        Returns True if the entry was fetched for a time window which contains the given window. End time is allowed
+        to be later by tolerance as default forecast windows slide forward with the current time.
+        """
+        return start_time >= self.start_time and end_time <= self.end_time + tolerance
+
+
+class ForecastCache:
+    """
+    Thread safe LRU cache with time-to-live for FMI forecasts.
+    """
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+
+    def get(self, key, start_time: datetime, end_time: datetime, ttl_seconds: float):
+        """
+        Returns cached data for key or None if the key is not cached, entry is older than ttl_seconds or entry does not
+        cover the requested time window.
+        """
+        with self.__lock:
+            entry = self.__entries.get(key)
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            age = time.monotonic() - entry.load_time
+            if age > ttl_seconds:
+                del self.__entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            if not entry.covers(start_time, end_time, timedelta(seconds=ttl_seconds)):
+                self.misses += 1
+                return None
+
+            self.__entries.move_to_end(key)
+            self.hits += 1
+            return entry.data
+
+    def put(self, key, data, start_time: datetime, end_time: datetime):
+        """
+        Stores data to cache, evicting least recently used entries if cache is full.
+        """
+        with self.__lock:
+            self.__entries[key] = CacheEntry(data, start_time, end_time, time.monotonic())
+            self.__entries.move_to_end(key)
+
+            while len(self.__entries) > self.max_entries:
+                self.__entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """
+        Removes all entries. Counters are kept.
+        """
+        with self.__lock:
+            self.__entries.clear()
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def stats(self) -> dict:
+        """
+        Returns cache counters as a dict with keys "hits", "misses", "expirations", "evictions", "entries" and
+        "max_entries".
+        """
+        with self.__lock:
+            return {"hits": self.hits,
+                    "misses": self.misses,
+                    "expirations": self.expirations,
+                    "evictions": self.evictions,
+                    "entries": len(self.__entries),
+                    "max_entries": self.max_entries}
+
+
+class ProcessedForecastCache:
+    """
+    Thread safe LRU cache of PV model outputs.
+
+    Each entry remembers the weather dataframe it was computed from. An entry is only returned for the same weather
+    dataframe object, so when the FMI cache downloads a new forecast the PV model is run again even if the key is the
+    same.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        # key -> (source dataframe, output)
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, source):
+        """
+        Returns cached output for key if it was computed from source, otherwise None.
+        """
+        with self.__lock:
+            entry = self.__entries.get(key)
+
+            if entry is None or entry[0] is not source:
+                self.misses += 1
+                return None
+
+            self.__entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, source, output):
+        """
+        Stores output computed from source, evicting least recently used entries if cache is full.
+        """
+        with self.__lock:
+            self.__entries[key] = (source, output)
+            self.__entries.move_to_end(key)
+
+            while len(self.__entries) > self.max_entries:
+                self.__entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """
+        Removes all entries. Counters are kept.
+        """
+        with self.__lock:
+            self.__entries.clear()
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def stats(self) -> dict:
+        """
+        Returns cache counters as a dict with keys "hits", "misses", "evictions", "entries" and "max_entries".
+        """
+        with self.__lock:
+            return {"hits": self.hits,
+                    "misses": self.misses,
+                    "evictions": self.evictions,
+                    "entries": len(self.__entries),
+                    "max_entries": self.max_entries}
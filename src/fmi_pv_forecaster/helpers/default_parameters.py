@@ -9,3 +9,9 @@ wind_speed = 2
 
 # default albedo. Lower values mean lower ground reflectivity. Range in 0 to 1
 albedo = 0.25
+
+# time in minutes between rows in clearsky forecasts, see pv_forecaster.set_clearsky_fc_timestep()
+clearsky_fc_timestep = 60
+
+# minute offset of clearsky forecast timestamps, see pv_forecaster.set_clearsky_fc_time_offset()
+clearsky_fc_time_offset = 0
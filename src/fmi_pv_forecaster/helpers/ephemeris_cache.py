@@ -0,0 +1,181 @@
+"""
+This file contains a per-site cache of precomputed solar positions.
+
+Forecasts are recomputed every 3 hours for the same sites, and every time the solar position algorithm(SPA) is run
+again for mostly the same hours. This cache stores solar azimuth and apparent zenith per site on a fine time grid, 1
+minute by default, and answers requests by interpolating between grid points.
+
+The grid is stored in blocks of one UTC day per site, but only the grid points around the requested times are
+computed, at most two per requested time. A new site costs about the same as running SPA directly, and later requests
+for the same site and hours, such as the next forecast or another system at the same site, only compute grid points
+which are still missing. Least recently used blocks are evicted when the cache holds max_blocks blocks. With 1 minute
+resolution a block takes 35kB, so the default 512 blocks take about 18MB, enough for 3-4 forecast days of 128 sites.
+
+The cache is disabled by default, see astronomical_calculations.set_ephemeris_cache(). It pays off when the same sites
+are forecast repeatedly, for example by a long running forecasting service. Grid points for a time interval can also
+be computed in advance with precompute().
+
+Interpolation: zenith is interpolated linearly. Azimuth is interpolated through its sine and cosine so that values
+near north(0/360 degrees) are handled correctly. At 1 minute resolution the interpolation error is well below 0.01
+degrees.
+"""
+
+import threading
+from collections import OrderedDict
+
+import numpy
+import pandas
+from pvlib import location
+
+minutes_per_day = 24 * 60
+
+
+class EphemerisCache:
+    """
+    Thread safe LRU cache of daily solar position tables.
+    """
+
+    def __init__(self, resolution_minutes=1, max_blocks=512, coordinate_decimals=4):
+        """
+        :param resolution_minutes: Time between grid points, should divide 1440.
+        :param max_blocks: Maximum number of site-days held in memory.
+        :param coordinate_decimals: Sites are rounded to this many decimals, 4 decimals is roughly 10m.
+        """
+        if minutes_per_day % resolution_minutes != 0:
+            raise ValueError("Ephemeris resolution should divide 1440 minutes, got " + str(resolution_minutes))
+
+        self.resolution_minutes = resolution_minutes
+        self.max_blocks = max_blocks
+        self.coordinate_decimals = coordinate_decimals
+        self.__points_per_day = minutes_per_day // resolution_minutes
+
+        # (latitude, longitude, day number) -> array of shape (3, points per day + 1), rows zenith, sin az, cos az.
+        # Grid points not computed yet are NaN.
+        self.__blocks = OrderedDict()
+        self.__lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup(self, times, latitude, longitude):
+        """
+        Returns solar azimuth and apparent zenith in degrees for given times.
+        :param times: pandas DatetimeIndex, timezone naive values are assumed to be UTC.
+        :return: azimuth array, apparent zenith array
+        """
+        minutes = self.__to_utc_minutes(times)
+        days = numpy.floor(minutes / minutes_per_day).astype(numpy.int64)
+
+        zenith = numpy.empty(len(minutes))
+        sin_azimuth = numpy.empty(len(minutes))
+        cos_azimuth = numpy.empty(len(minutes))
+
+        for day in numpy.unique(days):
+            rows = numpy.flatnonzero(days == day)
+
+            # fractional grid position within the day
+            position = (minutes[rows] - day * minutes_per_day) / self.resolution_minutes
+            index = numpy.minimum(numpy.floor(position).astype(numpy.int64), self.__points_per_day - 1)
+            fraction = position - index
+
+            block = self.__get_block(latitude, longitude, int(day), numpy.unique(numpy.concatenate([index, index + 1])))
+
+            values = block[:, index] * (1 - fraction) + block[:, index + 1] * fraction
+            zenith[rows], sin_azimuth[rows], cos_azimuth[rows] = values
+
+        azimuth = numpy.degrees(numpy.arctan2(sin_azimuth, cos_azimuth)) % 360
+
+        return azimuth, zenith
+
+    def precompute(self, latitude, longitude, start_time, end_time):
+        """
+        Computes the grid points of a site for a time interval in advance, for example for the whole forecast horizon.
+        """
+        minutes = self.__to_utc_minutes(pandas.DatetimeIndex([start_time, end_time]))
+        first_day, last_day = numpy.floor(minutes / minutes_per_day).astype(numpy.int64)
+
+        for day in range(int(first_day), int(last_day) + 1):
+            day_minutes = numpy.clip(minutes - day * minutes_per_day, 0, minutes_per_day)
+            first_point = int(numpy.floor(day_minutes[0] / self.resolution_minutes))
+            last_point = int(numpy.ceil(day_minutes[1] / self.resolution_minutes))
+            self.__get_block(latitude, longitude, day, numpy.arange(first_point, last_point + 1))
+
+    def clear(self):
+        """
+        Removes all blocks. Counters are kept.
+        """
+        with self.__lock:
+            self.__blocks.clear()
+
+    def __len__(self):
+        return len(self.__blocks)
+
+    def stats(self) -> dict:
+        """
+        Returns cache counters as a dict with keys "hits", "misses", "evictions", "blocks" and "max_blocks".
+        """
+        with self.__lock:
+            return {"hits": self.hits,
+                    "misses": self.misses,
+                    "evictions": self.evictions,
+                    "blocks": len(self.__blocks),
+                    "max_blocks": self.max_blocks}
+
+    def __get_block(self, latitude, longitude, day, points) -> numpy.ndarray:
+        """
+        Returns the block of a site-day with at least given grid points computed.
+        """
+        key = (round(float(latitude), self.coordinate_decimals), round(float(longitude), self.coordinate_decimals), day)
+
+        with self.__lock:
+            block = self.__blocks.get(key)
+            if block is None:
+                # NaN marks grid points which have not been computed yet
+                block = numpy.full((3, self.__points_per_day + 1), numpy.nan)
+                self.__blocks[key] = block
+
+                while len(self.__blocks) > self.max_blocks:
+                    self.__blocks.popitem(last=False)
+                    self.evictions += 1
+
+            self.__blocks.move_to_end(key)
+
+            missing = points[numpy.isnan(block[0, points])]
+            if len(missing) == 0:
+                self.hits += 1
+                return block
+            self.misses += 1
+
+        # computed outside the lock, two threads may compute the same points at worst
+        values = self.__compute_points(key[0], key[1], day, missing)
+
+        with self.__lock:
+            # zenith row is written last as it marks the points computed
+            block[1:, missing] = values[1:]
+            block[0, missing] = values[0]
+
+        return block
+
+    def __compute_points(self, latitude, longitude, day, points) -> numpy.ndarray:
+        """
+        Runs SPA for given grid points of a day. Grid includes the midnight at the end of the day so that all times of
+        the day can be interpolated.
+        """
+        times = pandas.Timestamp(day, unit="D") + pandas.to_timedelta(points * self.resolution_minutes, unit="min")
+
+        solar_position = location.Location(latitude, longitude).get_solarposition(pandas.DatetimeIndex(times))
+        azimuth = numpy.radians(solar_position["azimuth"].to_numpy())
+
+        return numpy.array([solar_position["apparent_zenith"].to_numpy(), numpy.sin(azimuth), numpy.cos(azimuth)])
+
+    @staticmethod
+    def __to_utc_minutes(times) -> numpy.ndarray:
+        """
+        Returns minutes since 1970-01-01 UTC for each time.
+        """
+        times = pandas.DatetimeIndex(times)
+        if times.tz is not None:
+            times = times.tz_convert("UTC").tz_localize(None)
+
+        return times.as_unit("ns").asi8 / 60e9
@@ -19,6 +19,7 @@ import pandas as pd
 import pvlib.irradiance
 
 import fmi_pv_forecaster.helpers.default_parameters
+from fmi_pv_forecaster import profiling
 from fmi_pv_forecaster.helpers import astronomical_calculations
 
 
@@ -40,30 +41,47 @@ def print_full(x: pandas.DataFrame):
     pd.reset_option('display.max_colwidth')
 
 
-def irradiance_df_to_poa_df(irradiance_df: pandas.DataFrame, latitude, longitude, tilt, azimuth) -> pandas.DataFrame:
+def irradiance_df_to_poa_df(irradiance_df: pandas.DataFrame, latitude, longitude, tilt, azimuth,
+                            geometry=None, albedo=None, dtype=None) -> pandas.DataFrame:
     """
     This function takes an irradiance dataframe as input. This dataframe should contain ghi, dni and dhi
     irradiance values.
     These values are then projected to the panel surfaces either using simple geometry or more complex equations.
 
     :param irradiance_df: Solar irradiance dataframe with ghi, dni and dhi components.
+    :param geometry: Optional SolarGeometry for the index of irradiance_df. Computed here if not given.
+    :param albedo: Ground albedo used if irradiance_df has no albedo column. Value from default_parameters if not given.
+    :param dtype: Optional numpy dtype of the added columns, for example numpy.float32. Float64 if not given.
     :return: Dataframe with dni, ghi and dhi plane of array irradiance projections
     """
 
+    if geometry is None:
+        geometry = astronomical_calculations.get_solar_geometry(irradiance_df.index, latitude, longitude)
+
     # handling dni and dhi
-    irradiance_df["dni_poa"] = __project_dni_to_panel_surface_using_time_fast(
-        irradiance_df["dni"], irradiance_df.index, latitude, longitude, tilt, azimuth)
+    with profiling.stage("dni_transposition", len(irradiance_df)):
+        irradiance_df["dni_poa"] = __project_dni_to_panel_surface_using_time_fast(
+            irradiance_df["dni"], irradiance_df.index, latitude, longitude, tilt, azimuth, geometry=geometry)
 
     # perez dhi function, this had continuity issues before it was changed to modified perez
-    irradiance_df["dhi_poa"] = __project_dhi_to_panel_surface_perez_fast(
-        irradiance_df.index, irradiance_df["dhi"], irradiance_df["dni"], latitude, longitude, tilt, azimuth)
+    with profiling.stage("perez", len(irradiance_df)):
+        irradiance_df["dhi_poa"] = __project_dhi_to_panel_surface_perez_fast(
+            irradiance_df.index, irradiance_df["dhi"], irradiance_df["dni"], latitude, longitude, tilt, azimuth,
+            geometry=geometry)
 
     # and finally ghi
     if "albedo" in irradiance_df.columns:
         irradiance_df["ghi_poa"] = __project_ghi_to_panel_surface(irradiance_df["ghi"], tilt, irradiance_df["albedo"])
     else:
         # print("Using constant albedo of " + str(fmi_pv_forecast.helpers.default_parameters.albedo) +".")
-        irradiance_df["ghi_poa"] = __project_ghi_to_panel_surface(irradiance_df["ghi"], tilt)
+        if albedo is None:
+            albedo = fmi_pv_forecaster.helpers.default_parameters.albedo
+        irradiance_df["ghi_poa"] = __project_ghi_to_panel_surface(irradiance_df["ghi"], tilt, albedo)
+
+    if dtype is not None:
+        # solar geometry and perez are computed in float64, only the stored projections are converted
+        for column in ["dni_poa", "dhi_poa", "ghi_poa"]:
+            irradiance_df[column] = irradiance_df[column].astype(dtype)
 
     # adding the sum of projections to df as poa
     irradiance_df["poa"] = irradiance_df["dhi_poa"] + irradiance_df["dni_poa"] + irradiance_df["ghi_poa"]
@@ -81,17 +99,20 @@ same result.
 
 
 def __project_dni_to_panel_surface_using_time_fast(dni: float, dt: datetime,
-                                                   latitude, longitude, tilt, azimuth) -> float:
+                                                   latitude, longitude, tilt, azimuth, geometry=None) -> float:
     """
     :param DNI: Direct sunlight irradiance component in W
     :param dt: Time of simulation
+    :param geometry: Optional precomputed SolarGeometry for dt, used instead of computing solar position again.
     :return: Direct radiation per 1m² of solar panel surface
 
     This version of the function is fairly well optimized.
     """
 
-    angle_of_incidence = astronomical_calculations.get_solar_angle_of_incidence_limited(dt, latitude, longitude,
-                                                                                        tilt, azimuth)
+    if geometry is None:
+        geometry = astronomical_calculations.SolarGeometry(dt, latitude, longitude)
+
+    angle_of_incidence = geometry.get_angle_of_incidence_limited(tilt, azimuth)
     output = numpy.abs(__project_dni_to_panel_surface_using_angle(dni, angle_of_incidence))
 
     return output
@@ -110,7 +131,7 @@ def __project_dni_to_panel_surface_using_angle(dni: float, angle_of_incidence: f
 
 
 def __project_dhi_to_panel_surface_perez_fast(time: datetime, dhi: float, dni: float, latitude, longitude,
-                                              tilt: float, azimuth: float, driesse=True) -> float:
+                                              tilt: float, azimuth: float, driesse=True, geometry=None) -> float:
     """
     Often more accurate DHI transposition model.
     Calculated internally by pvlib, pvlib documentation at:
@@ -131,8 +152,12 @@ def __project_dhi_to_panel_surface_perez_fast(time: datetime, dhi: float, dni: f
     sun is below the horizon, but you would expect the panel surface radiation from dhi to be 100W when tilt is 0.
     """
 
+    # sun angles, air mass and extraterrestrial radiation are all read from the same solar geometry
+    if geometry is None:
+        geometry = astronomical_calculations.SolarGeometry(time, latitude, longitude)
+
     # function parameters
-    dni_extra = pvlib.irradiance.get_extra_radiation(time)
+    dni_extra = geometry.dni_extra
 
     # this should take sun-earth distance variation into account
     # empirical constant 1366.1 should work nearly as well
@@ -142,10 +167,11 @@ def __project_dhi_to_panel_surface_perez_fast(time: datetime, dhi: float, dni: f
     surface_azimuth = azimuth
 
     # sun angles
-    solar_azimuth, solar_zenith = astronomical_calculations.get_solar_azimuth_zenith_fast(time, latitude, longitude)
+    solar_azimuth = geometry.solar_azimuth
+    solar_zenith = geometry.solar_apparent_zenith
 
     # air mass
-    airmass = astronomical_calculations.get_air_mass_fast(time, latitude, longitude)
+    airmass = geometry.air_mass
 
     # Continuous perez
     if driesse:
@@ -15,6 +15,17 @@ from . import default_parameters
 
 rated_power = 1  # kw rating
 
+# efficiency limits and constants of the Huld 2010 model, see __estimate_output()
+min_efficiency = 0.5
+max_efficiency = 1.0
+
+k1 = -0.017162
+k2 = -0.040289
+k3 = -0.004681
+k4 = 0.000148
+k5 = 0.000169
+k6 = 0.000005
+
 
 def print_full(x: pandas.DataFrame):
     """
@@ -34,13 +45,20 @@ def print_full(x: pandas.DataFrame):
     pd.reset_option('display.max_colwidth')
 
 
-def add_output_to_df(df: pandas.DataFrame) -> pandas.DataFrame:
+def add_output_to_df(df: pandas.DataFrame, rated_power_kw=None, dtype=float, air_temperature=None) -> pandas.DataFrame:
     """
     Checker function for testing if required parameters exist in DF, if they do, add output to DF.
     :param df: Pandas dataframe with required columns for absorbed irradiance and panel temperature.
+    :param rated_power_kw: System power rating in kW, module variable rated_power is used if not given.
+    :param dtype: Numpy dtype of the output column, float64 by default.
+    :param air_temperature: Used as module temperature if df has no "module_temp" column, value from
+    default_parameters if not given.
     :return: Input DF with PV system output column.
     """
 
+    if air_temperature is None:
+        air_temperature = default_parameters.air_temperature
+
     # new PV output models can be added here if needed.
 
     if "poa_ref_cor" not in df.columns:
@@ -48,23 +66,52 @@ def add_output_to_df(df: pandas.DataFrame) -> pandas.DataFrame:
     if "module_temp" not in df.columns:
         # print("module temperature variable \"module_temp\" not found in dataframe.
         # Using value from default_parameters: " + str(default_parameters.air_temperature) +"C")
-        df["module_temp"] = default_parameters.air_temperature
+        df["module_temp"] = air_temperature
 
     # filtering negative values out
     df.loc[df['poa_ref_cor'] < 0, 'poa_ref_cor'] = 0
 
-    # this line makes sure the output estimation is not called when per w² radiation is below 0.1W. If the radiation is
-    # this low, the system would not produce any power and values of 0.0 cause issues as the output model contains
-    # logarithms
-    df['output'] = df.apply(
-        lambda row: 0.0 if row['poa_ref_cor'] < 0.1
-        else __estimate_output(row['poa_ref_cor'], row['module_temp']),
-        axis=1)
+    # whole columns are processed at once, see estimate_output_array()
+    df['output'] = estimate_output_array(df['poa_ref_cor'].to_numpy(), df['module_temp'].to_numpy(), rated_power_kw,
+                                         dtype)
+
+    return df
+
+
+def estimate_output_array(absorbed_radiation, panel_temp, rated_power_kw=None, dtype=float) -> numpy.ndarray:
+    """
+    Array version of the Huld 2010 model, see __estimate_output() for model details. Evaluates whole columns at once
+    instead of calling the model row by row.
+
+    Output is 0 where absorbed radiation is below 0.1W/m². If the radiation is this low, the system would not produce
+    any power and values of 0.0 cause issues as the output model contains logarithms. Nans are also replaced with 0.
+
+    :param absorbed_radiation: Array of solar irradiance absorbed by m² of solar panel surface.
+    :param panel_temp: Array of estimated solar panel temperatures, same shape as absorbed_radiation.
+    :param rated_power_kw: System power rating in kW, module variable rated_power is used if not given.
+    :param dtype: Numpy dtype used for computing, float64 by default.
+    :return: Array of estimated system outputs in watts.
+    """
+
+    if rated_power_kw is None:
+        rated_power_kw = rated_power
+
+    absorbed_radiation = numpy.asarray(absorbed_radiation, dtype=dtype)
+    panel_temp = numpy.asarray(panel_temp, dtype=dtype)
+    rated_power_kw = numpy.asarray(rated_power_kw, dtype=dtype)
+
+    producing = absorbed_radiation >= 0.1
+
+    # values below the threshold are replaced with 1000W before the logarithm, their output is set to 0 later
+    nrad = numpy.where(producing, absorbed_radiation, 1000.0) / 1000.0
+
+    output = rated_power_kw * 1000.0 * nrad * __get_efficiency(nrad, panel_temp - 25)
+    output = numpy.where(producing, output, 0.0)
 
     # filling nans
-    df['output'] = df['output'].fillna(0.0)
+    output[numpy.isnan(output)] = 0.0
 
-    return df
+    return output
 
 
 def __estimate_output(absorbed_radiation: float, panel_temp: float) -> numpy.floating:
@@ -93,16 +140,22 @@ def __estimate_output(absorbed_radiation: float, panel_temp: float) -> numpy.flo
     :return: Estimated system output in watts.
     """
 
-    min_efficiency = 0.5
-    max_efficiency = 1.0
+    nrad = absorbed_radiation / 1000.0
+    Tdiff = panel_temp - 25
+    rated_p = rated_power * 1000.0
 
-    # huld 2010 constants
-    k1 = -0.017162
-    k2 = -0.040289
-    k3 = -0.004681
-    k4 = 0.000148
-    k5 = 0.000169
-    k6 = 0.000005
+    output = rated_p * nrad * __get_efficiency(nrad, Tdiff)
+
+    return output
+
+
+def __get_efficiency(nrad, Tdiff):
+    """
+    Huld 2010 efficiency limited to range min_efficiency to max_efficiency, see __estimate_output(). Works with single
+    values and arrays.
+    :param nrad: Absorbed radiation / 1000W.
+    :param Tdiff: Panel temperature - 25°C.
+    """
 
     # hud et al equation:
 
@@ -117,16 +170,13 @@ def __estimate_output(absorbed_radiation: float, panel_temp: float) -> numpy.flo
     # + Tdiff*(k3+k4*ln(nrad) + k5*ln(nrad)²)
     # + k6*Tdiff²
 
-    # print(absorbed_radiation)
-
-    nrad = absorbed_radiation / 1000.0
-    Tdiff = panel_temp - 25
-    rated_p = rated_power * 1000.0
     base = 1
+    log_nrad = numpy.log(nrad)
+    log_nrad2 = log_nrad ** 2
 
-    part_k1 = k1 * numpy.log(nrad)
-    part_k2 = k2 * (numpy.log(nrad) ** 2)
-    part_k3k4k5 = Tdiff * (k3 + k4 * numpy.log(nrad) + k5 * (numpy.log(nrad) ** 2))
+    part_k1 = k1 * log_nrad
+    part_k2 = k2 * log_nrad2
+    part_k3k4k5 = Tdiff * (k3 + k4 * log_nrad + k5 * log_nrad2)
     # T*(-0.004681+0.000148*log(x) + 0.000169*log(x)²)
     part_k6 = k6 * (Tdiff ** 2)
 
@@ -135,9 +185,4 @@ def __estimate_output(absorbed_radiation: float, panel_temp: float) -> numpy.flo
     efficiency = numpy.minimum(efficiency, max_efficiency)
     # huld efficiencies can be negative, fixing that here
 
-    # print(absorbed_radiation)
-    # print("efficiency:" + str(efficiency))
-
-    output = rated_p * nrad * efficiency
-
-    return output
+    return efficiency
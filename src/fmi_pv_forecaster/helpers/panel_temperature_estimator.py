@@ -6,50 +6,84 @@ Author: TimoSalola (Timo Salola).
 """
 import math
 
+import numpy
 import pandas
 
 from fmi_pv_forecaster.helpers import default_parameters
 
 
-def add_estimated_panel_temperature(df: pandas.DataFrame) -> pandas.DataFrame:
+def add_estimated_panel_temperature(df: pandas.DataFrame, module_elevation=None, air_temperature=None,
+                                    wind_speed=None, dtype=float) -> pandas.DataFrame:
     """
     Adds an estimate for panel temperature based on wind speed, air temperature and absorbed radiation.
     If air temperature, wind speed or absorbed radiation columns are missing, aborts.
     If columns exists but temperature function returns nan due to faulty input, uses air temperature which should always
     be present in df.
     :param df:
+    :param module_elevation: Panel elevation in meters, value from default_parameters if not given.
+    :param air_temperature: Used if df has no "T" column, value from default_parameters if not given.
+    :param wind_speed: Used if df has no "wind" column, value from default_parameters if not given.
+    :param dtype: Numpy dtype of the module temperature column, float64 by default.
     :return:
 
     """
 
+    if module_elevation is None:
+        module_elevation = default_parameters.panel_elevation
+    if air_temperature is None:
+        air_temperature = default_parameters.air_temperature
+    if wind_speed is None:
+        wind_speed = default_parameters.wind_speed
+
     # checking that all required variables exist in df
 
     if "T" not in df.columns:
         # print("No air temperature in dataframe, using constant value: " + str(default_parameters.air_temperature)+"°C")
-        df["T"] = default_parameters.air_temperature
+        df["T"] = air_temperature
 
     if "wind" not in df.columns:
         # print("No wind speed in dataframe, using constant value: " + str(default_parameters.wind_speed)+"m/s")
-        df["wind"] = default_parameters.wind_speed
+        df["wind"] = wind_speed
 
     if "poa_ref_cor" not in df.columns:
         print("no reflection corrected poa value in df 'poa_ref_cor'")
         print("Aborting")
         return df
 
-    def helper_add_panel_temp(df):
-        estimated_temp = temperature_of_module(df["poa_ref_cor"], df["wind"], default_parameters.panel_elevation,
-                                               df["T"])
+    # whole columns are processed at once, nans fall back to air temperature
+    df["module_temp"] = temperature_of_module_array(df["poa_ref_cor"].to_numpy(), df["wind"].to_numpy(),
+                                                    module_elevation, df["T"].to_numpy(), dtype)
 
-        if math.isnan(estimated_temp):
-            return df["T"]
-        else:
-            return estimated_temp
+    return df
 
-    # applying helper function to dataset and storing result as a new column
-    df["module_temp"] = df.apply(helper_add_panel_temp, axis=1)
 
-    return df
+def temperature_of_module_array(absorbed_radiation, wind, module_elevation, air_temperature,
+                                dtype=float) -> numpy.ndarray:
+    """
+    Array version of temperature_of_module(). Takes arrays of equal length for radiation, wind and air temperature
+    and computes all module temperatures at once. Where the model returns nan due to faulty input, air temperature is
+    used instead.
+    :param absorbed_radiation: radiation hitting solar panel after reflections are accounted for in W
+    :param wind: wind speed in meters per second
+    :param module_elevation: module elevation from ground, in meters
+    :param air_temperature: air temperature at 2m in Celsius
+    :param dtype: Numpy dtype used for computing, float64 by default.
+    :return: array of module temperatures in Celsius
+    """
+
+    # two empirical constants, see temperature_of_module()
+    constant_a = -3.47
+    constant_b = -0.0594
+
+    absorbed_radiation = numpy.asarray(absorbed_radiation, dtype=dtype)
+    wind = numpy.asarray(wind, dtype=dtype)
+    air_temperature = numpy.asarray(air_temperature, dtype=dtype)
+
+    wind_speed = wind * numpy.asarray((module_elevation / 10) ** 0.1429, dtype=dtype)
+
+    module_temperature = absorbed_radiation * numpy.exp(constant_a + constant_b * wind_speed) + air_temperature
+
+    return numpy.where(numpy.isnan(module_temperature), air_temperature, module_temperature)
 
 
 def temperature_of_module(absorbed_radiation: float, wind: float,
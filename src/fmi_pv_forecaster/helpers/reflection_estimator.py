@@ -77,8 +77,13 @@ def add_reflection_corrected_poa_to_df(df: pandas.DataFrame) -> pandas.DataFrame
 
 
 def add_reflection_corrected_poa_components_to_df(df: pandas.DataFrame,
-                                                  latitude, longitude, tilt, azimuth) -> pandas.DataFrame:
+                                                  latitude, longitude, tilt, azimuth,
+                                                  geometry=None, dtype=None) -> pandas.DataFrame:
     """
+    Adds reflection corrected dni, dhi and ghi components "dni_rc", "dhi_rc" and "ghi_rc" to dataframe.
+    Optional geometry is the SolarGeometry for the index of df, computed here if not given.
+    Optional dtype, for example numpy.float32, is used for the reflection factors and the added columns.
+
     def helper_add_dni_ref(h_df):
         #  (1-alpha_BN)*BTN
         return math.fabs(1 - __dni_reflected(df["time"], latitude, longitude, tilt, azimuth)) * h_df["dni_poa"]
@@ -101,7 +106,17 @@ def add_reflection_corrected_poa_components_to_df(df: pandas.DataFrame,
     ghi_reflection_value = __ghi_reflected(tilt)
 
     # df["AOI"] = astronomical_calculations.get_solar_angle_of_incidence_fast(df.index)
-    df["dni_rc"] = (1 - __dni_reflected(df.index, latitude, longitude, tilt, azimuth)) * df["dni_poa"]
+    if geometry is None:
+        geometry = astronomical_calculations.get_solar_geometry(df.index, latitude, longitude)
+
+    dni_reflection_value = __dni_reflected(df.index, latitude, longitude, tilt, azimuth, geometry=geometry)
+
+    if dtype is not None:
+        dni_reflection_value = dni_reflection_value.astype(dtype)
+        dhi_reflection_value = numpy.asarray(dhi_reflection_value, dtype=dtype)
+        ghi_reflection_value = numpy.asarray(ghi_reflection_value, dtype=dtype)
+
+    df["dni_rc"] = (1 - dni_reflection_value) * df["dni_poa"]
     df["dhi_rc"] = (1 - dhi_reflection_value) * df["dhi_poa"]
     df["ghi_rc"] = (1 - ghi_reflection_value) * df["ghi_poa"]
 
@@ -110,11 +125,12 @@ def add_reflection_corrected_poa_components_to_df(df: pandas.DataFrame,
     return df
 
 
-def __dni_reflected(dt: datetime, latitude, longitude, tilt, azimuth) -> float:
+def __dni_reflected(dt: datetime, latitude, longitude, tilt, azimuth, geometry=None) -> float:
     """
     Computes a constant in range [0,1] which represents how much of the direct irradiance is reflected from panel
     surfaces.
     :param dt: datetime
+    :param geometry: Optional precomputed SolarGeometry for dt.
     :return: reflected radiation in range [0,1]
 
     F_B_(alpha) in "Calculation of the PV modules angular losses under field conditions by means of an analytical model"
@@ -122,7 +138,10 @@ def __dni_reflected(dt: datetime, latitude, longitude, tilt, azimuth) -> float:
 
     a_r = reflectance_constant
 
-    AOI = astronomical_calculations.get_solar_angle_of_incidence_limited(dt, latitude, longitude, tilt, azimuth)
+    if geometry is None:
+        geometry = astronomical_calculations.SolarGeometry(dt, latitude, longitude)
+
+    AOI = geometry.get_angle_of_incidence_limited(tilt, azimuth)
 
     # upper section of the fraction equation
     upper_fraction = math.e ** (-numpy.cos(numpy.radians(AOI)) / a_r) - math.e ** (-1.0 / a_r)
@@ -135,6 +154,59 @@ def __dni_reflected(dt: datetime, latitude, longitude, tilt, azimuth) -> float:
     return dni_reflected
 
 
+def dni_reflected_array(angle_of_incidence) -> numpy.ndarray:
+    """
+    Array version of __dni_reflected() which takes limited angles of incidence directly. Any array shape works.
+    :param angle_of_incidence: angles of incidence in degrees, limited to range 0 to 90
+    :return: reflected share of direct radiation in range [0,1]
+    """
+    a_r = reflectance_constant
+
+    upper_fraction = numpy.exp(-numpy.cos(numpy.radians(angle_of_incidence)) / a_r) - math.exp(-1.0 / a_r)
+    lower_fraction = 1.0 - math.exp(-1.0 / a_r)
+
+    return upper_fraction / lower_fraction
+
+
+def ghi_reflected_array(tilt, dtype=float) -> numpy.ndarray:
+    """
+    Array version of __ghi_reflected(), returns reflected share of ground reflected radiation for each panel tilt.
+    Computed in float64, dtype is the dtype of the returned array.
+    """
+    c1 = 4.0 / (3.0 * math.pi)
+    c2 = -0.074
+    a_r = reflectance_constant
+    panel_tilt = numpy.radians(numpy.asarray(tilt, dtype=float))
+
+    # tilt 0 divides 0 by 0 here, those values are replaced by 1 below
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        part1 = numpy.sin(panel_tilt) + (panel_tilt - numpy.sin(panel_tilt)) / (1.0 - numpy.cos(panel_tilt))
+
+    part2 = c1 * part1 + c2 * (part1 ** 2.0)
+    part3 = (-1.0 / a_r) * part2
+
+    return numpy.where(panel_tilt == 0, 1.0, numpy.exp(part3)).astype(dtype)
+
+
+def dhi_reflected_array(tilt, dtype=float) -> numpy.ndarray:
+    """
+    Array version of __dhi_reflected(), returns reflected share of diffuse radiation for each panel tilt.
+    Computed in float64, dtype is the dtype of the returned array.
+    """
+    c1 = 4.0 / (math.pi * 3.0)
+    c2 = -0.074
+    a_r = reflectance_constant
+    panel_tilt = numpy.radians(numpy.asarray(tilt, dtype=float))
+    pi = math.pi
+
+    part1 = numpy.sin(panel_tilt) + (pi - panel_tilt - numpy.sin(panel_tilt)) / (1.0 + numpy.cos(panel_tilt))
+
+    part2 = c1 * part1 + c2 * (part1 ** 2.0)
+    part3 = (-1.0 / a_r) * part2
+
+    return numpy.exp(part3).astype(dtype)
+
+
 def __ghi_reflected(tilt) -> float:
     """
     Computes a constant in range [0,1] which represents how much of ground reflected irradiation is reflected away from
@@ -11,7 +11,6 @@ between services before the fmi_pv_forecast becomes available.
 Author: kalliov (Viivi Kallio).
 Modifications by: TimoSalola (Timo Salola).
 """
-import datetime as dt
 from datetime import datetime
 from datetime import timedelta
 from datetime import timezone
@@ -19,25 +18,97 @@ from datetime import timezone
 import numpy as np
 import pandas
 import pandas as pd
-from fmiopendata.wfs import download_stored_query
+from fmiopendata.utils import read_url
+from fmiopendata.wfs import STORED_QUERY_URL
 from pvlib import location
 
+from fmi_pv_forecaster import clearsky_engine as clearsky_engine_module
+from fmi_pv_forecaster import disk_cache as disk_cache_module
+from fmi_pv_forecaster import forecast_cache
+from fmi_pv_forecaster import profiling
+from fmi_pv_forecaster import wfs_parser
+from fmi_pv_forecaster.helpers import astronomical_calculations
+
 cache_enabled = True
-last_load_time = None
-cached_data = None
 
+# cache entries older than this are not used, FMI forecasts only update every 3 hours so this could be much higher
 min_seconds_between_fmi_calls = 60
 
+# weather model runs are done every 3 hours starting from 00 UTC, used for cache keys
+model_run_interval_hours = 3
+
+# keyed forecast cache, forecasts for multiple sites can be cached at once
+cache = forecast_cache.ForecastCache(max_entries=64)
+
+# optional disk cache shared between processes, see set_disk_cache()
+disk_cache = None
+
+# per-site clear sky model, see clearsky_engine.py. None runs pvlib Location.get_clearsky() on every call
+clearsky_engine = clearsky_engine_module.ClearskyEngine()
+
+# FMI radiation values are accumulations over the hour before their timestamp. Forecast indices are shifted by this so
+# that each row is timed at the middle of its hour, 18:00 values are at 17:30 for example
+fmi_index_shift = timedelta(minutes=-30)
+
+# WFS stored query url, can be changed to point to a local test server
+stored_query_url = STORED_QUERY_URL
+
+collection_string = "fmi::forecast::harmonie::surface::point::multipointcoverage"
+
+# List the wanted MEPS parameters
+parameters = ["Temperature",
+              "RadiationGlobalAccumulation",
+              "RadiationNetSurfaceSWAccumulation",
+              "RadiationSWAccumulation",
+              "WindSpeedMS",
+              "TotalCloudCover"
+              ]
+
 
 def clear_cache():
     """
     Call this function to force cache clearing if cache is enabled.
-    This function is automatically called when geolocation is changed.
+    Cache entries are keyed by geolocation so changing the geolocation does not require clearing the cache.
     """
-    global last_load_time
-    global cached_data
-    last_load_time = None
-    cached_data = None
+    cache.clear()
+
+
+def set_disk_cache(directory, ttl_seconds=900):
+    """
+    Enables disk caching of processed forecasts in given directory. Set directory to None to disable disk caching.
+    Old cache files are removed when disk caching is enabled.
+    :param directory: Cache directory, can be shared between processes.
+    :param ttl_seconds: Cache files older than this are not used.
+    """
+    global disk_cache
+
+    if directory is None:
+        disk_cache = None
+        return
+
+    disk_cache = disk_cache_module.DiskCache(directory, ttl_seconds)
+    disk_cache.cleanup()
+
+
+def set_clearsky_engine(enabled, turbidity_file=None, max_sites=256):
+    """
+    Enables or disables the per-site clear sky engine, see clearsky_engine.py. Enabling replaces the current engine.
+    :param turbidity_file: Optional path of a memory-mapped copy of the turbidity climatology.
+    :param max_sites: Maximum number of sites held in memory.
+    """
+    global clearsky_engine
+
+    if enabled:
+        clearsky_engine = clearsky_engine_module.ClearskyEngine(turbidity_file, max_sites)
+    else:
+        clearsky_engine = None
+
+
+def get_cache_stats() -> dict:
+    """
+    Returns cache counters, see forecast_cache.ForecastCache.stats().
+    """
+    return cache.stats()
 
 
 def get_solar_azimuth_zenit_fast(sim_dt: datetime, latitude, longitude):
@@ -78,96 +149,211 @@ def collect_fmi_opendata(latitude: float, longitude: float,
     :return: Pandas dataframe with columns ["time", "dni", "dhi", "ghi", "dir_hi", "albedo", "T", "wind", "cloud_cover"]
     """
 
-    global cached_data
-    global cache_enabled
-    global last_load_time
+    if cache_enabled:
+        cache_key = __get_cache_key(latitude, longitude)
+        cached_data = __read_cache(cache_key, start_time, end_time)
 
-    time_now = datetime.now()
+        if cached_data is not None:
+            return cached_data
 
-    # print("checking caching")
+    # Collect data
+    coverage = __download_fmi_forecast([(latitude, longitude)], start_time, end_time)
+
+    print("Server call done.")
+
+    # checking if we got any data
+    if len(coverage) == 0:
+        __raise_no_data_error()
+
+    # using the first location as only one location was requested
+    times, columns = coverage.get_location(coverage.location_names[0])
+
+    with profiling.stage("fmi_processing", len(times)):
+        df = __fmi_columns_to_df(times, columns, latitude, longitude)
 
     if cache_enabled:
-        if last_load_time is None and cached_data is None:
-            # print("Cache enabled but no data in cache. Loading data as normal and saving data to cache.")
-            pass
-
-        elif last_load_time is not None and cached_data is not None:
-            # both last load time and cached data exist.
-            seconds_since_cache_update = round((time_now - last_load_time).total_seconds())
-
-            if seconds_since_cache_update > min_seconds_between_fmi_calls:
-                # print("Cache age is " + str(seconds_since_cache_update)+ " seconds. Retrieving new data.")
-                pass
-            else:
-                # print("Cache is new at " + str(seconds_since_cache_update) + " seconds. Reading data from cache.
-                # This line should not print")
-                pass
-            print("Cached server call done.")
+        __write_cache(cache_key, df, start_time, end_time)
+
+    return df
+
+
+def collect_fmi_opendata_for_sites(sites, start_time: datetime, end_time: datetime,
+                                   sites_per_request=20) -> list:
+    """
+    Batch version of collect_fmi_opendata(). Multiple sites are requested with a single FMI multipoint query instead of
+    making one server call per site. Large batches are split into chunks of sites_per_request sites.
+
+    Cached sites are read from cache, only the remaining sites are requested from FMI.
+
+    :param sites: List of (latitude, longitude) tuples, wgs84.
+    :param start_time:  2013-03-05T12:00:00Z ISO TIME
+    :param end_time:    2013-03-05T12:00:00Z ISO TIME
+    :param sites_per_request: Maximum number of sites in one server call.
+    :return: List of dataframes in the same order as sites, see collect_fmi_opendata() for columns.
+    """
+
+    results = [None] * len(sites)
+    cache_keys = [None] * len(sites)
+
+    # site -> indices of sites list, duplicate sites are only requested once
+    missing_sites = {}
+
+    for i, (latitude, longitude) in enumerate(sites):
+        if cache_enabled:
+            cache_keys[i] = __get_cache_key(latitude, longitude)
+            results[i] = __read_cache(cache_keys[i], start_time, end_time)
+
+        if results[i] is None:
+            missing_sites.setdefault((latitude, longitude), []).append(i)
+
+    missing_list = list(missing_sites.keys())
+
+    for chunk_start in range(0, len(missing_list), sites_per_request):
+        chunk = missing_list[chunk_start:chunk_start + sites_per_request]
+
+        coverage = __download_fmi_forecast(chunk, start_time, end_time)
+
+        print("Server call done for " + str(len(chunk)) + " sites.")
+
+        if len(coverage) == 0:
+            __raise_no_data_error()
+
+        location_names = __match_locations_to_sites(coverage.location_metadata, chunk)
+
+        for (latitude, longitude), location_name in zip(chunk, location_names):
+            times, columns = coverage.get_location(location_name)
+
+            with profiling.stage("fmi_processing", len(times)):
+                df = __fmi_columns_to_df(times, columns, latitude, longitude)
+
+            for i in missing_sites[(latitude, longitude)]:
+                results[i] = df
+
+            if cache_enabled:
+                __write_cache(cache_keys[missing_sites[(latitude, longitude)][0]], df, start_time, end_time)
+
+    return results
+
+
+def __get_cache_key(latitude, longitude):
+    """
+    Cache key for a site using the current weather model run.
+    """
+    return forecast_cache.make_cache_key(
+        latitude, longitude,
+        forecast_cache.model_run_time(datetime.now(timezone.utc).replace(tzinfo=None), model_run_interval_hours),
+        parameters)
+
+
+def __read_cache(cache_key, start_time, end_time):
+    """
+    Returns cached forecast from memory cache or disk cache, None if neither has it.
+    """
+    cached_data = cache.get(cache_key, start_time, end_time, min_seconds_between_fmi_calls)
+
+    if cached_data is not None:
+        print("Cached server call done.")
+        return cached_data
+
+    if disk_cache is not None:
+        cached_data = disk_cache.get(cache_key, start_time, end_time)
+
+        if cached_data is not None:
+            print("Disk cached server call done.")
+            cache.put(cache_key, cached_data, start_time, end_time)
             return cached_data
-        else:
-            raise Exception(
-                "Something wrong with caching. Last load time " + str(last_load_time))
-
-    collection_string = "fmi::forecast::harmonie::surface::point::multipointcoverage"
-
-    # List the wanted MEPS parameters
-    parameters = ["Temperature",
-                  "RadiationGlobalAccumulation",
-                  "RadiationNetSurfaceSWAccumulation",
-                  "RadiationSWAccumulation",
-                  "WindSpeedMS",
-                  "TotalCloudCover"
-                  ]
+
+    return None
+
+
+def __write_cache(cache_key, df, start_time, end_time):
+    """
+    Stores forecast to memory cache and disk cache if disk cache is enabled.
+    """
+    cache.put(cache_key, df, start_time, end_time)
+
+    if disk_cache is not None:
+        disk_cache.put(cache_key, df, start_time, end_time)
+
+
+def __download_fmi_forecast(sites, start_time, end_time):
+    """
+    Makes a single FMI multipointcoverage query for one or more sites.
+    :param sites: List of (latitude, longitude) tuples.
+    :return: wfs_parser.MultiPointCoverage object
+    """
+
+    with profiling.stage("fmi_download", len(sites)):
+        response = read_url(__get_query_url(sites, start_time, end_time))
+
+    with profiling.stage("fmi_parse", len(sites)):
+        return wfs_parser.parse_multipointcoverage(response)
+
+
+def __get_query_url(sites, start_time, end_time) -> str:
+    """
+    Stored query url for given sites and time window.
+    """
+
     parameters_str = ','.join(parameters)
 
-    # Collect data
+    args = ["latlon=" + str(latitude) + "," + str(longitude) for latitude, longitude in sites]
+    args += ["starttime=" + str(start_time),
+             "endtime=" + str(end_time),
+             'parameters=' + parameters_str]
 
-    latlon = str(latitude) + "," + str(longitude)
-    snd = download_stored_query(collection_string,
-                                args=["latlon=" + latlon,
-                                      "starttime=" + str(start_time),
-                                      "endtime=" + str(end_time),
-                                      'parameters=' + parameters_str])
-    data = snd.data
+    return stored_query_url + collection_string + "&" + "&".join(args)
 
-    print("Server call done.")
 
-    # checking if we got any data
-    if len(data) == 0:
-        raise Exception("FMI open data did not return a forecast with valid values. Check that geolocation is within "
-                        "harmonie-arome model area shown in https://en.ilmatieteenlaitos.fi/weather-forecast-models "
-                        "and that requested time interval contains hours between now("
-                        + str(datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M")) + ") and "
-                        "forecast interval end "
-                        + str((datetime.now(timezone.utc) + timedelta(hours=66)).strftime("%Y-%m-%d %H:%M")))
-
-    # print("Got " + str(len(data))+ " values as forecast.")
-
-    # Times to use in forming dataframe
-    data_list = []
-    # Make the dict of dict of dict of.. into pandas dataframe
-    for time_a, location_data in data.items():
-        location = list(location_data.keys())[0]  # Get the location dynamically
-        values = location_data[location]
-
-        data_list.append({'Time': time_a,
-                          'T': values['Air temperature']['value'],
-                          'GHI_accum': values['Global radiation accumulation']['value'],
-                          'NetSW_accum': values['Net short wave radiation accumulation at the surface']['value'],
-                          'DirHI_accum': values['Short wave radiation accumulation']['value'],
-                          'Wind speed': values['Wind speed']['value'],
-                          'Total cloud cover': values['Total cloud cover']['value']})
-
-    # Create a DataFrame and set time as index
-    df = pd.DataFrame(data_list)
-
-    df.set_index('Time', inplace=True)
+def __match_locations_to_sites(location_metadata, sites) -> list:
+    """
+    FMI names the returned locations, this function finds the returned location nearest to each requested site.
+    :param location_metadata: dict of location name -> {"latitude": float, "longitude": float, ...}
+    :param sites: List of (latitude, longitude) tuples.
+    :return: List of location names in the same order as sites.
+    """
+
+    names = list(location_metadata.keys())
+    coordinates = np.array([[location_metadata[name]["latitude"], location_metadata[name]["longitude"]]
+                            for name in names])
+
+    location_names = []
+    for latitude, longitude in sites:
+        distances = (coordinates[:, 0] - latitude) ** 2 + (coordinates[:, 1] - longitude) ** 2
+        location_names.append(names[int(np.argmin(distances))])
+
+    return location_names
+
+
+def __raise_no_data_error():
+    raise Exception("FMI open data did not return a forecast with valid values. Check that geolocation is within "
+                    "harmonie-arome model area shown in https://en.ilmatieteenlaitos.fi/weather-forecast-models "
+                    "and that requested time interval contains hours between now("
+                    + str(datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M")) + ") and "
+                    "forecast interval end "
+                    + str((datetime.now(timezone.utc) + timedelta(hours=66)).strftime("%Y-%m-%d %H:%M")))
+
+
+def __fmi_columns_to_df(times, columns: dict, latitude, longitude) -> pandas.DataFrame:
+    """
+    Turns FMI parameter values of a single location into a radiation dataframe.
+    :param times: Array of forecast times, UTC.
+    :param columns: dict of parameter name -> array of values, see parameters.
+    :return: Pandas dataframe with columns ["dni", "dhi", "ghi", "albedo", "T", "wind", "cloud_cover"]
+    """
+
+    df = pd.DataFrame({'T': columns['Temperature'],
+                       'GHI_accum': columns['RadiationGlobalAccumulation'],
+                       'NetSW_accum': columns['RadiationNetSurfaceSWAccumulation'],
+                       'DirHI_accum': columns['RadiationSWAccumulation'],
+                       'Wind speed': columns['WindSpeedMS'],
+                       'Total cloud cover': columns['TotalCloudCover']},
+                      index=pd.DatetimeIndex(np.asarray(times, dtype="datetime64[ns]"), name="Time"))
 
     # index shift added since index is used as the time input of PVlib functions and using index is much easier
     # than using a separate time column
-    df["time"] = df.index.copy()  # time backup
     # timeshift has to be here
-    df.index = df.index + dt.timedelta(minutes=-30)
+    df.index = df.index + fmi_index_shift
 
     # Calculate instant from accumulated values (only radiation parameters)
     diff = df.diff()
@@ -191,8 +377,9 @@ def collect_fmi_opendata(latitude: float, longitude: float,
     df['DHI'] = df['GHI'] - df['DirHI']
     #
 
-    # Adding solar zenith angle to df
-    df["sza"] = get_solar_azimuth_zenit_fast(df.index, latitude, longitude)[1]
+    # Adding solar zenith angle to df. Geometry is shared with process_radiation_df() so solar position is computed
+    # only once for the forecast.
+    df["sza"] = astronomical_calculations.get_solar_geometry(df.index, latitude, longitude).solar_apparent_zenith
     # solar zenit angle added
 
     # Calculate dni from dhi
@@ -215,10 +402,6 @@ def collect_fmi_opendata(latitude: float, longitude: float,
     # of odd symptoms in the PV model pipeline
     # df.index = df.index + dt.timedelta(minutes=-30)
 
-    if cache_enabled:
-        cached_data = df
-        last_load_time = time_now
-
     return df
 
 
@@ -233,19 +416,25 @@ def __get_irradiance_pvlib(latitude, longitude, date_start: datetime, date_end:
 
     data_resolution = minutes_between_measurements
 
-    # creating site data required by pvlib poa
-    site = location.Location(latitude, longitude)
-
     # measurement frequency, for example "15min" or "60min"
     measurement_frequency = str(data_resolution) + "min"
 
     times = pd.date_range(start=date_start,
                           end=date_end,  # year + day for which the irradiance is calculated
                           freq=measurement_frequency,  # take measurement every 60 minutes
-                          tz=site.tz)  # timezone
+                          tz="UTC")  # timezone
+
+    engine = clearsky_engine
+
+    if engine is not None:
+        # altitude, turbidity and already computed rows are reused
+        clearsky = engine.get_clearsky(times, latitude, longitude)
+    else:
+        # creating site data required by pvlib poa
+        site = location.Location(latitude, longitude)
 
-    # creating a clear sky and solar position entities
-    clearsky = site.get_clearsky(times)
+        # creating a clear sky and solar position entities
+        clearsky = site.get_clearsky(times)
 
     # adds index as a separate time column, for some reason this is required as even a named index is not callable
     # with df[index_name] and df.index is not supported by function apply structures
@@ -0,0 +1,311 @@
+"""
+This file contains forecast error metrics against measured PV output.
+
+Forecasts and measurements are rarely on the same time grid. FMI forecast rows are means over an hour and are timed at
+the middle of the hour(18:00 FMI values are at 17:30, see meps_loader.fmi_index_shift), while measurements can be
+instantaneous samples or period means at any resolution and labeled with the start, middle or end of their period.
+Comparing them at matching timestamps would compare an hourly mean to a single sample, or the forecast of one hour
+to the measurement of the next.
+
+Here each forecast row is compared to the mean of the measurements within the period the row represents. A forecast
+row at time t with time step s represents [t - s/2, t + s/2), so hh:30 rows of hourly FMI forecasts are compared to
+measurements from hh:00 to hh+1:00 and 15 minute forecasts at hh:15 to measurements from hh:07:30 to hh:22:30.
+Measurement timestamps are first moved to the middle of their own period based on measurement_label. Periods with less
+than min_coverage of the expected measurements are left out.
+
+Alignment and metrics are computed with NumPy integer time bins and pandas groupby, without python loops over rows, so
+millions of rows of a whole fleet are handled in seconds.
+
+Metrics:
+count: number of compared rows
+mean_measured: mean measured output
+bias: mean of forecast - measured
+mae: mean absolute error
+rmse: root mean squared error
+skill: 1 - rmse / rmse of the reference forecast, only with a reference column. Clear sky output can be added as
+reference with add_clearsky_output(), skill is then the improvement of the forecast over assuming clear sky.
+
+Example:
+measurements = metrics.read_measurements("site_power.csv", value_column="power", timezone="Europe/Helsinki")
+aligned = metrics.align_measurements(pvfc.get_default_fmi_forecast(system=system), measurements)
+aligned = metrics.add_clearsky_output(aligned, system)
+print(metrics.compute_metrics(aligned, reference_column="clearsky"))
+"""
+
+import numpy
+import pandas
+
+from fmi_pv_forecaster import clearsky_engine as clearsky_engine_module
+from fmi_pv_forecaster import meps_loader
+from fmi_pv_forecaster import pv_forecaster
+from fmi_pv_forecaster import stream_writer
+from fmi_pv_forecaster.helpers import astronomical_calculations
+
+measurement_labels = ["start", "middle", "end"]
+
+# periods with less than this fraction of the expected number of measurements are not compared
+default_min_coverage = 0.5
+
+
+def read_measurements(path, time_column="time", value_column="output", site_column=None, timezone=None,
+                      file_format=None) -> pandas.DataFrame:
+    """
+    Reads measured PV output from a csv or parquet file.
+    :param path: File path.
+    :param time_column: Name of the time column.
+    :param value_column: Name of the measured output column.
+    :param site_column: Optional name of a site id column, for files with measurements of multiple sites.
+    :param timezone: Timezone of timezone naive times, "Europe/Helsinki" for example. Naive times are assumed to be UTC
+    if not given, times with an utc offset are always converted with their own offset. Times which do not exist or are
+    ambiguous due to daylight saving time changes are dropped.
+    :param file_format: "csv" or "parquet", read from file extension if not given.
+    :return: Dataframe with timezone naive UTC index "time", column "measured" and column "site" if site_column is
+    given. Rows are in time order and rows without a time or value are dropped.
+    """
+
+    if file_format is None:
+        file_format = stream_writer.get_file_format(path)
+
+    columns = [time_column, value_column] + ([site_column] if site_column is not None else [])
+
+    if file_format == "csv":
+        data = pandas.read_csv(path, usecols=columns)
+    elif file_format == "parquet":
+        data = pandas.read_parquet(path, columns=columns)
+    else:
+        raise ValueError("Unknown file format " + str(file_format) + ", should be one of "
+                         + str(stream_writer.file_formats))
+
+    measurements = pandas.DataFrame({"measured": pandas.to_numeric(data[value_column], errors="coerce").to_numpy()},
+                                    index=pandas.DatetimeIndex(__to_utc(data[time_column], timezone), name="time"))
+    if site_column is not None:
+        measurements["site"] = data[site_column].to_numpy()
+
+    measurements = measurements[measurements.index.notna() & measurements["measured"].notna()]
+
+    return measurements.sort_index(kind="stable")
+
+
+def __to_utc(times, timezone) -> pandas.DatetimeIndex:
+    """
+    Parses times to timezone naive UTC, see read_measurements().
+    """
+    if timezone is None:
+        return pandas.DatetimeIndex(pandas.to_datetime(times, utc=True)).tz_localize(None)
+
+    times = pandas.DatetimeIndex(pandas.to_datetime(times))
+    if times.tz is None:
+        times = times.tz_localize(timezone, ambiguous="NaT", nonexistent="NaT")
+
+    return times.tz_convert("UTC").tz_localize(None)
+
+
+def align_measurements(forecast: pandas.DataFrame, measurements, measurement_label="middle",
+                       measurement_resolution=None, forecast_resolution=None, min_coverage=default_min_coverage,
+                       site_column="site") -> pandas.DataFrame:
+    """
+    Adds the mean measured output of the period of each forecast row to the forecast, see module docstring.
+    :param forecast: Forecast dataframe with a datetime index, for example output of get_default_fmi_forecast() or the
+    long table of backtest.py. Timezone naive times are assumed to be UTC.
+    :param measurements: Series of measured output or dataframe with column "measured", see read_measurements().
+    :param measurement_label: "start", "middle" or "end", which part of its period each measurement timestamp labels.
+    Use "middle" for instantaneous samples.
+    :param measurement_resolution: Pandas timedelta or frequency string, measurement period length. Median step of the
+    measurements if not given.
+    :param forecast_resolution: Forecast time step, smallest step of the forecast if not given.
+    :param min_coverage: Fraction of expected measurements a period needs to be compared, 0 to 1.
+    :param site_column: Site id column. Used when both forecast and measurements have it, forecast rows are then
+    compared to measurements of the same site.
+    :return: Copy of forecast with column "measured", NaN for rows without enough measurements.
+    """
+
+    if measurement_label not in measurement_labels:
+        raise ValueError("Unknown measurement label " + str(measurement_label) + ", should be one of "
+                         + str(measurement_labels))
+    if not 0 <= min_coverage <= 1:
+        raise ValueError("min_coverage should be between 0 and 1, got " + str(min_coverage))
+
+    if isinstance(measurements, pandas.Series):
+        measurements = measurements.to_frame("measured")
+
+    forecast_times = pv_forecaster.__to_utc_nanoseconds(forecast.index)
+    measured_times = pv_forecaster.__to_utc_nanoseconds(measurements.index)
+
+    forecast_step = __get_step(forecast_times, forecast_resolution, "forecast", numpy.min)
+    measurement_step = __get_step(measured_times, measurement_resolution, "measurement", numpy.median)
+
+    # moving measurement timestamps to the middle of their periods
+    if measurement_label == "start":
+        measured_times = measured_times + measurement_step // 2
+    elif measurement_label == "end":
+        measured_times = measured_times - measurement_step // 2
+
+    # forecast rows are at the middle of their periods, anchored to the first forecast time
+    anchor = forecast_times.min() - forecast_step // 2
+    forecast_bins = (forecast_times - anchor) // forecast_step
+    measured_bins = (measured_times - anchor) // forecast_step
+
+    measured_values = measurements["measured"].to_numpy(dtype=float)
+    valid = numpy.isfinite(measured_values)
+
+    use_sites = site_column in forecast.columns and site_column in measurements.columns
+
+    keys = {"bin": measured_bins[valid]}
+    if use_sites:
+        keys = {"site": measurements[site_column].to_numpy()[valid], "bin": measured_bins[valid]}
+
+    grouped = pandas.DataFrame(dict(keys, measured=measured_values[valid])).groupby(list(keys))["measured"]
+    means = grouped.mean()
+    counts = grouped.count()
+
+    expected_count = max(1.0, forecast_step / measurement_step)
+    means = means[counts >= min_coverage * expected_count]
+
+    if use_sites:
+        rows = pandas.MultiIndex.from_arrays([forecast[site_column].to_numpy(), forecast_bins])
+    else:
+        rows = pandas.Index(forecast_bins)
+
+    position = means.index.get_indexer(rows)
+    aligned_values = numpy.where(position >= 0, means.to_numpy()[position], numpy.nan)
+
+    aligned = forecast.copy(deep=False)
+    aligned["measured"] = aligned_values
+    return aligned
+
+
+def __get_step(times: numpy.ndarray, resolution, name, statistic) -> int:
+    """
+    Returns time step in nanoseconds, given resolution or statistic of the steps between unique times.
+    """
+    if resolution is not None:
+        step = pandas.Timedelta(resolution).value
+    else:
+        steps = numpy.diff(numpy.unique(times))
+        if len(steps) == 0:
+            raise ValueError("Can not tell " + name + " resolution from a single timestamp, give it as a parameter.")
+        step = int(statistic(steps))
+
+    if step <= 0:
+        raise ValueError(name.capitalize() + " resolution should be positive, got " + str(pandas.Timedelta(step)))
+
+    return step
+
+
+def add_clearsky_output(data: pandas.DataFrame, systems, site_column="site", column="clearsky") -> pandas.DataFrame:
+    """
+    Adds the clear sky output of each row as a reference forecast for skill scores. Clear sky radiation is computed
+    at the row times with the clear sky engine, so clear sky output of hh:30 rows is the output at the middle of the
+    hour.
+    :param data: Forecast or aligned dataframe with a datetime index.
+    :param systems: PVSystem, or for data with a site column, a dict of site id -> PVSystem or a list of PVSystems
+    indexed by site id as in backtest.py.
+    :param column: Name of the added column.
+    :return: Copy of data with the clear sky output column.
+    """
+
+    if isinstance(systems, (list, tuple)):
+        systems = dict(enumerate(systems))
+
+    if isinstance(systems, dict):
+        if site_column not in data.columns:
+            raise ValueError("Data has no column " + str(site_column) + ", give a single PVSystem instead.")
+        site_ids = data[site_column].to_numpy()
+    else:
+        site_ids = numpy.zeros(len(data), dtype=int)
+        systems = {0: systems}
+
+    times = pandas.DatetimeIndex(pv_forecaster.__to_utc_nanoseconds(data.index).astype("datetime64[ns]"))
+    clearsky = numpy.full(len(data), numpy.nan)
+
+    for site_id in pandas.unique(site_ids):
+        if site_id not in systems:
+            raise ValueError("No PVSystem for site " + str(site_id) + ".")
+
+        rows = numpy.flatnonzero(site_ids == site_id)
+
+        # backtests contain the same times once per model run, each time is simulated once
+        unique_times, inverse = numpy.unique(times[rows].as_unit("ns").asi8, return_inverse=True)
+        clearsky[rows] = __get_clearsky_output(pandas.DatetimeIndex(unique_times.astype("datetime64[ns]")),
+                                               systems[site_id])[inverse.reshape(-1)]
+
+    data = data.copy(deep=False)
+    data[column] = clearsky
+    return data
+
+
+def __get_clearsky_output(times: pandas.DatetimeIndex, system) -> numpy.ndarray:
+    """
+    Clear sky output of system at given UTC times.
+    """
+    system.check_location()
+
+    engine = meps_loader.clearsky_engine
+    if engine is None:
+        engine = clearsky_engine_module.ClearskyEngine()
+
+    geometry = astronomical_calculations.get_solar_geometry(times, system.latitude, system.longitude)
+    radiation = engine.get_clearsky_for_geometry(geometry)
+
+    return pv_forecaster.process_radiation_df(radiation, system, columns=["output"], inplace=True)["output"].to_numpy(
+        dtype=float)
+
+
+def compute_metrics(aligned: pandas.DataFrame, by=None, forecast_column="output", measured_column="measured",
+                    reference_column=None) -> pandas.DataFrame:
+    """
+    Computes error metrics of aligned forecasts, see module docstring for the metrics.
+    :param aligned: Dataframe with forecast and measured columns, see align_measurements().
+    :param by: Optional column name or list of column names to compute metrics for, for example "horizon_hours" for
+    per-horizon errors or ["site", "horizon_hours"].
+    :param forecast_column: Forecast column.
+    :param measured_column: Measured column.
+    :param reference_column: Optional reference forecast column, for example "clearsky". Adds reference_rmse and skill.
+    :return: Dataframe with one row of metrics, or one row per group indexed by the by columns. Only rows where all the
+    used columns have values are included.
+    """
+
+    forecast = aligned[forecast_column].to_numpy(dtype=float)
+    measured = aligned[measured_column].to_numpy(dtype=float)
+    valid = numpy.isfinite(forecast) & numpy.isfinite(measured)
+
+    error = forecast - measured
+    sums = {"count": numpy.ones(len(aligned)), "mean_measured": measured, "bias": error, "mae": numpy.abs(error),
+            "rmse": error ** 2}
+
+    if reference_column is not None:
+        reference = aligned[reference_column].to_numpy(dtype=float)
+        valid &= numpy.isfinite(reference)
+        sums["reference_rmse"] = (reference - measured) ** 2
+
+    sums = pandas.DataFrame({name: values[valid] for name, values in sums.items()})
+
+    if by is None:
+        totals = sums.sum().to_frame().T
+    else:
+        by = [by] if isinstance(by, str) else list(by)
+        keys = [aligned[column].to_numpy()[valid] for column in by]
+        totals = sums.groupby(keys, sort=True).sum()
+        totals.index.names = by
+
+    count = totals["count"].to_numpy()
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        for name in ["mean_measured", "bias", "mae", "rmse"] + (["reference_rmse"] if reference_column else []):
+            totals[name] = totals[name] / count
+        totals["rmse"] = numpy.sqrt(totals["rmse"])
+
+        if reference_column is not None:
+            totals["reference_rmse"] = numpy.sqrt(totals["reference_rmse"])
+            totals["skill"] = 1 - totals["rmse"] / totals["reference_rmse"]
+
+    totals["count"] = totals["count"].astype(int)
+    return totals
+
+
+def get_horizon_metrics(aligned: pandas.DataFrame, forecast_column="output", reference_column=None,
+                        horizon_column="horizon_hours") -> pandas.DataFrame:
+    """
+    Per-horizon metrics of backtest output, see compute_metrics().
+    """
+    return compute_metrics(aligned, by=horizon_column, forecast_column=forecast_column,
+                           reference_column=reference_column)
@@ -0,0 +1,105 @@
+"""
+This file contains conversions of forecast dataframes into other output formats.
+
+The PV model itself runs on pandas, but many consumers of the forecasts are not pandas based. Converting with
+DataFrame.to_records() or pyarrow.Table.from_pandas() copies the data and carries pandas metadata along. The functions
+here read the column arrays of the output dataframe directly, so numeric columns are passed on without copies where
+the target format allows it.
+
+Output formats:
+"pandas": pandas DataFrame, default.
+"arrow": pyarrow.Table with a "time" column followed by the selected columns. Requires pyarrow.
+"numpy": NumPy structured array with a "time" field followed by the selected columns, times are UTC datetime64[ns].
+"dict": Dict of "time" and column name -> NumPy array, arrays are views to the dataframe where possible.
+
+Columns can be selected with the columns parameter, all columns of the dataframe are included by default. Use extended
+output to make intermediate model columns available for selection.
+"""
+
+import numpy
+import pandas
+
+output_formats = ["pandas", "arrow", "numpy", "dict"]
+
+
+def convert_output(data: pandas.DataFrame, output_format="pandas", columns=None):
+    """
+    Converts a forecast dataframe to given output format, see module docstring.
+    :param data: Forecast dataframe with a datetime index.
+    :param output_format: "pandas", "arrow", "numpy" or "dict".
+    :param columns: Optional list of columns to include, all columns if not given.
+    :return: Forecast in given format.
+    """
+
+    if output_format not in output_formats:
+        raise ValueError("Unknown output format " + str(output_format) + ", should be one of " + str(output_formats))
+
+    if output_format == "pandas" and columns is None:
+        return data
+
+    if columns is not None:
+        missing_columns = [column for column in columns if column not in data.columns]
+        if len(missing_columns) > 0:
+            raise ValueError("Columns " + str(missing_columns) + " are not in the output, available columns are "
+                             + str(list(data.columns)) + ". Intermediate model columns require extended output.")
+    else:
+        columns = list(data.columns)
+
+    if output_format == "pandas":
+        return data[columns]
+
+    # time is included from the index, extended output may also have it as a column
+    columns = [column for column in columns if column != "time"]
+
+    if output_format == "arrow":
+        return __to_arrow(data, columns)
+
+    arrays = {"time": __get_utc_times(data.index)}
+    for column in columns:
+        arrays[column] = data[column].to_numpy()
+
+    if output_format == "dict":
+        return arrays
+
+    structured = numpy.empty(len(data), dtype=[(name, array.dtype) for name, array in arrays.items()])
+    for name, array in arrays.items():
+        structured[name] = array
+
+    return structured
+
+
+def write_parquet(data: pandas.DataFrame, path, columns=None):
+    """
+    Writes a forecast dataframe to a Parquet file with a "time" column followed by the selected columns. Requires
+    pyarrow.
+    :param data: Forecast dataframe with a datetime index.
+    :param path: Output file path.
+    :param columns: Optional list of columns to include, all columns if not given.
+    """
+    table = convert_output(data, "arrow", columns)
+
+    import pyarrow.parquet
+    pyarrow.parquet.write_table(table, path)
+
+
+def __to_arrow(data, columns):
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError("Arrow output requires pyarrow, install it with: pip install pyarrow")
+
+    arrays = [pyarrow.array(data.index)]
+    for column in columns:
+        arrays.append(pyarrow.array(data[column].to_numpy()))
+
+    return pyarrow.Table.from_arrays(arrays, names=["time"] + list(columns))
+
+
+def __get_utc_times(index) -> numpy.ndarray:
+    """
+    Returns index as UTC datetime64[ns], numpy does not support timezones.
+    """
+    if isinstance(index, pandas.DatetimeIndex) and index.tz is not None:
+        index = index.tz_convert(None)
+
+    return numpy.asarray(index, dtype="datetime64[ns]")
@@ -0,0 +1,184 @@
+"""
+This file contains process pool based runners for forecasting many PV systems or long time periods.
+
+The PV model runs on pandas and pvlib which hold the GIL for most of the time, so threads do not make forecasts much
+faster. The functions here split work by system or by time chunk and run the chunks in a
+concurrent.futures.ProcessPoolExecutor. Results are always returned in input order, or in time order for time chunks,
+so the output does not depend on the number of workers or on which worker finishes first.
+
+FMI forecasts are downloaded in the calling process with batched server calls, see
+meps_loader.collect_fmi_opendata_for_sites(). Only the PV model is run in worker processes. This way the FMI cache of
+the calling process is used and worker processes do not make server calls of their own.
+
+All functions take:
+max_workers: Number of worker processes, os.cpu_count() if None. 1 runs everything in the calling process.
+mp_context: Optional multiprocessing context, for example multiprocessing.get_context("spawn").
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas
+
+from fmi_pv_forecaster import pv_forecaster
+
+# systems per worker task, larger values mean less inter-process communication but worse load balancing
+default_systems_per_task = 8
+
+# days per worker task when processing long time periods
+default_days_per_task = 30
+
+
+def run_in_process_pool(function, arguments: list, max_workers=None, tasks_per_chunk=1, mp_context=None) -> list:
+    """
+    Calls function(*args) for each args tuple of arguments in a process pool.
+    :param function: Module level function, has to be picklable.
+    :param arguments: List of argument tuples.
+    :param tasks_per_chunk: Number of calls sent to a worker at once.
+    :return: List of results in the same order as arguments.
+    """
+
+    if tasks_per_chunk < 1:
+        raise ValueError("tasks_per_chunk should be 1 or more, got " + str(tasks_per_chunk))
+
+    chunks = [arguments[i:i + tasks_per_chunk] for i in range(0, len(arguments), tasks_per_chunk)]
+
+    if max_workers == 1 or len(chunks) <= 1:
+        chunk_results = [__run_chunk(function, chunk) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=mp_context) as executor:
+            # executor.map returns results in submission order
+            chunk_results = list(executor.map(__run_chunk, [function] * len(chunks), chunks))
+
+    return [result for chunk_result in chunk_results for result in chunk_result]
+
+
+def __run_chunk(function, chunk: list) -> list:
+    return [function(*args) for args in chunk]
+
+
+"""
+Sharding by system:
+"""
+
+
+def process_radiation_dfs(radiation_dfs: list, systems: list, max_workers=None,
+                          systems_per_task=default_systems_per_task, mp_context=None) -> list:
+    """
+    Parallel version of process_radiation_df() for many systems.
+    :param radiation_dfs: List of radiation dataframes, one per system.
+    :param systems: List of PVSystems.
+    :return: List of output dataframes in the same order as systems.
+    """
+
+    if len(radiation_dfs) != len(systems):
+        raise ValueError("Got " + str(len(radiation_dfs)) + " radiation dataframes for " + str(len(systems))
+                         + " systems.")
+
+    return run_in_process_pool(pv_forecaster.process_radiation_df, list(zip(radiation_dfs, systems)),
+                               max_workers, systems_per_task, mp_context)
+
+
+def get_clearsky_estimates_for_interval(interval_start, interval_end, systems: list, timestep=60, max_workers=None,
+                                        systems_per_task=default_systems_per_task, mp_context=None) -> list:
+    """
+    Parallel version of get_clearsky_estimate_for_interval() for many systems.
+    :return: List of output dataframes in the same order as systems.
+    """
+
+    arguments = [(interval_start, interval_end, timestep, system) for system in systems]
+
+    return run_in_process_pool(pv_forecaster.get_clearsky_estimate_for_interval, arguments, max_workers,
+                               systems_per_task, mp_context)
+
+
+def get_default_fmi_forecasts(systems: list, interpolate=False, max_workers=None,
+                              systems_per_task=default_systems_per_task, sites_per_request=20,
+                              mp_context=None, upsampling="linear") -> list:
+    """
+    Parallel version of get_default_fmi_forecast() for many systems. FMI data is downloaded in the calling process,
+    see module docstring.
+    :param systems: List of PVSystems.
+    :param interpolate: See get_default_fmi_forecast().
+    :param upsampling: See get_default_fmi_forecast().
+    :param sites_per_request: Sites per FMI server call.
+    :return: List of output dataframes in the same order as systems.
+    """
+
+    for system in systems:
+        system.check_location()
+        system.check_angles()
+
+    radiation_dfs = pv_forecaster.get_fmi_radiation_forecast_for_sites(
+        [(system.latitude, system.longitude) for system in systems], sites_per_request)
+
+    # upsampling geometry is not sent to the workers, they compute solar position themselves
+    radiation_dfs = [pv_forecaster.__interpolate_radiation(data, interpolate, upsampling, system)[0]
+                     for data, system in zip(radiation_dfs, systems)]
+
+    return process_radiation_dfs(radiation_dfs, systems, max_workers, systems_per_task, mp_context)
+
+
+"""
+Sharding by time:
+"""
+
+
+def process_radiation_df_in_time_chunks(data: pandas.DataFrame, system=None, max_workers=None,
+                                        days_per_task=default_days_per_task, mp_context=None) -> pandas.DataFrame:
+    """
+    Parallel version of process_radiation_df() for long radiation dataframes such as multi year histories. Each row is
+    modeled independently, so the dataframe is split into chunks of days_per_task days which are processed in
+    parallel and concatenated back in time order.
+    :param data: Radiation dataframe with a datetime index, see process_radiation_df().
+    :param system: PVSystem, default system is used if not given.
+    :return: Output dataframe, same as process_radiation_df() would return.
+    """
+
+    if system is None:
+        system = pv_forecaster.default_system.copy()
+
+    if len(data) == 0:
+        return pv_forecaster.process_radiation_df(data, system)
+
+    chunk_starts = pandas.date_range(data.index[0], data.index[-1], freq=str(days_per_task) + "D")
+    chunk_numbers = chunk_starts.searchsorted(data.index, side="right") - 1
+
+    arguments = [(data[chunk_numbers == i], system) for i in range(len(chunk_starts))]
+    arguments = [(chunk, chunk_system) for chunk, chunk_system in arguments if len(chunk) > 0]
+
+    results = run_in_process_pool(pv_forecaster.process_radiation_df, arguments, max_workers, 1, mp_context)
+
+    return pandas.concat(results)
+
+
+def get_clearsky_estimate_in_time_chunks(interval_start, interval_end, timestep=60, system=None, max_workers=None,
+                                         days_per_task=default_days_per_task, mp_context=None) -> pandas.DataFrame:
+    """
+    Parallel version of get_clearsky_estimate_for_interval() for long intervals. Interval is split into chunks of
+    days_per_task days, chunk boundaries stay on the timestep grid of the whole interval.
+    :return: Output dataframe, same as get_clearsky_estimate_for_interval() would return.
+    """
+
+    if system is None:
+        system = pv_forecaster.default_system.copy()
+
+    system.check_location()
+    system.check_angles()
+
+    # same grid aligned chunks as get_clearsky_estimate_chunks()
+    intervals = pv_forecaster.__get_clearsky_chunk_intervals(interval_start, interval_end, timestep,
+                                                             str(days_per_task) + "D")
+    arguments = [(chunk_start, chunk_end, timestep, system) for chunk_start, chunk_end in intervals]
+
+    results = run_in_process_pool(__get_clearsky_estimate_for_chunk, arguments, max_workers, 1, mp_context)
+
+    return pandas.concat(results)
+
+
+def __get_clearsky_estimate_for_chunk(chunk_start, chunk_end, timestep, system) -> pandas.DataFrame:
+    """
+    Clear sky estimate for a grid aligned chunk, chunk start is used as is.
+    """
+    data = pv_forecaster.__get_clearsky_radiation_for_interval(chunk_start, chunk_end, timestep, system)
+
+    return pv_forecaster.process_radiation_df(data, system, inplace=True)
@@ -0,0 +1,224 @@
+"""
+This file contains optional per-stage instrumentation of the PV pipeline.
+
+A slow forecast refresh can come from the FMI server, from parsing the response or from the PV model itself. When
+profiling is enabled, each stage of FMI retrieval and process_radiation_df() records wall time, number of rows and
+optionally the number of bytes allocated during the stage. Measurements are collected into per-stage totals and can be
+passed to a callback, written to logs or exported in the Prometheus text format.
+
+Stages:
+"fmi_download": FMI server call, rows are requested sites.
+"fmi_parse": parsing of the FMI XML response, rows are requested sites.
+"fmi_processing": accumulated FMI values to radiation dataframe, rows are forecast rows.
+"interpolation": resampling FMI forecasts to a finer time resolution, rows are output rows.
+"solar_geometry": solar position, air mass and extraterrestrial radiation.
+"dni_transposition": DNI projection to plane of array.
+"perez": DHI projection to plane of array with the Perez-Driesse model.
+"reflection": reflection losses of the projected components.
+"temperature": panel temperature model.
+"output": Huld output model.
+
+Allocated bytes are measured with tracemalloc when trace_memory is enabled. Tracemalloc slows down all Python memory
+allocations significantly, so it should only be enabled while investigating memory use. Allocated bytes are the growth
+of traced memory during the stage, memory allocated by other threads at the same time is included.
+
+Profiling is disabled by default and then costs a single check per stage.
+"""
+
+import contextlib
+import logging
+import threading
+import time
+import tracemalloc
+
+stages = ["fmi_download", "fmi_parse", "fmi_processing", "interpolation", "solar_geometry", "dni_transposition",
+          "perez", "reflection", "temperature", "output"]
+
+# active profiler, None when profiling is disabled
+profiler = None
+
+logger = logging.getLogger(__name__)
+
+# returned by stage() when profiling is disabled, nullcontext is stateless so the same object can be reused
+__disabled_stage = contextlib.nullcontext()
+
+
+class StageRecord:
+    """
+    Measurements of a single run of a pipeline stage.
+
+    Attributes:
+    name: stage name, see module docstring
+    rows: number of rows processed
+    seconds: wall time in seconds
+    allocated_bytes: growth of traced memory in bytes, None if memory tracing is not enabled
+    """
+
+    def __init__(self, name, rows=0):
+        self.name = name
+        self.rows = rows
+        self.seconds = 0.0
+        self.allocated_bytes = None
+
+    def __repr__(self):
+        return ("StageRecord(" + self.name + ", rows=" + str(self.rows) + ", seconds=" + str(self.seconds)
+                + ", allocated_bytes=" + str(self.allocated_bytes) + ")")
+
+
+class Profiler:
+    """
+    Thread safe collector of stage measurements.
+    """
+
+    def __init__(self, callback=None, trace_memory=False, log=False):
+        """
+        :param callback: Optional function called with a StageRecord after each stage.
+        :param trace_memory: True -> allocated bytes are measured with tracemalloc, starts tracemalloc if needed.
+        :param log: True -> each stage is logged with the logging module at INFO level.
+        """
+        self.callback = callback
+        self.trace_memory = trace_memory
+        self.log = log
+
+        # stage name -> dict of totals
+        self.__totals = {}
+        self.__lock = threading.Lock()
+
+        self.__started_tracemalloc = False
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.__started_tracemalloc = True
+
+    @contextlib.contextmanager
+    def stage(self, name, rows=0):
+        """
+        Context manager measuring a stage. Stages which raise an exception are measured too.
+        :param name: Stage name.
+        :param rows: Number of rows processed, can also be set through the yielded StageRecord.
+        """
+        record = StageRecord(name, rows)
+
+        start_bytes = tracemalloc.get_traced_memory()[0] if self.trace_memory else None
+        start_time = time.perf_counter()
+
+        try:
+            yield record
+        finally:
+            record.seconds = time.perf_counter() - start_time
+            if start_bytes is not None:
+                record.allocated_bytes = max(0, tracemalloc.get_traced_memory()[0] - start_bytes)
+
+            self.add(record)
+
+    def add(self, record: StageRecord):
+        """
+        Adds a measurement to the stage totals and passes it to the callback and logs.
+        """
+        with self.__lock:
+            totals = self.__totals.get(record.name)
+            if totals is None:
+                totals = {"calls": 0, "rows": 0, "seconds": 0.0, "max_seconds": 0.0, "allocated_bytes": 0}
+                self.__totals[record.name] = totals
+
+            totals["calls"] += 1
+            totals["rows"] += record.rows
+            totals["seconds"] += record.seconds
+            totals["max_seconds"] = max(totals["max_seconds"], record.seconds)
+            if record.allocated_bytes is not None:
+                totals["allocated_bytes"] += record.allocated_bytes
+
+        if self.log:
+            logger.info("Stage %s: %d rows in %.6f s, allocated bytes %s", record.name, record.rows, record.seconds,
+                        record.allocated_bytes)
+
+        if self.callback is not None:
+            self.callback(record)
+
+    def stats(self) -> dict:
+        """
+        Returns stage totals as a dict of stage name -> dict with keys "calls", "rows", "seconds", "max_seconds" and
+        "allocated_bytes". Stages are in pipeline order.
+        """
+        with self.__lock:
+            totals = {name: dict(values) for name, values in self.__totals.items()}
+
+        order = {name: i for i, name in enumerate(stages)}
+        return dict(sorted(totals.items(), key=lambda item: order.get(item[0], len(stages))))
+
+    def reset(self):
+        """
+        Removes all collected totals.
+        """
+        with self.__lock:
+            self.__totals.clear()
+
+    def close(self):
+        """
+        Stops tracemalloc if this profiler started it.
+        """
+        if self.__started_tracemalloc:
+            tracemalloc.stop()
+            self.__started_tracemalloc = False
+
+
+def stage(name, rows=0):
+    """
+    Returns a context manager measuring a stage with the active profiler. Yields a StageRecord, or None when profiling
+    is disabled.
+    """
+    active = profiler
+    if active is None:
+        return __disabled_stage
+
+    return active.stage(name, rows)
+
+
+def set_profiling(enabled, callback=None, trace_memory=False, log=False):
+    """
+    Enables or disables profiling. Enabling replaces the current profiler and its totals.
+    :param callback: Optional function called with a StageRecord after each stage.
+    :param trace_memory: True -> allocated bytes are measured with tracemalloc.
+    :param log: True -> each stage is logged with the logging module at INFO level.
+    """
+    global profiler
+
+    if profiler is not None:
+        profiler.close()
+
+    profiler = Profiler(callback, trace_memory, log) if enabled else None
+
+
+def get_stats() -> dict:
+    """
+    Returns stage totals of the active profiler, see Profiler.stats(). Empty if profiling is disabled.
+    """
+    active = profiler
+    if active is None:
+        return {}
+
+    return active.stats()
+
+
+def to_prometheus_text(stats: dict, prefix="fmi_pv_forecaster") -> str:
+    """
+    Formats stage totals in the Prometheus text exposition format, for example for a /metrics endpoint.
+    :param stats: Stage totals, see Profiler.stats().
+    :param prefix: Metric name prefix.
+    :return: Metrics text, one labeled sample per stage and metric.
+    """
+    metrics = [("stage_calls_total", "counter", "calls", "Number of runs of the pipeline stage."),
+               ("stage_rows_total", "counter", "rows", "Rows processed by the pipeline stage."),
+               ("stage_seconds_total", "counter", "seconds", "Wall time spent in the pipeline stage."),
+               ("stage_seconds_max", "gauge", "max_seconds", "Longest single run of the pipeline stage."),
+               ("stage_allocated_bytes_total", "counter", "allocated_bytes",
+                "Bytes allocated during the pipeline stage, 0 without memory tracing.")]
+
+    lines = []
+    for metric, metric_type, key, description in metrics:
+        name = prefix + "_" + metric
+        lines.append("# HELP " + name + " " + description)
+        lines.append("# TYPE " + name + " " + metric_type)
+        for stage_name, totals in stats.items():
+            lines.append(name + '{stage="' + stage_name + '"} ' + repr(totals[key]))
+
+    return "\n".join(lines) + "\n"
@@ -1,38 +1,43 @@
+import dataclasses
 import datetime
 
+import numpy
 import pandas
 import pandas as pd
 import pytz
 
 import fmi_pv_forecaster.helpers.default_parameters
+from fmi_pv_forecaster import async_loader
+from fmi_pv_forecaster import forecast_cache
 from fmi_pv_forecaster import meps_loader
+from fmi_pv_forecaster import output_formats
+from fmi_pv_forecaster import profiling
+from fmi_pv_forecaster import stream_writer
+from fmi_pv_forecaster import upsampling as upsampling_module
+from fmi_pv_forecaster import pv_system
+from fmi_pv_forecaster.pv_system import PVSystem
+from fmi_pv_forecaster.helpers import astronomical_calculations
 from fmi_pv_forecaster.helpers import irradiance_transpositions, output_estimator
 from fmi_pv_forecaster.helpers import panel_temperature_estimator
 from fmi_pv_forecaster.helpers import reflection_estimator
 
-# These variables must be set before pv forecast is called
-site_latitude = None
-site_longitude = None
-panel_tilt = None
-panel_azimuth = None
-
-# These variables can be changed if desired
-extended_output = False  # set to true and the radiation parameters and intermediate steps of the pv output calculation
-# will be included in the output
-
-snow_slide_modeling = False
-
-power_rating = 1  # power in kw
+# System used by forecast functions when no system is given. Setter functions below modify this system.
+# Location and panel angles must be set before pv forecast is called, other parameters can be changed if desired.
+default_system = PVSystem()
 
 timezone = "UTC"
 
+# PV model outputs of FMI forecasts, keyed by system parameters, weather model run and interpolation. Repeated requests
+# such as get_fmi_forecast_now() read the output from here while the FMI cache returns the same weather forecast.
+processed_forecast_cache = forecast_cache.ProcessedForecastCache(max_entries=256)
+
 
 def print_info():
-    print("System location(WGS84): " + str(site_latitude) + ", " + str(site_longitude) + ".")
-    print("Panel angles: " + str(panel_tilt) + ", " + str(panel_azimuth) + ".")
-    print("System power: " + str(power_rating))
+    print("System location(WGS84): " + str(default_system.latitude) + ", " + str(default_system.longitude) + ".")
+    print("Panel angles: " + str(default_system.tilt) + ", " + str(default_system.azimuth) + ".")
+    print("System power: " + str(default_system.power_rating))
     print("Timezone: " + str(timezone))
-    print("Extended output: " + str(extended_output))
+    print("Extended output: " + str(default_system.extended_output))
 
 
 def print_full(x: pandas.DataFrame):
@@ -55,6 +60,7 @@ def print_full(x: pandas.DataFrame):
 
 """
 Parameter setting functions begin here, some mandatory, some optional.
+These functions modify the default system. Forecast functions can also be given a PVSystem object directly.
 """
 
 
@@ -66,27 +72,57 @@ def set_location(latitude, longitude):
     :param longitude: WGS84 in float format. eq 60.4312. Valid values are -180 to 180.
     """
 
-    global site_latitude
-    global site_longitude
+    # FMI cache is keyed by geolocation, no need to clear it here
 
-    if site_latitude != latitude or site_longitude != longitude:
-        # at least one of the geolocation components was different
-        # clearing cache, new location so data from old one can't be used anymore
-        meps_loader.clear_cache()
-
-    site_latitude = latitude
-    site_longitude = longitude
+    default_system.latitude = latitude
+    default_system.longitude = longitude
     # print("Geolocation set at: " + str(site_latitude) + "°, " + str(site_longitude)+"°")
 
 
 def force_clear_fmi_cache():
     """
-    This function will force clearing of FMI open data cache. Cache clearing should normally happen automatically when
-    geolocation has been changed or when cache is old and so this function should be useless. Leaving it in for
-    debugging.
+    This function will force clearing of FMI open data cache. Cache entries are keyed by geolocation and expire
+    automatically so this function should be useless. Leaving it in for debugging.
     """
 
     meps_loader.clear_cache()
+    processed_forecast_cache.clear()
+
+
+def get_fmi_cache_stats():
+    """
+    Returns FMI open data cache counters as a dict with keys "hits", "misses", "expirations", "evictions", "entries"
+    and "max_entries". Useful for checking how many server calls the cache is saving.
+    """
+
+    return meps_loader.get_cache_stats()
+
+
+def set_profiling(enabled, callback=None, trace_memory=False, log=False):
+    """
+    Enables or disables per-stage profiling of FMI retrieval and the PV model, see profiling.py. Enabling resets the
+    collected totals.
+    :param callback: Optional function called with a profiling.StageRecord after each stage.
+    :param trace_memory: True -> bytes allocated during each stage are measured with tracemalloc. Slow.
+    :param log: True -> each stage is logged with the logging module at INFO level.
+    """
+
+    profiling.set_profiling(enabled, callback, trace_memory, log)
+
+
+def get_profiling_stats(prometheus=False):
+    """
+    Returns per-stage totals collected since profiling was enabled. Dict of stage name -> dict with keys "calls",
+    "rows", "seconds", "max_seconds" and "allocated_bytes".
+    :param prometheus: True -> totals are returned as Prometheus text exposition format instead.
+    """
+
+    stats = profiling.get_stats()
+
+    if prometheus:
+        return profiling.to_prometheus_text(stats)
+
+    return stats
 
 
 def set_angles(p_tilt, p_azimuth):
@@ -96,11 +132,8 @@ def set_angles(p_tilt, p_azimuth):
     :param p_azimuth: 0 to 360. 0 for north, 90 for east, 180 south and so on. Accepts floats and integers.
     """
 
-    global panel_tilt
-    global panel_azimuth
-
-    panel_tilt = p_tilt
-    panel_azimuth = p_azimuth
+    default_system.tilt = p_tilt
+    default_system.azimuth = p_azimuth
     # print("Panel angles set at tilt: " + str(panel_tilt)+ "°  Azimuth: " + str(panel_azimuth)+"°")
 
 
@@ -111,8 +144,18 @@ def set_extended_output(extended: bool):
     :param extended: True -> additional variables will be given, False -> additional variables will be hidden.
     :return:
     """
-    global extended_output
-    extended_output = extended
+    default_system.extended_output = extended
+
+
+def set_precision(precision):
+    """
+    Sets the floating point precision of model columns, "float64" by default. With "float32" irradiance, module
+    temperature and output columns are computed and stored as 32-bit floats, which halves the memory use of long
+    histories. Output differs from float64 by less than 0.01% of nominal power.
+    :param precision: "float64" or "float32"
+    """
+    pv_system.get_dtype(precision)
+    default_system.precision = precision
 
 
 def set_nominal_power_kw(nominal_power: float):
@@ -122,8 +165,8 @@ def set_nominal_power_kw(nominal_power: float):
     (perfect weather, direct sunlight)
     :return: None
     """
-    global power_rating
-    power_rating = nominal_power
+    default_system.power_rating = nominal_power
+    # kept in sync for code calling output_estimator directly
     output_estimator.rated_power = nominal_power
 
 
@@ -133,7 +176,7 @@ def set_default_air_temp(air_temp_c: float):
     FMI forecasts do not use the default value as air temperature is given by the forecast API.
     Air temperature influences panel temperature which in turn changes panel efficiency.
     """
-    fmi_pv_forecaster.helpers.default_parameters.air_temperature = air_temp_c
+    default_system.air_temperature = air_temp_c
     # print("Air temperature for clearsky simulations set at: " +
     # str(fmi_pv_forecast.helpers.default_parameters.air_temperature)+ "°C")
 
@@ -144,7 +187,7 @@ def set_default_wind_speed(wind_speed_ms: float):
     FMI forecasts do not use the default value as wind speed at 2m is given by the forecast API.
     Wind transfers heat away from PV panels and decreases the difference between air temperature and panel temperature.
     """
-    fmi_pv_forecaster.helpers.default_parameters.wind_speed = wind_speed_ms
+    default_system.wind_speed = wind_speed_ms
     # print("Wind speed for clearsky simulations set at: " +
     # str(fmi_pv_forecast.helpers.default_parameters.wind_speed)+ "ms")
 
@@ -161,7 +204,7 @@ def set_module_elevation(module_elevation_m: float):
     set module elevation as 2m. This way exact wind speed measurements will be used.
     """
 
-    fmi_pv_forecaster.helpers.default_parameters.panel_elevation = module_elevation_m
+    default_system.module_elevation = module_elevation_m
     # print("Module elevation set at: " + str(fmi_pv_forecast.helpers.default_parameters.panel_elevation) + "m")
 
 
@@ -171,7 +214,7 @@ def set_default_albedo(albedo: float):
     asphalt and 0.8 similar to snow.
     """
 
-    fmi_pv_forecaster.helpers.default_parameters.albedo = albedo
+    default_system.albedo = albedo
 
 
 def set_cache(cache_on):
@@ -181,11 +224,71 @@ def set_cache(cache_on):
     Disabling cache will cause every function with FMI in its name to make a new server query to
     FMI servers. This will result in unnecessary server calls.
 
-    Having cache on will only make new server calls if data isn't cached yet, caching was done
-    over a minute ago, geolocation was changed or cache was manually purged.
+    Having cache on will only make new server calls if data for the geolocation isn't cached yet, caching was done
+    over a minute ago, a new weather model run has become available or cache was manually purged.
+    Forecasts for up to meps_loader.cache.max_entries geolocations are cached at once.
     """
 
     meps_loader.cache_enabled = cache_on
+    processed_forecast_cache.clear()
+
+
+def set_disk_cache(directory, ttl_seconds=900):
+    """
+    Enables a disk cache for FMI forecasts in addition to the in-memory cache. Processed forecasts are stored as files
+    in given directory and reused by any python process using the same directory, so restarted programs do not have to
+    download the same forecast again.
+
+    Cache files older than ttl_seconds are not used and are removed when this function is called.
+    Call with None to disable disk caching.
+    """
+
+    meps_loader.set_disk_cache(directory, ttl_seconds)
+    processed_forecast_cache.clear()
+
+
+def set_ephemeris_cache(enabled, resolution_minutes=1, max_blocks=512):
+    """
+    Solar positions are stored per site on a fine time grid and reused by later forecasts for the same site. This is
+    off by default and useful when the same sites are forecast repeatedly. Solar positions interpolated from the grid
+    differ from directly computed ones by less than 0.01 degrees.
+    :param enabled: True -> solar positions are read from the cache. False -> solar position is computed for every
+    forecast.
+    :param resolution_minutes: Time between precomputed solar positions.
+    :param max_blocks: Number of site-days kept in memory.
+    """
+
+    astronomical_calculations.set_ephemeris_cache(enabled, resolution_minutes, max_blocks)
+    processed_forecast_cache.clear()
+
+
+def set_clearsky_engine(enabled, turbidity_file=None, max_sites=256):
+    """
+    Clear sky irradiance is computed with a per-site engine which looks up site altitude and Linke turbidity once and
+    reuses already computed timestamps for overlapping intervals. This is on by default.
+    :param enabled: False -> pvlib Location.get_clearsky() is run on every call.
+    :param turbidity_file: Optional .npy path, the turbidity climatology is decompressed there on first use and
+    memory-mapped. Useful when many processes compute clear sky estimates.
+    :param max_sites: Number of sites kept in memory.
+    """
+
+    meps_loader.set_clearsky_engine(enabled, turbidity_file, max_sites)
+
+
+def set_solar_position_backend(backend):
+    """
+    Selects the solar position algorithm.
+    "spa": pvlib NREL SPA, default and most accurate.
+    "ephemeris": pvlib ephemeris, within 0.03 degrees of SPA, about 9x faster.
+    "analytical": Astronomical Almanac formulas, within 0.03 degrees of SPA for years 1950-2050, about 20x faster.
+    Angle bounds hold while the sun is over 5 degrees above the horizon, closer to the horizon apparent zenith may
+    differ by up to 0.05 degrees. Output differences between backends are below 0.1% of nominal power.
+    :param backend: "spa", "ephemeris" or "analytical"
+    """
+
+    astronomical_calculations.set_solar_position_backend(backend)
+    processed_forecast_cache.clear()
+
 
 def set_snow_sliding(snow_on):
     """
@@ -195,8 +298,7 @@ def set_snow_sliding(snow_on):
 
     The further the value is from zero, the stronger the effect is.
     """
-    global snow_slide_modeling
-    snow_slide_modeling = snow_on
+    default_system.snow_slide_modeling = snow_on
 
 
 
@@ -225,25 +327,57 @@ Internal helper functions begin here. These are not exposed outside the package
 """
 
 
-def __get_clearsky_radiation_for_interval(interval_start, interval_end, timestep):
+def __get_system(system):
+    """
+    Returns given system or a snapshot of the default system if system is None. Using a snapshot means that setters
+    called during a forecast do not affect the forecast.
+    """
+    if system is None:
+        return default_system.copy()
+    return system
+
+
+def __get_geometry(data, system, geometry=None):
+    """
+    Returns the solar geometry of data at the system location. Given geometry is checked and used as is, otherwise
+    geometry is computed or reused from FMI data processing, see astronomical_calculations.get_solar_geometry().
+    System can also be a PVSite.
+    """
+    if geometry is not None:
+        if not geometry.matches(data.index, system.latitude, system.longitude):
+            raise ValueError("Given solar geometry was not computed for the timestamps and location of the data.")
+        return geometry
+
+    with profiling.stage("solar_geometry", len(data)):
+        return astronomical_calculations.get_solar_geometry(data.index, system.latitude, system.longitude)
+
+
+def __get_clearsky_radiation_for_interval(interval_start, interval_end, timestep, system=None):
     """
     Helper function, this will return a dataframe with clearsky radiation values dni, dhi and ghi
     """
 
-    if site_latitude is None or site_longitude is None:
-        raise ValueError(
-            "Latitude and longitude must be defined before calling"
-            " get_clearsky_radiation_for_interval(). Call pv_forecast.set_location(latitude, longitude) first with"
-            " valid WGS84 coordinates."
-        )
+    system = __get_system(system)
+    system.check_location()
 
-    clearsky_estimate = meps_loader.__get_irradiance_pvlib(site_latitude, site_longitude,
+    clearsky_estimate = meps_loader.__get_irradiance_pvlib(system.latitude, system.longitude,
                                                            interval_start, interval_end, timestep)
 
     return clearsky_estimate
 
 
-def __get_fmi_forecast_for_interval(interval_start, interval_end):
+def __get_offset_interval_start(interval_start):
+    """
+    Returns interval start floored to the hour with the minute set by set_clearsky_fc_time_offset().
+    """
+
+    offset = fmi_pv_forecaster.helpers.default_parameters.clearsky_fc_time_offset
+
+    return datetime.datetime(year=interval_start.year, month=interval_start.month, day=interval_start.day,
+                             hour=interval_start.hour, minute=offset)
+
+
+def __get_fmi_forecast_for_interval(interval_start, interval_end, system=None):
     """
     Main function for getting FMI open data -radiation values.
     :param interval_start:
@@ -251,13 +385,10 @@ def __get_fmi_forecast_for_interval(interval_start, interval_end):
     :return:
     """
 
-    if site_latitude is None or site_longitude is None:
-        raise ValueError(
-            "Latitude and longitude must be defined before calling forecast -functions."
-            " Call pv_forecast.set_location(latitude, longitude) first with valid WGS84 coordinates."
-        )
+    system = __get_system(system)
+    system.check_location()
 
-    data = meps_loader.collect_fmi_opendata(site_latitude, site_longitude, interval_start, interval_end)
+    data = meps_loader.collect_fmi_opendata(system.latitude, system.longitude, interval_start, interval_end)
 
     return data
 
@@ -269,7 +400,7 @@ Starting with radiation table processing.
 """
 
 
-def process_radiation_df(data):
+def process_radiation_df(data, system=None, output_format="pandas", columns=None, inplace=False, geometry=None):
     """
     This function processes a radiation dataframe and estimates the output of a pv system.
 
@@ -279,9 +410,41 @@ def process_radiation_df(data):
 
     time column is the mathematical point for which each row in the data is simulated for.
     Since weather at 18:00 represents weather between 17:00 and 18:00, the time column is often index-30min
+
+    :param data: Radiation dataframe.
+    :param system: PVSystem to simulate, default system modified by the setter functions is used if not given.
+    :param output_format: "pandas", "arrow", "numpy" or "dict", see output_formats.py.
+    :param columns: Optional list of output columns, all columns if not given.
+    :param inplace: False -> data is not modified, model columns are added to a shallow copy which shares the input
+    columns with data. True -> model columns are added to data itself, no new dataframe is created.
+    :param geometry: Optional SolarGeometry of data.index at the system location, for example from
+    upsampling.upsample_radiation(). Computed if not given.
     """
 
-    if "cloud_cover" not in data.index:
+    system = __get_system(system)
+
+    if not inplace:
+        # data may be a cached forecast, model columns must not end up in it
+        data = data.copy(deep=False)
+
+    # step 1. solar geometry, computed once and shared by all the steps below. If FMI data processing already
+    # computed the geometry for these timestamps, it is reused.
+    geometry = __get_geometry(data, system, geometry)
+
+    data = __process_radiation_df(data, system, geometry)
+
+    return output_formats.convert_output(data, output_format, columns)
+
+
+def __process_radiation_df(data, system, geometry):
+    """
+    PV model steps 2 to 6, see process_radiation_df(). Geometry is the SolarGeometry for the index of data.
+    """
+
+    # float64 or float32, model columns are stored with this dtype
+    dtype = system.get_dtype()
+
+    if "cloud_cover" not in data.columns:
         # If using pvlib clearsky data, there will not be a cloud cover column. Added here for compatibility.
         data["cloud_cover"] = 0
 
@@ -289,21 +452,28 @@ def process_radiation_df(data):
     # print(data.columns)
 
     # step 2. project irradiance components to plane of array:
-    data = irradiance_transpositions.irradiance_df_to_poa_df(data, site_latitude, site_longitude, panel_tilt,
-                                                             panel_azimuth)
+    data = irradiance_transpositions.irradiance_df_to_poa_df(data, system.latitude, system.longitude, system.tilt,
+                                                             system.azimuth, geometry=geometry, albedo=system.albedo,
+                                                             dtype=dtype)
 
     # step 3. simulate how much of irradiance components is absorbed:
-    data = reflection_estimator.add_reflection_corrected_poa_components_to_df(data, site_latitude, site_longitude,
-                                                                              panel_tilt, panel_azimuth)
+    with profiling.stage("reflection", len(data)):
+        data = reflection_estimator.add_reflection_corrected_poa_components_to_df(data, system.latitude,
+                                                                                  system.longitude, system.tilt,
+                                                                                  system.azimuth, geometry=geometry,
+                                                                                  dtype=dtype)
 
-    # step 4. compute sum of reflection-corrected components:
-    data = reflection_estimator.add_reflection_corrected_poa_to_df(data)
+        # step 4. compute sum of reflection-corrected components:
+        data = reflection_estimator.add_reflection_corrected_poa_to_df(data)
 
 
     # step 5. estimate panel temperature based on wind speed, air temperature and absorbed radiation
-    data = panel_temperature_estimator.add_estimated_panel_temperature(data)
+    with profiling.stage("temperature", len(data)):
+        data = panel_temperature_estimator.add_estimated_panel_temperature(data, system.module_elevation,
+                                                                           system.air_temperature, system.wind_speed,
+                                                                           dtype)
 
-    if snow_slide_modeling:
+    if system.snow_slide_modeling:
         #print("Snow slide modeling is on")
         # uses a modified marion model, has to be after step 5 due to T requirement, which is only added to the data in
         # step 5 if it is missing.
@@ -311,14 +481,15 @@ def process_radiation_df(data):
         Marion model:
         T_ambient > Gpoa/-80
         """
-        data["degrees above snowsliding"] = data["T"]+data["poa"]/80
+        data["degrees above snowsliding"] = (data["T"]+data["poa"]/80).astype(dtype)
 
     # step 6. estimate power output
-    data = output_estimator.add_output_to_df(data)
+    with profiling.stage("output", len(data)):
+        data = output_estimator.add_output_to_df(data, system.power_rating, dtype, system.air_temperature)
 
-    if not extended_output:
+    if not system.extended_output:
         # if extended output not in use, return only some columns
-        if snow_slide_modeling:
+        if system.snow_slide_modeling:
             return data[["T", "wind", "module_temp","degrees above snowsliding", "output"]]
         else:
             return data[["T", "wind", "module_temp", "output"]]
@@ -326,43 +497,138 @@ def process_radiation_df(data):
     return data
 
 
+def process_radiation_df_for_site(data, site, geometry=None):
+    """
+    Multi-array version of process_radiation_df(). Estimates the output of every panel array of a PVSite in one call.
+
+    Work which does not depend on panel orientation is done once for the whole site. This includes weather data,
+    solar position, air mass and extraterrestrial radiation. Only transpositions, reflections, panel temperatures and
+    output are computed separately for each array.
+
+    :param data: Radiation dataframe, see process_radiation_df().
+    :param site: PVSite with one or more PanelArrays.
+    :param geometry: Optional SolarGeometry of data.index at the site location, see process_radiation_df().
+    :return: Dataframe with columns "T", "wind", "output_<array name>" for each array and "output" which is the sum of
+    all arrays. With site.extended_output, "poa_<array name>" and "module_temp_<array name>" columns are also included.
+    """
+
+    site.check_location()
+
+    geometry = __get_geometry(data, site, geometry)
+
+    result = None
+
+    for array_name, system in zip(site.get_array_names(), site.get_array_systems()):
+        system.check_angles()
+
+        # every array gets its own shallow copy of the weather data so that model columns do not mix
+        array_data = __process_radiation_df(data.copy(deep=False), system, geometry)
+
+        if result is None:
+            result = array_data[["T", "wind"]].copy()
+            result["output"] = pandas.Series(0.0, index=result.index, dtype=system.get_dtype())
+
+        result["output_" + array_name] = array_data["output"]
+        result["output"] += array_data["output"]
+
+        if site.extended_output:
+            result["poa_" + array_name] = array_data["poa"]
+            result["module_temp_" + array_name] = array_data["module_temp"]
+
+    return result
+
+
 """
 Flexible forecast functions with custom intervals:
 """
 
 
-def get_clearsky_estimate_for_interval(interval_start, interval_end, timestep=60):
-    if site_latitude is None or site_longitude is None:
-        raise ValueError(
-            "Latitude and longitude must be defined before PV output is estimated."
-            "Call pv_forecast.set_location(latitude, longitude) first with"
-            " valid WGS84 coordinates."
-        )
-
-    if panel_tilt is None or panel_azimuth is None:
-        raise ValueError(
-            "Tilt and azimuth must be defined before PV output is estimated."
-            " Call pv_forecast.set_angles(tilt, azimuth) first with"
-            " valid 0-90, 0-360 degree panel angles."
-        )
+def get_clearsky_estimate_for_interval(interval_start, interval_end, timestep=60, system=None, output_format="pandas",
+                                       columns=None):
+    """
+    Clear sky PV output estimate for given interval.
+    :param timestep: Time in minutes between rows.
+    :param system: Optional PVSystem, default system is used if not given.
+    :param output_format: "pandas", "arrow", "numpy" or "dict", see output_formats.py.
+    :param columns: Optional list of output columns, all columns if not given.
+    """
+    system = __get_system(system)
+    system.check_location()
+    system.check_angles()
 
     # timeshifting
     # this cannot be used as setting a minute is not possible, this kills time offset function
-    offset = fmi_pv_forecaster.helpers.default_parameters.clearsky_fc_time_offset
-
-    interval_start = datetime.datetime(year=interval_start.year, month=interval_start.month, day=interval_start.day,
-                                       hour=interval_start.hour, minute=offset)
+    interval_start = __get_offset_interval_start(interval_start)
 
     # step 1. getting clearsky radiation
-    data = __get_clearsky_radiation_for_interval(interval_start, interval_end, timestep)
+    data = __get_clearsky_radiation_for_interval(interval_start, interval_end, timestep, system)
 
     # processing data with our pv model
-    data = process_radiation_df(data)
+    return process_radiation_df(data, system, output_format, columns, inplace=True)
 
-    return data
 
+def get_clearsky_estimate_chunks(interval_start, interval_end, timestep=60, system=None, chunk="MS"):
+    """
+    Generator version of get_clearsky_estimate_for_interval() for long intervals. Yields the output one time chunk at a
+    time so that only one chunk is held in memory, for example multi year baselines with 1 minute timestep.
 
-def get_fmi_forecast_for_interval(interval_start, interval_end):
+    Chunks follow the timestep grid of the whole interval, concatenated chunks are the same as the output of
+    get_clearsky_estimate_for_interval().
+    :param chunk: Pandas frequency string for chunk boundaries, "MS" for calendar months, "7D" for weeks.
+    :return: Generator of output dataframes in time order.
+    """
+
+    system = __get_system(system)
+    system.check_location()
+    system.check_angles()
+
+    for chunk_start, chunk_end in __get_clearsky_chunk_intervals(interval_start, interval_end, timestep, chunk):
+        data = __get_clearsky_radiation_for_interval(chunk_start, chunk_end, timestep, system)
+
+        yield process_radiation_df(data, system, inplace=True)
+
+
+def __get_clearsky_chunk_intervals(interval_start, interval_end, timestep, chunk) -> list:
+    """
+    Splits a clear sky interval into chunks which follow the timestep grid of the whole interval, see
+    get_clearsky_estimate_chunks(). Chunk starts are grid points, so chunks must not be offset again.
+    :return: List of (chunk start, chunk end) datetime tuples in time order.
+    """
+
+    interval_start = pandas.Timestamp(__get_offset_interval_start(interval_start))
+    interval_end = pandas.Timestamp(interval_end)
+    step = pandas.Timedelta(minutes=timestep)
+
+    # first grid point at or after each chunk boundary
+    boundaries = pandas.date_range(interval_start, interval_end, freq=chunk)
+    chunk_starts = [interval_start + ((boundary - interval_start + step - pandas.Timedelta(1)) // step) * step
+                    for boundary in boundaries]
+    chunk_starts = sorted(set([interval_start] + [start for start in chunk_starts if start <= interval_end]))
+
+    intervals = []
+    for i, chunk_start in enumerate(chunk_starts):
+        chunk_end = chunk_starts[i + 1] - step if i + 1 < len(chunk_starts) else interval_end
+        intervals.append((chunk_start.to_pydatetime(), chunk_end.to_pydatetime()))
+
+    return intervals
+
+
+def write_clearsky_estimate_for_interval(path, interval_start, interval_end, timestep=60, system=None, chunk="MS",
+                                         file_format=None):
+    """
+    Streams the output of get_clearsky_estimate_chunks() to a CSV or Parquet file, one chunk at a time. Parquet
+    requires pyarrow.
+    :param path: Output file, format is read from the extension(.csv, .parquet) if file_format is not given.
+    :param file_format: "csv" or "parquet".
+    :return: Number of rows written.
+    """
+
+    chunks = get_clearsky_estimate_chunks(interval_start, interval_end, timestep, system, chunk)
+
+    return stream_writer.write_chunks(chunks, path, file_format)
+
+
+def get_fmi_forecast_for_interval(interval_start, interval_end, system=None, output_format="pandas", columns=None):
     """
     Loads the complete fmi forecast and returns a subsection.
 
@@ -370,10 +636,13 @@ def get_fmi_forecast_for_interval(interval_start, interval_end):
 
     :param interval_start: Start time for subsection
     :param interval_end:  End time for subsection
+    :param system: Optional PVSystem, default system is used if not given.
+    :param output_format: "pandas", "arrow", "numpy" or "dict", see output_formats.py.
+    :param columns: Optional list of output columns, all columns if not given.
     :return:
     """
-    default_fmi_forecast = get_default_fmi_forecast()
-    return default_fmi_forecast.loc[interval_start:interval_end]
+    default_fmi_forecast = get_default_fmi_forecast(system=system)
+    return output_formats.convert_output(default_fmi_forecast.loc[interval_start:interval_end], output_format, columns)
 
 
 """
@@ -381,10 +650,42 @@ Fixed interval forecast functions begin here
 """
 
 
-def __get_fmi_forecast_rad_data():
+def get_fmi_radiation_forecast(system=None):
     """
-    This is a helper function for getting radiation data from FMI.
-    :return:
+    Returns the whole 66~ish hour FMI radiation and weather forecast available at this moment in time without
+    processing it with the PV model. Only geolocation has to be set before calling this.
+    Output can be modified and then passed to process_radiation_df().
+    :param system: Optional PVSystem, only geolocation is used. Default system is used if not given.
+    :return: Dataframe with columns ["dni", "dhi", "ghi", "albedo", "T", "wind", "cloud_cover"]
+    """
+    system = __get_system(system)
+
+    interval_start, interval_end = __get_default_fmi_interval()
+
+    system.check_location()
+
+    data = __get_fmi_forecast_for_interval(interval_start, interval_end, system)
+
+    return data
+
+
+def get_fmi_radiation_forecast_for_sites(sites, sites_per_request=20):
+    """
+    Multi-site version of get_fmi_radiation_forecast(). Forecasts for all sites are retrieved with as few FMI server
+    calls as possible, sites_per_request sites per call. Geolocation set with set_location() is not used.
+    :param sites: List of (latitude, longitude) tuples, WGS84.
+    :param sites_per_request: Maximum number of sites in a single server call.
+    :return: List of radiation dataframes in the same order as sites.
+    """
+
+    interval_start, interval_end = __get_default_fmi_interval()
+
+    return meps_loader.collect_fmi_opendata_for_sites(sites, interval_start, interval_end, sites_per_request)
+
+
+def __get_default_fmi_interval():
+    """
+    Returns start and end times for the default FMI forecast interval.
     """
     interval_start = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) - datetime.timedelta(hours=3)
     # the line above creates a timezone naive utc timestamp. If timezone is included, server will return errors.
@@ -393,26 +694,24 @@ def __get_fmi_forecast_rad_data():
 
     interval_end = interval_start + datetime.timedelta(hours=68)
 
-    if site_latitude is None or site_longitude is None:
-        raise ValueError(
-            "Latitude and longitude must be defined before PV output is estimated."
-            "Call pv_forecast.set_location(latitude, longitude) first with"
-            " valid WGS84 coordinates."
-        )
+    return interval_start, interval_end
 
-    if panel_tilt is None or panel_azimuth is None:
-        raise ValueError(
-            "Tilt and azimuth must be defined before PV output is estimated."
-            " Call pv_forecast.set_angles(tilt, azimuth) first with"
-            " valid 0-90, 0-360 degree panel angles."
-        )
 
-    data = __get_fmi_forecast_for_interval(interval_start, interval_end)
+def __get_fmi_forecast_rad_data(system=None):
+    """
+    This is a helper function for getting radiation data from FMI. Checks that panel angles are set as the data will
+    be used for PV forecasts.
+    :return:
+    """
 
-    return data
+    system = __get_system(system)
+    system.check_angles()
+
+    return get_fmi_radiation_forecast(system)
 
 
-def get_default_fmi_forecast(interpolate=False):
+def get_default_fmi_forecast(interpolate=False, system=None, output_format="pandas", columns=None,
+                             upsampling="linear"):
     """
     This function returns the whole 66~ish hour FMI forecast available at this moment in time.
     Timestamps in the forecast are every 60 minutes with a 30min offset. 12:30, 13:30 and so on, using UTC time.
@@ -420,26 +719,140 @@ def get_default_fmi_forecast(interpolate=False):
     where power values are at 12:00, 12:15, 12:30...
 
     Interpolation works nicely with values which divide 60 into integers. 30, 20, 15, 12, 10, 6, 5, 4, 3, 2, 1
+    :param system: Optional PVSystem, default system is used if not given.
+    :param output_format: "pandas", "arrow", "numpy" or "dict", see output_formats.py.
+    :param columns: Optional list of output columns, all columns if not given.
+    :param upsampling: Interpolation method, "linear" interpolates all columns linearly and "clearsky_index"
+    interpolates the clear sky index of irradiance, see upsampling.py. "clearsky_index" is more accurate but not
+    faster, the PV model runs on every interpolated timestamp with both methods.
     :return:
     """
 
+    system = __get_system(system)
+
     # getting the hourly 66 hour forecast
-    data = __get_fmi_forecast_rad_data()
+    data = __get_fmi_forecast_rad_data(system)
+
+    # processing data with our pv model, or reusing the output if this forecast was already processed
+    return output_formats.convert_output(__process_fmi_forecast(data, system, interpolate, upsampling), output_format,
+                                         columns)
+
+
+async def async_get_fmi_radiation_forecast(system=None):
+    """
+    Async version of get_fmi_radiation_forecast(), see async_loader.py. Requires aiohttp.
+    :param system: Optional PVSystem, only geolocation is used. Default system is used if not given.
+    :return: Dataframe with columns ["dni", "dhi", "ghi", "albedo", "T", "wind", "cloud_cover"]
+    """
+    system = __get_system(system)
+    system.check_location()
+
+    interval_start, interval_end = __get_default_fmi_interval()
+
+    return await async_loader.async_collect_fmi_opendata(system.latitude, system.longitude, interval_start,
+                                                         interval_end)
+
+
+async def async_get_default_fmi_forecast(interpolate=False, system=None, output_format="pandas", columns=None,
+                                         upsampling="linear"):
+    """
+    Async version of get_default_fmi_forecast(). Only the FMI server call is asynchronous, the PV model itself takes
+    a few milliseconds and is run in the calling coroutine. Requires aiohttp.
+    :param interpolate: See get_default_fmi_forecast().
+    :param system: Optional PVSystem, default system is used if not given.
+    :param output_format: "pandas", "arrow", "numpy" or "dict", see output_formats.py.
+    :param columns: Optional list of output columns, all columns if not given.
+    :param upsampling: See get_default_fmi_forecast().
+    """
+
+    system = __get_system(system)
+    system.check_angles()
+
+    data = await async_get_fmi_radiation_forecast(system)
+
+    return output_formats.convert_output(__process_fmi_forecast(data, system, interpolate, upsampling), output_format,
+                                         columns)
+
+
+def __process_fmi_forecast(data, system, interpolate, upsampling):
+    """
+    Interpolates an FMI radiation forecast and runs the PV model on it. The output is stored to
+    processed_forecast_cache and returned from there as long as the FMI cache returns the same radiation dataframe.
+    :return: Output dataframe, a shallow copy so that callers can not modify the cached output.
+    """
+
+    # without the FMI cache every call returns a new radiation dataframe, so outputs could never be reused
+    if not meps_loader.cache_enabled:
+        data, geometry = __interpolate_radiation(data, interpolate, upsampling, system)
+        return process_radiation_df(data, system, geometry=geometry)
+
+    model_run = forecast_cache.model_run_time(datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None),
+                                              meps_loader.model_run_interval_hours)
+    key = (dataclasses.astuple(system), model_run, interpolate, upsampling)
+
+    output = processed_forecast_cache.get(key, data)
+
+    if output is None:
+        radiation, geometry = __interpolate_radiation(data, interpolate, upsampling, system)
+        output = process_radiation_df(radiation, system, geometry=geometry)
+        processed_forecast_cache.put(key, data, output)
+
+    return output.copy(deep=False)
+
+
+def __interpolate_radiation(data, interpolate, upsampling, system):
+    """
+    Resamples radiation data to given time resolution with given upsampling method, see get_default_fmi_forecast().
+    False returns data as is. System can also be a PVSite, only geolocation is used.
+    :return: Tuple of the radiation dataframe and the SolarGeometry of its timestamps if upsampling computed it, None
+    otherwise.
+    """
 
     # if interpolation is left False, interpolation will not be done
-    if interpolate is not False:
-        # resampling to given time resolution, "15min" perhaps?
-        data = data.resample(interpolate).asfreq()
+    if interpolate is False:
+        return data, None
 
-        # interpolating nans from resampling
-        data = data.interpolate(method="linear")
-        # Note, this function supports other interpolation methods. Got a bunch of errors with them, but in theory
-        # some interpolation functions could result in nicer output.
+    with profiling.stage("interpolation") as record:
+        data, geometry = upsampling_module.upsample_radiation(data, interpolate, system.latitude, system.longitude,
+                                                              upsampling, return_geometry=True)
 
-    # processing data with our pv model
-    data = process_radiation_df(data)
+        if record is not None:
+            record.rows = len(data)
 
-    return data
+    return data, geometry
+
+
+def get_default_fmi_forecast_for_site(site, interpolate=False, upsampling="linear"):
+    """
+    Multi-array version of get_default_fmi_forecast(). Weather data is retrieved once and all panel arrays of the site
+    are simulated in one call, see process_radiation_df_for_site() for output columns.
+    :param site: PVSite with one or more PanelArrays.
+    :param interpolate: See get_default_fmi_forecast().
+    :param upsampling: See get_default_fmi_forecast().
+    """
+
+    site.check_location()
+
+    data = get_fmi_radiation_forecast(PVSystem(latitude=site.latitude, longitude=site.longitude))
+
+    data, geometry = __interpolate_radiation(data, interpolate, upsampling, site)
+    return process_radiation_df_for_site(data, site, geometry)
+
+
+def get_clearsky_estimate_for_interval_for_site(interval_start, interval_end, site, timestep=60):
+    """
+    Multi-array version of get_clearsky_estimate_for_interval(), see process_radiation_df_for_site() for output
+    columns.
+    """
+
+    site.check_location()
+
+    interval_start = __get_offset_interval_start(interval_start)
+
+    data = __get_clearsky_radiation_for_interval(interval_start, interval_end, timestep,
+                                                 PVSystem(latitude=site.latitude, longitude=site.longitude))
+
+    return process_radiation_df_for_site(data, site)
 
 
 def set_clearsky_fc_timestep(new_timestep):
@@ -475,127 +888,145 @@ def set_clearsky_fc_time_offset(new_offset):
     fmi_pv_forecaster.helpers.default_parameters.clearsky_fc_time_offset = new_offset
 
 
-def get_default_clearsky_estimate():
+def get_default_clearsky_forecast(timestep=None, system=None, output_format="pandas", columns=None):
     """
     This function returns an approximation for the clearsky PV output during a time window which should cover the
     FMI forecast based PV output from "get_default_fmi_forecast()"
 
     Forecast will have 60 minute time resolution, 70 hours of measurements and first measurement will be at xx:00 where
     xx is current hour.
+    :param timestep: Optional time in minutes between rows. Value from set_clearsky_fc_timestep() is used if not given.
+    :param system: Optional PVSystem, default system is used if not given.
+    :param output_format: "pandas", "arrow", "numpy" or "dict", see output_formats.py.
+    :param columns: Optional list of output columns, all columns if not given.
     """
 
+    if timestep is None:
+        timestep = fmi_pv_forecaster.helpers.default_parameters.clearsky_fc_timestep
+
     time_start = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) - datetime.timedelta(hours=3)
     time_start = datetime.datetime(time_start.year, time_start.month, time_start.day, time_start.hour)
     time_end = time_start + datetime.timedelta(hours=68)
 
-    data = get_clearsky_estimate_for_interval(
-        time_start,
-        time_end,
-        fmi_pv_forecaster.helpers.default_parameters.clearsky_fc_timestep)
+    return get_clearsky_estimate_for_interval(time_start, time_end, timestep, system, output_format, columns)
 
-    return data
+
+def get_default_clearsky_estimate():
+    """
+    Same as get_default_clearsky_forecast() with default timestep, kept for compatibility.
+    """
+    return get_default_clearsky_forecast()
 
 
 # Custom hour/day functions below this line
 
-def get_fmi_forecast_today():
+def get_fmi_forecast_today(system=None):
     time_start = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
     time_end = datetime.datetime(time_start.year, time_start.month, time_start.day, 23)
-    data = get_fmi_forecast_for_interval(time_start, time_end)
+    data = get_fmi_forecast_for_interval(time_start, time_end, system)
 
     return data
 
 
-def get_fmi_forecast_now():
+def get_fmi_forecast_now(system=None):
     """
     Returns interpolated likely forecast values including output for this specific moment in time.
+    :param system: Optional PVSystem, default system is used if not given.
     :return:
     """
-    fmi_power_forecast = get_default_fmi_forecast()
-    # getting nearest hour:
+    fmi_power_forecast = get_default_fmi_forecast(system=system)
     time_now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
-    return __interpolate_nearest_power_to_time_value(fmi_power_forecast, time_now)
+    return __interpolate_row_at_time(fmi_power_forecast, time_now)
 
 
-def get_fmi_forecast_at_interpolated_time(given_time):
-    fmi_power_forecast = get_default_fmi_forecast()
-    return __interpolate_nearest_power_to_time_value(fmi_power_forecast, given_time)
+def get_fmi_forecast_at_interpolated_time(given_time, system=None):
+    fmi_power_forecast = get_default_fmi_forecast(system=system)
+    return __interpolate_row_at_time(fmi_power_forecast, given_time)
 
 
-def __extract_nearest_row_from_power_df(power_df, time_value):
+def get_fmi_forecast_at_interpolated_times(given_times, system=None):
     """
-    :param power_df: Dataframe with datetime index containing hourly time values with 30minute offsets. 12:30, 13:30 and
-    so on. Will cause errors or crashes if
-    :param time_value: Datetime timestamp,dateT12:45:21 for example. This would round to 12:30 which is then read from
-    power_df.
-    :return:
+    Batch version of get_fmi_forecast_at_interpolated_time(). The forecast is computed once and interpolated to all
+    given times at once.
+    :param given_times: Query times, list of datetimes or DatetimeIndex. Timezone naive times are UTC.
+    :param system: Optional PVSystem, default system is used if not given.
+    :return: Dataframe indexed by given_times, rows outside the forecast window are NaN.
     """
-
-    time_index = datetime.datetime(time_value.year, time_value.month, time_value.day, time_value.hour, 30)
-    nearest_row = power_df.loc[str(time_index)]
-    return nearest_row
+    fmi_power_forecast = get_default_fmi_forecast(system=system)
+    return interpolate_to_times(fmi_power_forecast, given_times)
 
 
-def __interpolate_nearest_power_to_time_value(power_df, time_value):
+def interpolate_to_times(data, times):
     """
-    This column interpolates 2 nearest rows with linear interpolation and returns a single row which is the linear
-    inbetween of the 2 nearest rows. This function expects index to be hh:30 and hourly. eq. 13:30, 14:30 and so on.
-    :param power_df:
-    :param time_value:
-    :return:
+    Linearly interpolates the numeric columns of a dataframe to given times. Each query time is located with a binary
+    search of the index and interpolated between the rows before and after it, so the index can have any regular or
+    irregular time steps. Query times matching an index value return that row as is.
+
+    :param data: Dataframe with a sorted datetime index, for example a forecast.
+    :param times: Query times, list of datetimes or DatetimeIndex, do not have to be sorted. Timezone naive times and
+    timezone naive index are both assumed to be UTC.
+    :return: Dataframe of the numeric columns indexed by times. Rows outside the index range are NaN.
     """
 
-    minute = time_value.minute
+    times = pandas.DatetimeIndex(times)
+    data = data.select_dtypes("number")
 
-    timestamp1 = None
-    timestamp2 = None
+    index_ns = __to_utc_nanoseconds(data.index)
+    query_ns = __to_utc_nanoseconds(times)
 
-    if minute < 30:
-        timestamp1 = (datetime.datetime(time_value.year, time_value.month, time_value.day, time_value.hour, 30)
-                      - datetime.timedelta(minutes=60))
-        timestamp2 = datetime.datetime(time_value.year, time_value.month, time_value.day, time_value.hour, 30)
+    if len(index_ns) > 1 and not (index_ns[1:] >= index_ns[:-1]).all():
+        raise ValueError("Dataframe index has to be sorted for interpolation.")
 
-    elif minute >= 30:
-        timestamp1 = datetime.datetime(time_value.year, time_value.month, time_value.day, time_value.hour,
-                                       30)
-        timestamp2 = (datetime.datetime(time_value.year, time_value.month, time_value.day, time_value.hour, 30)
-                      + datetime.timedelta(minutes=60))
+    # no rows to interpolate from, every query time is outside the index range
+    if len(data) == 0:
+        return pandas.DataFrame(numpy.nan, index=times, columns=data.columns)
 
-    # distances between given time value and surrounding values
+    values = data.to_numpy(dtype=float)
+    last = len(index_ns) - 1
 
-    if timestamp1 not in power_df.index or timestamp2 not in power_df.index:
-        return None
+    # first row at or after each query time, and the row before it
+    right = numpy.searchsorted(index_ns, query_ns, side="left")
+    right_clipped = numpy.clip(right, 0, last)
+    left_clipped = numpy.clip(right - 1, 0, last)
+
+    exact = index_ns[right_clipped] == query_ns
+    inside = (right <= last) & (exact | (right > 0))
+
+    # fraction of the way from the row before to the row after, int64 differences keep nanosecond precision
+    span = (index_ns[right_clipped] - index_ns[left_clipped]).astype(float)
+    weight = numpy.divide((query_ns - index_ns[left_clipped]).astype(float), span, out=numpy.ones(len(query_ns)),
+                          where=span > 0)[:, numpy.newaxis]
+
+    interpolated = values[left_clipped] * (1 - weight) + values[right_clipped] * weight
+
+    # exact matches are read directly so that nan in the neighboring row does not spread
+    interpolated[exact] = values[right_clipped[exact]]
+    interpolated[~inside] = numpy.nan
 
-    # print("timevalue:" + str(time_value))
-    # print("timestamp1:" + str(timestamp1))
-    # print("timestamp2:" + str(timestamp2))
-    time_from1 = time_value - timestamp1  # a = X_pos - A_pos
-    time_from2 = timestamp2 - time_value  # b = B_pos- X_pos
-    total_time = time_from1 + time_from2  # C = a+b
+    return pandas.DataFrame(interpolated, index=times, columns=data.columns)
 
-    # A                         B
-    # o------X------------------o
-    # |--a---|-------b----------|
-    # |------------C------------|
 
-    # X = A*(1- a/C) + B*(1 - b/C)
-    # C = 1
-    # a = 0.1, b = 0.9
-    # X = A*(0.9) + B*(0.1)
+def __interpolate_row_at_time(power_df, time_value):
+    """
+    Returns a single row of power_df linearly interpolated to time_value, None if time_value is outside the index.
+    """
+    row = interpolate_to_times(power_df, [time_value]).iloc[0]
+
+    if row.isna().all():
+        return None
 
-    # multipliers, fractional inverses, (1-a/c)
-    fractional_distance_from1 = 1 - time_from1 / total_time  # 1-a/C
-    fractional_distance_from2 = 1 - time_from2 / total_time  # 1-b/C
+    return row
 
-    # rows between which to interpolate
-    row1 = power_df.loc[str(timestamp1)].copy()
-    row2 = power_df.loc[str(timestamp2)].copy()
 
-    # interpolated row
-    interpolated_row = row1 * fractional_distance_from1 + row2 * fractional_distance_from2
+def __to_utc_nanoseconds(times) -> numpy.ndarray:
+    """
+    Returns nanoseconds since 1970-01-01 UTC for each time, timezone naive times are assumed to be UTC.
+    """
+    times = pandas.DatetimeIndex(times)
+    if times.tz is not None:
+        times = times.tz_convert("UTC").tz_localize(None)
 
-    # returning interpolated value
-    return interpolated_row
+    return times.as_unit("ns").asi8
 
 
 def add_local_time_column(df):
@@ -0,0 +1,169 @@
+"""
+This file contains the PVSystem class which holds the parameters of a single PV system and the PVSite class which
+holds the parameters of a site with multiple panel arrays.
+
+Forecast functions in pv_forecaster accept a PVSystem as an optional parameter. Passing systems explicitly makes it
+possible to forecast multiple systems concurrently, for example from a thread pool, as forecasts do not read or modify
+module level state. The setter functions in pv_forecaster modify a default PVSystem which is used when no system is
+given.
+"""
+
+import dataclasses
+from dataclasses import dataclass
+from dataclasses import field
+
+import numpy
+
+from fmi_pv_forecaster.helpers import default_parameters
+
+precisions = ["float64", "float32"]
+
+
+def get_dtype(precision) -> numpy.dtype:
+    """
+    Returns numpy dtype for a precision setting, "float64" or "float32".
+    """
+    if str(precision) not in precisions:
+        raise ValueError("Precision should be one of " + str(precisions) + ", got " + str(precision))
+    return numpy.dtype(str(precision))
+
+
+@dataclass
+class PVSystem:
+    """
+    Parameters of a PV system.
+
+    latitude, longitude: WGS84 geolocation of the system.
+    tilt: 0 to 90. 0 for panel flat on the ground, 90 for vertical panel.
+    azimuth: 0 to 360. 0 for north, 90 for east, 180 south and so on.
+    power_rating: Nominal power of the system in kW.
+    module_elevation: Panel distance from ground in meters, used for estimating wind at panel elevation.
+    albedo: Ground reflectivity, used when radiation data does not contain albedo.
+    air_temperature: Air temperature in Celsius, used when radiation data does not contain air temperature.
+    wind_speed: Wind speed at 2m in m/s, used when radiation data does not contain wind speed.
+    extended_output: True -> intermediate model variables are included in the output.
+    snow_slide_modeling: True -> "degrees above snowsliding" column is included in the output.
+    precision: "float64" or "float32". Model columns are computed and stored with this precision, float32 halves the
+    memory use of long histories.
+    """
+
+    latitude: float = None
+    longitude: float = None
+    tilt: float = None
+    azimuth: float = None
+    power_rating: float = 1
+    module_elevation: float = default_parameters.panel_elevation
+    albedo: float = default_parameters.albedo
+    air_temperature: float = default_parameters.air_temperature
+    wind_speed: float = default_parameters.wind_speed
+    extended_output: bool = False
+    snow_slide_modeling: bool = False
+    precision: str = "float64"
+
+    def check_location(self):
+        """
+        Raises ValueError if geolocation has not been set.
+        """
+        if self.latitude is None or self.longitude is None:
+            raise ValueError(
+                "Latitude and longitude must be defined before PV output is estimated."
+                " Call pv_forecast.set_location(latitude, longitude) first or give the PVSystem valid WGS84"
+                " coordinates."
+            )
+
+    def check_angles(self):
+        """
+        Raises ValueError if panel angles have not been set.
+        """
+        if self.tilt is None or self.azimuth is None:
+            raise ValueError(
+                "Tilt and azimuth must be defined before PV output is estimated."
+                " Call pv_forecast.set_angles(tilt, azimuth) first or give the PVSystem"
+                " valid 0-90, 0-360 degree panel angles."
+            )
+
+    def copy(self, **changes):
+        """
+        Returns a copy of the system, keyword arguments replace the given parameters in the copy.
+        """
+        return dataclasses.replace(self, **changes)
+
+    def get_dtype(self) -> numpy.dtype:
+        """
+        Returns the numpy dtype of the precision setting, raises ValueError for unsupported precisions.
+        """
+        return get_dtype(self.precision)
+
+
+@dataclass
+class PanelArray:
+    """
+    A group of panels sharing the same orientation.
+
+    tilt: 0 to 90. 0 for panel flat on the ground, 90 for vertical panel.
+    azimuth: 0 to 360. 0 for north, 90 for east, 180 south and so on.
+    power_rating: Nominal power of the array in kW.
+    name: Used in output column names, "array_<index>" if not given.
+    """
+
+    tilt: float
+    azimuth: float
+    power_rating: float = 1
+    name: str = None
+
+
+@dataclass
+class PVSite:
+    """
+    A PV site with one or more panel arrays with different orientations. All arrays share geolocation and weather.
+
+    Other parameters are the same as in PVSystem and apply to every array.
+    """
+
+    latitude: float = None
+    longitude: float = None
+    arrays: list = field(default_factory=list)
+    module_elevation: float = default_parameters.panel_elevation
+    albedo: float = default_parameters.albedo
+    air_temperature: float = default_parameters.air_temperature
+    wind_speed: float = default_parameters.wind_speed
+    extended_output: bool = False
+    precision: str = "float64"
+
+    def add_array(self, tilt, azimuth, power_rating=1, name=None):
+        """
+        Adds a panel array to the site and returns it.
+        """
+        array = PanelArray(tilt, azimuth, power_rating, name)
+        self.arrays.append(array)
+        return array
+
+    def check_location(self):
+        """
+        Raises ValueError if geolocation has not been set or site has no arrays.
+        """
+        PVSystem(self.latitude, self.longitude).check_location()
+
+        if len(self.arrays) == 0:
+            raise ValueError("PVSite has no panel arrays. Add arrays with PVSite.add_array(tilt, azimuth, power_kw).")
+
+    def get_array_names(self) -> list:
+        """
+        Returns array names used in output columns, unnamed arrays are called "array_<index>".
+        """
+        names = [array.name if array.name is not None else "array_" + str(i) for i, array in enumerate(self.arrays)]
+
+        if len(set(names)) != len(names):
+            raise ValueError("PVSite panel array names must be unique, got " + str(names))
+
+        return names
+
+    def get_array_systems(self) -> list:
+        """
+        Returns a PVSystem for each array. Systems use extended output so that all model columns are available.
+        """
+        return [PVSystem(latitude=self.latitude, longitude=self.longitude, tilt=array.tilt, azimuth=array.azimuth,
+                         power_rating=array.power_rating, module_elevation=self.module_elevation, albedo=self.albedo,
+                         air_temperature=self.air_temperature, wind_speed=self.wind_speed, extended_output=True,
+                         precision=self.precision)
+                for array in self.arrays]
@@ -0,0 +1,102 @@
+"""
+This file contains writers which stream dataframe chunks to a file, one chunk at a time.
+
+Long clear sky baselines, for example multiple years at 1 minute resolution, do not fit in memory as a single
+dataframe. The chunk generators in pv_forecaster.py yield the output a chunk at a time and the functions here append
+each chunk to a file as soon as it has been computed, so only one chunk is held in memory at once.
+
+Supported formats:
+- CSV, written with pandas. Header is written with the first chunk.
+- Parquet, each chunk becomes one row group. Requires pyarrow, which is an optional dependency: pip install pyarrow
+"""
+
+import os
+
+import pandas
+
+file_formats = ["csv", "parquet"]
+
+
+def get_file_format(path) -> str:
+    """
+    Returns file format based on file extension, ".csv" -> "csv", ".parquet" or ".pq" -> "parquet".
+    """
+    extension = os.path.splitext(str(path))[1].lower()
+
+    if extension == ".csv":
+        return "csv"
+    if extension in [".parquet", ".pq"]:
+        return "parquet"
+
+    raise ValueError("Can not tell file format from file name " + str(path) + ", give file_format as one of "
+                     + str(file_formats))
+
+
+def write_chunks(chunks, path, file_format=None) -> int:
+    """
+    Writes dataframe chunks to a file. Existing file is overwritten.
+    :param chunks: Iterable of dataframes with the same columns, for example a chunk generator.
+    :param path: Output file path.
+    :param file_format: "csv" or "parquet", read from file extension if not given.
+    :return: Number of rows written.
+    """
+
+    if file_format is None:
+        file_format = get_file_format(path)
+
+    if file_format == "csv":
+        return __write_csv(chunks, path)
+    if file_format == "parquet":
+        return __write_parquet(chunks, path)
+
+    raise ValueError("Unknown file format " + str(file_format) + ", should be one of " + str(file_formats))
+
+
+def __write_csv(chunks, path) -> int:
+    rows = 0
+
+    for chunk in chunks:
+        index_label = chunk.index.name or "time"
+
+        if index_label in chunk.columns:
+            if pandas.Index(chunk[index_label]).equals(chunk.index):
+                # clear sky dataframes carry their index as a "time" column too, writing both would give two columns
+                # with the same name
+                chunk = chunk.drop(columns=index_label)
+            else:
+                index_label = index_label + "_index"
+
+        chunk.to_csv(path, mode="w" if rows == 0 else "a", header=rows == 0, index_label=index_label)
+        rows += len(chunk)
+
+    return rows
+
+
+def __write_parquet(chunks, path) -> int:
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Writing parquet files requires pyarrow, install it with: pip install pyarrow")
+
+    rows = 0
+    writer = None
+
+    try:
+        for chunk in chunks:
+            chunk = chunk.rename_axis(chunk.index.name or "time")
+
+            if writer is None:
+                # schema of the first chunk is used for the whole file
+                table = pyarrow.Table.from_pandas(chunk, preserve_index=True)
+                writer = pyarrow.parquet.ParquetWriter(path, table.schema)
+            else:
+                table = pyarrow.Table.from_pandas(chunk, schema=writer.schema, preserve_index=True)
+
+            writer.write_table(table)
+            rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    return rows
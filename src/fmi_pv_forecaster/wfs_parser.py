@@ -0,0 +1,172 @@
+"""
+This file contains a streaming parser for FMI WFS multipointcoverage responses.
+
+fmiopendata parses responses into nested dicts of time -> location -> parameter -> {"value", "units"} and makes an
+additional server call per parameter for parameter names and units. For multi-site requests, building and walking
+these dicts takes more time and memory than the PV model itself.
+
+This parser reads the response with iterparse and stores values directly into NumPy arrays, one contiguous array per
+parameter. Elements are cleared as soon as they have been read. Parameters are named by the names used in the request,
+for example "Temperature", so no metadata server calls are made.
+
+Multipointcoverage responses contain:
+- gml:Point elements with the name and coordinates of each returned location
+- swe:field elements, one per parameter in the order of values in each row
+- gmlcov:positions, "latitude longitude unixtime" for each row
+- gml:doubleOrNilReasonTupleList, parameter values for each row
+"""
+
+import io
+
+import defusedxml.ElementTree as ET
+import numpy
+
+GML = "{http://www.opengis.net/gml/3.2}"
+GMLCOV = "{http://www.opengis.net/gmlcov/1.0}"
+SWE = "{http://www.opengis.net/swe/2.0}"
+
+__point_tag = GML + "Point"
+__name_tag = GML + "name"
+__pos_tag = GML + "pos"
+__field_tag = SWE + "field"
+__positions_tag = GMLCOV + "positions"
+__values_tag = GML + "doubleOrNilReasonTupleList"
+
+
+class MultiPointCoverage:
+    """
+    Parsed multipointcoverage response. Each row is one location at one time.
+
+    Attributes:
+    location_names: list of location names
+    latitudes, longitudes: location coordinates, same order as location_names
+    location_index: index of the location of each row, -1 if the row coordinates do not match any location
+    times: time of each row as numpy datetime64
+    columns: dict of parameter name -> float array of values for each row
+    """
+
+    def __init__(self, location_names, latitudes, longitudes, location_index, times, columns):
+        self.location_names = location_names
+        self.latitudes = latitudes
+        self.longitudes = longitudes
+        self.location_index = location_index
+        self.times = times
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.times)
+
+    @property
+    def location_metadata(self) -> dict:
+        """
+        Location name -> {"latitude", "longitude"}, same structure as in fmiopendata.
+        """
+        return {name: {"latitude": latitude, "longitude": longitude}
+                for name, latitude, longitude in zip(self.location_names, self.latitudes, self.longitudes)}
+
+    def get_location(self, name):
+        """
+        Returns times and parameter columns of a single location.
+        :return: times array, dict of parameter name -> values array
+        """
+        rows = numpy.flatnonzero(self.location_index == self.location_names.index(name))
+        return self.times[rows], {parameter: values[rows] for parameter, values in self.columns.items()}
+
+
+def parse_multipointcoverage(source) -> MultiPointCoverage:
+    """
+    Parses a multipointcoverage response.
+    :param source: Response as bytes, file path or binary file object.
+    :return: MultiPointCoverage
+    """
+
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+
+    location_names = []
+    location_coordinates = []
+    fields = []
+    positions = []
+    values = []
+
+    # name and coordinates of the gml:Point being read
+    in_point = False
+    point_name = None
+    point_coordinates = None
+
+    for event, element in ET.iterparse(source, events=("start", "end")):
+        tag = element.tag
+
+        if event == "start":
+            if tag == __point_tag:
+                in_point = True
+            continue
+
+        if tag == __name_tag and in_point:
+            point_name = element.text
+        elif tag == __pos_tag and in_point:
+            point_coordinates = __parse_numbers(element.text)[:2]
+        elif tag == __point_tag:
+            location_names.append(point_name)
+            location_coordinates.append(point_coordinates)
+            in_point = False
+            element.clear()
+        elif tag == __field_tag:
+            if element.attrib["name"] not in fields:
+                fields.append(element.attrib["name"])
+            element.clear()
+        elif tag == __positions_tag:
+            positions.append(__parse_numbers(element.text))
+            element.clear()
+        elif tag == __values_tag:
+            values.append(__parse_numbers(element.text))
+            element.clear()
+
+    location_coordinates = numpy.array(location_coordinates, dtype=float).reshape(-1, 2)
+
+    positions = numpy.concatenate(positions) if positions else numpy.empty(0)
+    positions = positions.reshape(-1, 3)
+    row_count = len(positions)
+
+    values = numpy.concatenate(values) if values else numpy.empty(0)
+    if len(fields) == 0 or len(values) != row_count * len(fields):
+        # no data or a response this parser does not understand
+        row_count = 0
+        positions = positions[:0]
+        values = numpy.empty((0, len(fields)))
+    values = values.reshape(row_count, len(fields))
+
+    columns = {field: numpy.ascontiguousarray(values[:, i]) for i, field in enumerate(fields)}
+
+    times = numpy.datetime64("1970-01-01T00:00:00", "s") + positions[:, 2].astype(numpy.int64).astype(
+        "timedelta64[s]")
+
+    return MultiPointCoverage(location_names, location_coordinates[:, 0], location_coordinates[:, 1],
+                              __get_location_index(location_coordinates, positions[:, :2]), times, columns)
+
+
+def __parse_numbers(text) -> numpy.ndarray:
+    """
+    Parses whitespace separated numbers, "NaN" is parsed as nan.
+    """
+    if text is None or text.strip() == "":
+        return numpy.empty(0)
+    return numpy.fromstring(text, dtype=float, sep=" ")
+
+
+def __get_location_index(location_coordinates, row_coordinates) -> numpy.ndarray:
+    """
+    Finds the location of each row. Coordinates are written with the same precision in both places of the response so
+    exact matching is used.
+    """
+    location_index = numpy.full(len(row_coordinates), -1, dtype=int)
+
+    if len(row_coordinates) == 0:
+        return location_index
+
+    unique_coordinates, inverse = numpy.unique(row_coordinates, axis=0, return_inverse=True)
+    lookup = {tuple(coordinates): i for i, coordinates in enumerate(location_coordinates)}
+
+    unique_index = numpy.array([lookup.get(tuple(coordinates), -1) for coordinates in unique_coordinates])
+
+    return unique_index[inverse.reshape(-1)]
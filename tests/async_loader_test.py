@@ -0,0 +1,125 @@
+import asyncio
+import datetime
+
+import numpy as np
+import pytest
+
+from conftest import generate_fmi_xml
+from conftest import get_sites_from_url
+from fmi_pv_forecaster import async_loader
+from fmi_pv_forecaster import meps_loader
+import fmi_pv_forecaster as pvfc
+
+web = pytest.importorskip("aiohttp.web")
+
+"""
+This file contains tests for the async FMI forecast retrieval. Requests are made to a local stub WFS server which
+returns generated multipointcoverage responses.
+"""
+
+
+class StubWFSServer:
+    """
+    Local WFS server, counts requests and the highest number of simultaneous requests.
+    """
+
+    def __init__(self, delay_seconds=0.05):
+        self.delay_seconds = delay_seconds
+        self.requests = 0
+        self.active = 0
+        self.max_active = 0
+
+    async def handle(self, request):
+        self.requests += 1
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.delay_seconds)
+            sites = get_sites_from_url(request.query_string)
+            start_time = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) - datetime.timedelta(hours=3)
+            return web.Response(body=generate_fmi_xml(sites, start_time), content_type="text/xml")
+        finally:
+            self.active -= 1
+
+    async def __aenter__(self):
+        app = web.Application()
+        app.router.add_get("/wfs", self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        meps_loader.stored_query_url = "http://127.0.0.1:" + str(port) + "/wfs?storedquery_id="
+        return self
+
+    async def __aexit__(self, *args):
+        await async_loader.close_session()
+        await self.runner.cleanup()
+
+
+@pytest.fixture(autouse=True)
+def restore_settings():
+    url = meps_loader.stored_query_url
+    limit = async_loader.max_concurrent_requests
+    timeout = async_loader.request_timeout_seconds
+    meps_loader.clear_cache()
+    yield
+    meps_loader.stored_query_url = url
+    async_loader.max_concurrent_requests = limit
+    async_loader.request_timeout_seconds = timeout
+    meps_loader.clear_cache()
+
+
+def test_async_forecast():
+    system = pvfc.PVSystem(latitude=61.0, longitude=25.0, tilt=30, azimuth=180, power_rating=3)
+
+    async def run():
+        async with StubWFSServer() as server:
+            forecast = await pvfc.async_get_default_fmi_forecast(system=system)
+        return server, forecast
+
+    server, forecast = asyncio.run(run())
+    print(forecast)
+
+    assert server.requests == 1
+    assert len(forecast) > 60 and forecast["output"].max() > 0
+    assert np.allclose(forecast["T"].iloc[:5], 15.0 + 1 + 5 * np.sin(np.arange(5) / 24 * 2 * np.pi)), (
+        "Async forecast has wrong air temperatures."
+    )
+
+
+def test_concurrent_callers_are_coalesced():
+    async def run():
+        async with StubWFSServer(delay_seconds=0.2) as server:
+            start_time = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+            end_time = start_time + datetime.timedelta(hours=60)
+            results = await asyncio.gather(*[async_loader.async_collect_fmi_opendata(60.5, 24.5, start_time, end_time)
+                                             for _ in range(10)])
+        return server, results
+
+    server, results = asyncio.run(run())
+
+    assert server.requests == 1, "Concurrent requests for the same site should share one server call."
+    assert all(result is results[0] for result in results)
+
+
+def test_concurrency_limit_and_timeout():
+    async_loader.max_concurrent_requests = 2
+
+    async def run():
+        async with StubWFSServer(delay_seconds=0.1) as server:
+            start_time = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+            end_time = start_time + datetime.timedelta(hours=60)
+            await asyncio.gather(*[async_loader.async_collect_fmi_opendata(60 + i, 24, start_time, end_time)
+                                   for i in range(6)])
+
+            async_loader.request_timeout_seconds = 0.05
+            server.delay_seconds = 1
+            with pytest.raises(asyncio.TimeoutError):
+                await async_loader.async_collect_fmi_opendata(70, 24, start_time, end_time)
+        return server
+
+    server = asyncio.run(run())
+
+    assert server.requests == 7
+    assert server.max_active <= 2, "More simultaneous requests than max_concurrent_requests."
@@ -0,0 +1,114 @@
+import datetime
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import fmi_pv_forecaster as pvfc
+from fmi_pv_forecaster import backtest
+from fmi_pv_forecaster import disk_cache
+from fmi_pv_forecaster import meps_loader
+from fmi_pv_forecaster import wfs_parser
+
+from conftest import generate_fmi_xml
+
+"""
+This file contains tests for replaying archived FMI forecasts with the backtest runner.
+"""
+
+systems = [pvfc.PVSystem(latitude=60.2, longitude=24.9, tilt=30, azimuth=180, power_rating=2),
+           pvfc.PVSystem(latitude=61.5, longitude=23.8, tilt=20, azimuth=135, power_rating=5),
+           pvfc.PVSystem(latitude=65.0, longitude=25.5, tilt=40, azimuth=200, power_rating=1)]
+
+
+def write_archive(directory, model_runs):
+    """
+    Writes one XML response per model run, the first two sites in one file and the third site as a disk cache file.
+    """
+    sites = [(system.latitude, system.longitude) for system in systems]
+
+    for model_run in model_runs:
+        run_directory = os.path.join(directory, model_run.strftime("%Y"))
+        os.makedirs(run_directory, exist_ok=True)
+
+        with open(os.path.join(run_directory, "meps_" + model_run.strftime("%Y%m%d%H") + ".xml"), "wb") as file:
+            file.write(generate_fmi_xml(sites[:2], model_run, hours=24))
+
+        coverage = wfs_parser.parse_multipointcoverage(generate_fmi_xml(sites[2:], model_run, hours=24))
+        times, columns = coverage.get_location(coverage.location_names[0])
+        data = getattr(meps_loader, "__fmi_columns_to_df")(times, columns, *sites[2])
+
+        cache = disk_cache.DiskCache(run_directory)
+        key = (sites[2][0], sites[2][1], model_run, tuple(meps_loader.parameters))
+        disk_cache.write_dataframe(cache.path_for(key), data, model_run, model_run + datetime.timedelta(hours=24))
+
+
+@pytest.fixture
+def archive(tmp_path):
+    model_runs = [datetime.datetime(2025, 6, 1, 0), datetime.datetime(2025, 6, 1, 3), datetime.datetime(2025, 6, 2, 6)]
+    write_archive(str(tmp_path), model_runs)
+    return str(tmp_path)
+
+
+def test_runs_match_process_radiation_df(archive):
+    runs = backtest.find_archived_runs(archive)
+    print(runs)
+
+    assert [run.model_run for run in runs] == [pd.Timestamp("2025-06-01 00:00"), pd.Timestamp("2025-06-01 03:00"),
+                                                pd.Timestamp("2025-06-02 06:00")], "Runs should be in order."
+    assert all(len(run.paths) == 2 for run in runs)
+
+    output = backtest.backtest_run(runs[1], systems, site_ids=["a", "b", "c"], max_horizon_hours=12)
+    print(output.head())
+
+    assert list(output.columns) == ["model_run", "site", "horizon_hours", "output"]
+    assert set(output["site"]) == {"a", "b", "c"}, "Every system should have rows, also the disk cache site."
+    assert output["horizon_hours"].min() == 1 and output["horizon_hours"].max() == 12, "Wrong horizons."
+
+    # same as simulating the archived response directly
+    coverage = wfs_parser.parse_multipointcoverage([path for path in runs[1].paths if path.endswith(".xml")][0])
+    name = coverage.location_names[1]
+    data = getattr(meps_loader, "__fmi_columns_to_df")(*coverage.get_location(name), 61.5, 23.8)
+    expected = pvfc.process_radiation_df(data, systems[1])["output"]
+
+    site_output = output[output["site"] == "b"]["output"]
+    assert np.allclose(site_output.to_numpy(), expected.reindex(site_output.index).to_numpy(), equal_nan=True)
+
+    # first hour of the run is at the middle of the hour after the run
+    assert site_output.index[0] == pd.Timestamp("2025-06-01 03:30")
+
+
+def test_parallel_stream_to_file(archive, tmp_path):
+    runs = backtest.find_archived_runs(archive, start_time=datetime.datetime(2025, 6, 1, 3))
+    assert len(runs) == 2, "Start time should leave out the first run."
+
+    sequential = pd.concat(backtest.iter_backtest(runs, systems, max_workers=1, interpolate="15min",
+                                                  upsampling="clearsky_index"))
+    parallel = pd.concat(backtest.iter_backtest(runs, systems, max_workers=2, runs_in_progress=1,
+                                                interpolate="15min", upsampling="clearsky_index"))
+
+    pd.testing.assert_frame_equal(sequential, parallel)
+
+    path = str(tmp_path / "backtest.parquet")
+    rows = backtest.run_backtest(archive, systems, path, max_workers=1)
+    written = pd.read_parquet(path)
+    print(written.head())
+
+    assert rows == len(written) == 3 * 3 * 23, "Every run, site and hour after the run should be written."
+    assert written["model_run"].is_monotonic_increasing
+
+
+def test_unreadable_files(archive, caplog):
+    with open(os.path.join(archive, "meps_2025060309.xml"), "w") as file:
+        file.write("<not xml")
+
+    with pytest.raises(Exception):
+        list(backtest.iter_backtest(archive, systems, max_workers=1))
+
+    outputs = list(backtest.iter_backtest(archive, systems, max_workers=1, skip_errors=True))
+    assert len(outputs) == 3, "Broken run should be skipped."
+    assert "2025-06-03 09:00" in caplog.text
+
+    with pytest.raises(ValueError):
+        backtest.get_model_run("meps_latest.xml")
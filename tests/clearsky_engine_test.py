@@ -0,0 +1,85 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+from pvlib import location
+
+import fmi_pv_forecaster as pvfc
+from fmi_pv_forecaster import clearsky_engine
+from fmi_pv_forecaster import meps_loader
+
+"""
+This file contains tests for the per-site clear sky engine.
+"""
+
+
+def test_engine_matches_pvlib():
+    engine = clearsky_engine.ClearskyEngine()
+
+    # a whole year so that every monthly turbidity value is used
+    times = pd.date_range("2025-01-01", "2025-12-31 23:00", freq="h", tz="UTC")
+
+    for latitude, longitude in [(60.2, 24.9), (69.9, 27.0), (-30.0, 150.0)]:
+        expected = location.Location(latitude, longitude).get_clearsky(times)
+        clearsky = engine.get_clearsky(times, latitude, longitude)
+
+        max_difference = (clearsky - expected).abs().max().max()
+        print("Max difference to pvlib at " + str(latitude) + ": " + str(max_difference))
+
+        assert list(clearsky.columns) == ["ghi", "dni", "dhi"]
+        assert max_difference < 1e-6, "Clear sky engine differs from pvlib."
+
+
+def test_overlapping_intervals_are_reused():
+    engine = clearsky_engine.ClearskyEngine()
+    times = pd.date_range("2025-06-01 00:00", periods=72, freq="h", tz="UTC")
+
+    first = engine.get_clearsky(times, 60.2, 24.9)
+    # forecast 3 hours later, only the last 3 hours are new
+    second = engine.get_clearsky(times + pd.Timedelta(hours=3), 60.2, 24.9)
+
+    assert engine.stats()["rows_computed"] == 75
+    assert engine.stats()["rows_reused"] == 69
+
+    # reused rows are the same as computed ones and timezone of the request is kept
+    local_times = (times + pd.Timedelta(hours=3)).tz_convert("Europe/Helsinki")
+    fresh = clearsky_engine.ClearskyEngine().get_clearsky(local_times, 60.2, 24.9)
+
+    assert fresh.index.equals(local_times)
+    assert np.allclose(fresh.to_numpy(), second.to_numpy())
+    assert np.allclose(first.iloc[3:].to_numpy(), second.iloc[:-3].to_numpy())
+
+
+def test_memory_mapped_turbidity(tmp_path):
+    turbidity_file = str(tmp_path / "linke_turbidity.npy")
+    times = pd.date_range("2025-03-01", periods=48, freq="h", tz="UTC")
+
+    mapped = clearsky_engine.ClearskyEngine(turbidity_file=turbidity_file)
+    default = clearsky_engine.ClearskyEngine()
+
+    assert np.array_equal(mapped.get_site(60.2, 24.9).monthly_turbidity,
+                          default.get_site(60.2, 24.9).monthly_turbidity)
+    assert np.load(turbidity_file, mmap_mode="r").shape == (2160, 4320, 12)
+
+    # existing file is used by new engines
+    assert np.allclose(clearsky_engine.ClearskyEngine(turbidity_file).get_clearsky(times, 61.5, 23.8).to_numpy(),
+                       default.get_clearsky(times, 61.5, 23.8).to_numpy())
+
+
+def test_clearsky_estimate_with_and_without_engine():
+    system = pvfc.PVSystem(latitude=60.2, longitude=24.9, tilt=30, azimuth=180, power_rating=5)
+    start = datetime.datetime(2025, 6, 1)
+    end = datetime.datetime(2025, 6, 3)
+
+    with_engine = pvfc.get_clearsky_estimate_for_interval(start, end, 60, system=system)
+
+    pvfc.set_clearsky_engine(False)
+    try:
+        without_engine = pvfc.get_clearsky_estimate_for_interval(start, end, 60, system=system)
+    finally:
+        pvfc.set_clearsky_engine(True)
+
+    assert meps_loader.clearsky_engine is not None
+    # both paths use SPA solar positions, the engine should only avoid repeated file reads
+    assert np.allclose(with_engine["output"], without_engine["output"], rtol=0, atol=1e-6), (
+        "Clear sky estimate with the engine differs from the estimate without it.")
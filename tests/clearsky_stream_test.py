@@ -0,0 +1,86 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import fmi_pv_forecaster as pvfc
+
+"""
+This file contains tests for chunked clear sky estimates and streaming them to files.
+"""
+
+system = pvfc.PVSystem(latitude=60.2, longitude=24.9, tilt=30, azimuth=180, power_rating=5)
+
+# odd start time and timestep so that chunk boundaries do not fall on the timestep grid
+time_start = datetime.datetime(2025, 1, 20, 5, 17)
+time_end = datetime.datetime(2025, 4, 3, 12)
+
+
+def test_chunks_match_full_interval():
+    full = pvfc.get_clearsky_estimate_for_interval(time_start, time_end, 7, system=system)
+    chunks = list(pvfc.get_clearsky_estimate_chunks(time_start, time_end, 7, system=system))
+
+    print("Chunk lengths: " + str([len(chunk) for chunk in chunks]))
+
+    # january, february, march and april
+    assert len(chunks) == 4
+    assert chunks[1].index[0] >= pd.Timestamp("2025-02-01", tz="UTC")
+
+    combined = pd.concat(chunks)
+    assert combined.index.equals(full.index), "Chunks do not follow the timestep grid of the interval."
+    assert np.allclose(combined["output"], full["output"])
+
+
+def test_weekly_chunks():
+    chunks = list(pvfc.get_clearsky_estimate_chunks(time_start, time_end, 60, system=system, chunk="7D"))
+
+    assert len(chunks) == 11
+    assert all(len(chunk) <= 7 * 24 for chunk in chunks)
+
+
+def test_write_csv(tmp_path):
+    path = tmp_path / "baseline.csv"
+    rows = pvfc.write_clearsky_estimate_for_interval(str(path), time_start, time_end, 60, system=system)
+
+    full = pvfc.get_clearsky_estimate_for_interval(time_start, time_end, 60, system=system)
+    written = pd.read_csv(path, index_col="time", parse_dates=True)
+
+    assert rows == len(full) == len(written)
+    assert np.allclose(written["output"], full["output"])
+
+
+def test_write_csv_extended_output(tmp_path):
+    # extended output includes a "time" column, which should not be written twice
+    extended_system = system.copy(extended_output=True)
+    path = tmp_path / "baseline.csv"
+    pvfc.write_clearsky_estimate_for_interval(str(path), time_start, time_end, 60, system=extended_system)
+
+    full = pvfc.get_clearsky_estimate_for_interval(time_start, time_end, 60, system=extended_system)
+    written = pd.read_csv(path, index_col="time", parse_dates=True)
+    print(list(written.columns))
+
+    assert "time.1" not in written.columns and "time" not in written.columns, "Time was written twice."
+    assert written.index.equals(full.index)
+    assert list(written.columns) == [column for column in full.columns if column != "time"]
+    assert np.allclose(written["poa"], full["poa"])
+
+
+def test_write_parquet(tmp_path):
+    pytest.importorskip("pyarrow")
+
+    path = tmp_path / "baseline.parquet"
+    rows = pvfc.write_clearsky_estimate_for_interval(str(path), time_start, time_end, 60, system=system)
+
+    full = pvfc.get_clearsky_estimate_for_interval(time_start, time_end, 60, system=system)
+    written = pd.read_parquet(path)
+
+    assert rows == len(full)
+    assert written.index.equals(full.index)
+    assert np.allclose(written["output"], full["output"])
+
+
+def test_unknown_file_format(tmp_path):
+    with pytest.raises(ValueError):
+        pvfc.write_clearsky_estimate_for_interval(str(tmp_path / "baseline.xlsx"), time_start, time_end, 60,
+                                                  system=system)
@@ -0,0 +1,115 @@
+import datetime
+from urllib.parse import unquote
+
+import numpy as np
+import pytest
+
+from fmi_pv_forecaster import meps_loader
+
+
+"""
+This file contains shared fixtures. FMI open data responses are replaced with generated forecasts so that caching and
+data processing can be tested without server calls.
+"""
+
+
+def generate_fmi_data(start_time, hours=66, temperature_offset=0.0):
+    """
+    Generates a plausible FMI harmonie forecast with hourly accumulated radiation values.
+    :return: list of times, dict of parameter name -> list of values
+    """
+
+    start_time = datetime.datetime(start_time.year, start_time.month, start_time.day, start_time.hour)
+
+    times = []
+    columns = {parameter: [] for parameter in meps_loader.parameters}
+    ghi_accumulation = 0.0
+    dir_accumulation = 0.0
+    net_accumulation = 0.0
+
+    for i in range(hours):
+        time = start_time + datetime.timedelta(hours=i)
+
+        # simple daily radiation curve peaking at 10 UTC
+        ghi = max(0.0, 600 * np.cos((time.hour - 10) / 24 * 2 * np.pi)) if 3 <= time.hour <= 18 else 0.0
+        ghi_accumulation += ghi * 3600
+        dir_accumulation += ghi * 0.6 * 3600
+        net_accumulation += ghi * 0.8 * 3600
+
+        times.append(time)
+        columns["Temperature"].append(15.0 + temperature_offset + 5 * np.sin(i / 24 * 2 * np.pi))
+        columns["RadiationGlobalAccumulation"].append(ghi_accumulation)
+        columns["RadiationNetSurfaceSWAccumulation"].append(net_accumulation)
+        columns["RadiationSWAccumulation"].append(dir_accumulation)
+        columns["WindSpeedMS"].append(3.0)
+        columns["TotalCloudCover"].append(20.0)
+
+    return times, columns
+
+
+def generate_fmi_xml(sites, start_time, hours=66) -> bytes:
+    """
+    Generates an FMI multipointcoverage response for given (latitude, longitude) sites. Air temperature is offset by
+    latitude - 60 so that sites can be told apart.
+    """
+
+    points = []
+    positions = []
+    rows = []
+
+    for i, (latitude, longitude) in enumerate(sites):
+        name = "Site " + str(latitude) + " " + str(longitude)
+        points.append('<gml:Point gml:id="point-' + str(i) + '"><gml:name>' + name + '</gml:name><gml:pos>'
+                      + str(latitude) + " " + str(longitude) + ' </gml:pos></gml:Point>')
+
+        times, columns = generate_fmi_data(start_time, hours, temperature_offset=latitude - 60)
+        for j, time in enumerate(times):
+            epoch = int((time - datetime.datetime(1970, 1, 1)).total_seconds())
+            positions.append(str(latitude) + " " + str(longitude) + " " + str(epoch))
+            rows.append(" ".join(str(columns[parameter][j]) for parameter in meps_loader.parameters))
+
+    xml = ('<?xml version="1.0" encoding="UTF-8"?>'
+           '<wfs:FeatureCollection xmlns:wfs="http://www.opengis.net/wfs/2.0" '
+           'xmlns:gml="http://www.opengis.net/gml/3.2" xmlns:gmlcov="http://www.opengis.net/gmlcov/1.0" '
+           'xmlns:swe="http://www.opengis.net/swe/2.0" xmlns:xlink="http://www.w3.org/1999/xlink">'
+           '<wfs:member><gml:MultiPoint>' + "".join('<gml:pointMember>' + point + '</gml:pointMember>'
+                                                  for point in points) + '</gml:MultiPoint>'
+           '<gml:rangeSet><gml:DataBlock><gml:rangeParameters/><gml:doubleOrNilReasonTupleList>'
+           + " \n".join(rows) + ' </gml:doubleOrNilReasonTupleList></gml:DataBlock></gml:rangeSet>'
+           '<gmlcov:positions>' + " \n".join(positions) + ' </gmlcov:positions>'
+           '<gmlcov:rangeType><swe:DataRecord>'
+           + "".join('<swe:field name="' + parameter + '" xlink:href="http://localhost/meta?param=' + parameter
+                     + '"/>' for parameter in meps_loader.parameters)
+           + '</swe:DataRecord></gmlcov:rangeType></wfs:member></wfs:FeatureCollection>')
+
+    return xml.encode("utf-8")
+
+
+def get_sites_from_url(url) -> list:
+    """
+    Returns (latitude, longitude) tuples of the latlon= arguments of a stored query url.
+    """
+    arguments = unquote(url).split("&")
+    return [tuple(float(value) for value in argument[len("latlon="):].split(","))
+            for argument in arguments if argument.startswith("latlon=")]
+
+
+@pytest.fixture
+def fake_fmi_download(monkeypatch):
+    """
+    Replaces FMI server calls with generated data. Returns a list which collects the url of each server call.
+    """
+
+    calls = []
+
+    def read_url(url):
+        calls.append(url)
+        start_time = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) - datetime.timedelta(hours=3)
+        return generate_fmi_xml(get_sites_from_url(url), start_time)
+
+    monkeypatch.setattr(meps_loader, "read_url", read_url)
+    meps_loader.clear_cache()
+
+    yield calls
+
+    meps_loader.clear_cache()
@@ -0,0 +1,72 @@
+import datetime
+import os
+
+import pandas as pd
+import pytest
+
+from fmi_pv_forecaster import disk_cache
+from fmi_pv_forecaster import meps_loader
+
+
+"""
+This file contains tests for the disk backed FMI forecast cache. FMI server calls are replaced with generated data,
+see conftest.py.
+"""
+
+
+@pytest.fixture
+def cache_directory(tmp_path):
+    meps_loader.set_disk_cache(str(tmp_path))
+    yield tmp_path
+    meps_loader.set_disk_cache(None)
+
+
+def test_dataframe_round_trip(tmp_path):
+    index = pd.date_range("2025-06-01 00:30", periods=5, freq="60min", name="Time")
+    df = pd.DataFrame({"dni": [0.0, 1.5, 2.5, 3.5, 4.5], "T": [10.0, 11.0, 12.0, 13.0, 14.0]}, index=index)
+    path = os.path.join(str(tmp_path), "test.npz")
+
+    disk_cache.write_dataframe(path, df, datetime.datetime(2025, 6, 1), datetime.datetime(2025, 6, 2))
+    read_df, start, end = disk_cache.read_dataframe(path)
+
+    pd.testing.assert_frame_equal(read_df, df, check_freq=False, check_index_type=False)
+    assert start == datetime.datetime(2025, 6, 1) and end == datetime.datetime(2025, 6, 2)
+    assert os.listdir(str(tmp_path)) == ["test.npz"], "Temporary files were left in cache directory."
+
+
+def test_new_process_reuses_disk_cache(fake_fmi_download, cache_directory, monkeypatch):
+    interval_start = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) - datetime.timedelta(hours=3)
+    interval_end = interval_start + datetime.timedelta(hours=68)
+
+    data1 = meps_loader.collect_fmi_opendata(60.0, 25.0, interval_start, interval_end)
+
+    assert len(os.listdir(str(cache_directory))) == 1, "Forecast was not written to disk cache."
+
+    # simulating a new process, memory cache is empty and server can not be reached
+    meps_loader.clear_cache()
+
+    def offline_download(url):
+        raise ConnectionError("Server should not be called when disk cache holds the forecast.")
+
+    monkeypatch.setattr(meps_loader, "read_url", offline_download)
+
+    data2 = meps_loader.collect_fmi_opendata(60.0, 25.0, interval_start, interval_end)
+
+    pd.testing.assert_frame_equal(data1, data2, check_freq=False, check_index_type=False)
+
+
+def test_expired_files_are_removed(tmp_path):
+    cache = disk_cache.DiskCache(str(tmp_path), ttl_seconds=60)
+    key = (60.0, 25.0, datetime.datetime(2025, 6, 1, 12), ("Temperature",))
+    df = pd.DataFrame({"T": [1.0]}, index=pd.DatetimeIndex([datetime.datetime(2025, 6, 1, 12)]))
+
+    cache.put(key, df, datetime.datetime(2025, 6, 1), datetime.datetime(2025, 6, 2))
+    assert cache.get(key, datetime.datetime(2025, 6, 1), datetime.datetime(2025, 6, 2)) is not None
+
+    old_time = datetime.datetime.now().timestamp() - 120
+    os.utime(cache.path_for(key), (old_time, old_time))
+
+    assert cache.get(key, datetime.datetime(2025, 6, 1), datetime.datetime(2025, 6, 2)) is None, (
+        "Expired cache file was used."
+    )
+    assert cache.cleanup() == 1 and os.listdir(str(tmp_path)) == [], "Expired cache file was not removed."
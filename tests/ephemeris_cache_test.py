@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+
+from fmi_pv_forecaster.helpers import astronomical_calculations
+from fmi_pv_forecaster.helpers import ephemeris_cache
+
+"""
+This file contains tests for the precomputed solar position cache.
+"""
+
+
+def test_lookup_matches_spa():
+    cache = ephemeris_cache.EphemerisCache()
+
+    # odd timestamps, timezone aware and crossing midnight. Far north so that azimuth crosses north during summer nights
+    times = pd.date_range("2025-06-20 18:07:13", periods=2000, freq="77s", tz="Europe/Helsinki")
+    azimuth, zenith = cache.lookup(times, 69.9, 27.0)
+    spa_azimuth, spa_zenith = astronomical_calculations.get_solar_azimuth_zenith_fast(times, 69.9, 27.0)
+
+    azimuth_difference = np.abs((azimuth - spa_azimuth.to_numpy() + 180) % 360 - 180)
+    print("Max zenith difference: " + str(np.abs(zenith - spa_zenith.to_numpy()).max()))
+    print("Max azimuth difference: " + str(azimuth_difference.max()))
+
+    assert np.abs(zenith - spa_zenith.to_numpy()).max() < 0.01
+    assert azimuth_difference.max() < 0.01
+
+
+def test_blocks_are_reused_and_evicted():
+    cache = ephemeris_cache.EphemerisCache(resolution_minutes=5, max_blocks=4)
+    times = pd.date_range("2025-03-01 00:30", periods=72, freq="h")
+
+    cache.lookup(times, 60.2, 24.9)
+    assert cache.stats()["misses"] == 3 and cache.stats()["blocks"] == 3
+
+    # forecast 3 hours later, only the new day is computed
+    cache.lookup(times + pd.Timedelta(hours=3), 60.2, 24.9)
+    assert cache.stats()["misses"] == 4
+
+    cache.lookup(times, 61.5, 23.8)
+    assert len(cache) == 4 and cache.stats()["evictions"] == 3
+
+
+def test_only_requested_span_is_computed(monkeypatch):
+    cache = ephemeris_cache.EphemerisCache()
+
+    computed_points = []
+    compute_points = getattr(cache, "_EphemerisCache__compute_points")
+    monkeypatch.setattr(cache, "_EphemerisCache__compute_points",
+                        lambda *args: computed_points.append(len(args[3])) or compute_points(*args))
+
+    times = pd.date_range("2025-03-01 00:30", periods=68, freq="h")
+    cache.lookup(times, 60.2, 24.9)
+    print(computed_points)
+    assert sum(computed_points) <= 2 * len(times), "Only grid points around requested times should be computed."
+
+    # same hours again are read from the cache
+    cache.lookup(times, 60.2, 24.9)
+    assert sum(computed_points) <= 2 * len(times) and cache.stats()["hits"] == 3
+
+    cache.precompute(60.2, 24.9, "2025-03-05 10:00", "2025-03-05 12:00")
+    assert computed_points[-1] == 121, "Precompute should cover the interval, not the whole day."
+
+
+def test_disabled_by_default_and_toggle_resets_geometry():
+    assert astronomical_calculations.ephemeris_cache is None, "Ephemeris cache should be opt-in."
+
+    times = pd.date_range("2025-06-01", periods=24, freq="h")
+    geometry = astronomical_calculations.get_solar_geometry(times, 60.2, 24.9)
+
+    try:
+        astronomical_calculations.set_ephemeris_cache(True)
+        assert astronomical_calculations.get_solar_geometry(times, 60.2, 24.9) is not geometry, \
+            "Geometry computed before enabling the cache should not be reused."
+        assert astronomical_calculations.ephemeris_cache.stats()["misses"] == 1, "Solar position was not read from the cache."
+    finally:
+        astronomical_calculations.set_ephemeris_cache(False)
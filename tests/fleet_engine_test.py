@@ -0,0 +1,79 @@
+import datetime
+
+import numpy as np
+import pvlib
+
+import fmi_pv_forecaster as pvfc
+from fmi_pv_forecaster import fleet_engine
+from fmi_pv_forecaster import pv_forecaster
+
+"""
+This file contains tests for the vectorized fleet engine. Fleet results should match process_radiation_df() ran
+separately for each system.
+"""
+
+time_start = datetime.datetime(2025, 5, 1)
+time_end = datetime.datetime(2025, 5, 3)
+
+
+def __get_weather(system):
+    data = getattr(pv_forecaster, "__get_clearsky_radiation_for_interval")(time_start, time_end, 60, system)
+    data["T"] = np.linspace(-5, 25, len(data))
+    data["wind"] = np.linspace(0, 8, len(data))
+    return data
+
+
+def test_fleet_matches_process_radiation_df():
+    systems = [pvfc.PVSystem(latitude=60 + i * 0.7, longitude=20 + i, tilt=i * 11, azimuth=(i * 47) % 360,
+                             power_rating=1 + i) for i in range(8)]
+    data = __get_weather(systems[0])
+
+    # altitudes are looked up like in process_radiation_df()
+    fleet = fleet_engine.Fleet.from_systems(systems)
+    fleet_output = fleet_engine.simulate_fleet_df(data, fleet)
+
+    for i, system in enumerate(systems):
+        single_output = pvfc.process_radiation_df(data.copy(), system)["output"].to_numpy()
+        print("System " + str(i) + " max difference: " + str(np.abs(fleet_output[i].to_numpy() - single_output).max()))
+
+        assert np.allclose(fleet_output[i].to_numpy(), single_output, atol=0.05), (
+            "Fleet output differs from process_radiation_df() output for system " + str(i)
+        )
+
+
+def test_altitude_lookup():
+    rng = np.random.default_rng(4)
+    latitudes = np.concatenate([rng.uniform(-90, 90, 40), [90, -90, 60.1, 0]])
+    longitudes = np.concatenate([rng.uniform(-180, 180, 40), [180, -180, 24.9, -30]])
+
+    altitudes = fleet_engine.lookup_altitudes(latitudes, longitudes)
+    expected = [pvlib.location.lookup_altitude(latitude, longitude)
+                for latitude, longitude in zip(latitudes, longitudes)]
+
+    assert np.array_equal(altitudes, expected), "Altitudes differ from pvlib.location.lookup_altitude()."
+
+
+def test_clustered_weather():
+    # 2 weather clusters, 6 systems. weather_index should give the same result as per system weather columns
+    data1 = __get_weather(pvfc.PVSystem(latitude=61, longitude=24))
+    data2 = data1.copy()
+    data2[["dni", "ghi"]] *= 0.5
+    data2["T"] += 10
+
+    fleet = fleet_engine.Fleet(np.linspace(60, 62, 6), np.linspace(22, 26, 6), [10, 20, 30, 40, 50, 60],
+                               [90, 135, 180, 225, 270, 180], [1, 2, 3, 4, 5, 6])
+    weather_index = [0, 1, 0, 1, 0, 1]
+
+    columns = {}
+    for name in ["dni", "dhi", "ghi", "T", "wind"]:
+        columns[name] = np.stack([data1[name].to_numpy(), data2[name].to_numpy()], axis=1)
+
+    clustered = fleet_engine.simulate_fleet(fleet, data1.index, columns["dni"], columns["dhi"], columns["ghi"],
+                                            columns["T"], columns["wind"], weather_index=weather_index, chunk_size=4)
+
+    per_system = {name: values[:, weather_index] for name, values in columns.items()}
+    unclustered = fleet_engine.simulate_fleet(fleet, data1.index, per_system["dni"], per_system["dhi"],
+                                              per_system["ghi"], per_system["T"], per_system["wind"])
+
+    assert clustered.shape == (len(data1), 6)
+    assert np.allclose(clustered, unclustered), "Clustered weather output differs from per system weather output."
@@ -0,0 +1,154 @@
+import datetime
+
+import numpy as np
+
+import fmi_pv_forecaster as pvfc
+from fmi_pv_forecaster import forecast_cache
+from fmi_pv_forecaster import meps_loader
+from fmi_pv_forecaster import pv_forecaster
+
+
+"""
+This file contains tests for the FMI forecast cache.
+"""
+
+start = datetime.datetime(2025, 6, 1, 9)
+end = start + datetime.timedelta(hours=68)
+
+
+def test_model_run_time():
+    run = forecast_cache.model_run_time(datetime.datetime(2025, 6, 1, 13, 41, 12))
+
+    assert run == datetime.datetime(2025, 6, 1, 12), (
+        "Model run time should be floored to 3 hour intervals, got " + str(run)
+    )
+
+
+def test_ttl_and_counters():
+    cache = forecast_cache.ForecastCache(max_entries=4)
+    key = forecast_cache.make_cache_key(60.1, 25.0, start, ["Temperature"])
+
+    assert cache.get(key, start, end, 60) is None, "Empty cache returned data."
+
+    cache.put(key, "data", start, end)
+
+    assert cache.get(key, start, end, 60) == "data", "Cached data was not returned."
+    assert cache.get(key, start, end, -1) is None, "Expired data was returned."
+
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 2 and stats["expirations"] == 1, (
+        "Cache counters were wrong: " + str(stats)
+    )
+
+
+def test_keys_and_windows():
+    cache = forecast_cache.ForecastCache(max_entries=4)
+    key = forecast_cache.make_cache_key(60.1, 25.0, start, ["Temperature"])
+    other_key = forecast_cache.make_cache_key(61.1, 25.0, start, ["Temperature"])
+
+    cache.put(key, "data", start, end)
+
+    assert forecast_cache.make_cache_key(60.100001, 25.0, start, ["Temperature"]) == key, (
+        "Coordinates should be rounded in cache keys."
+    )
+    assert cache.get(other_key, start, end, 60) is None, "Data for another location was returned."
+    assert cache.get(key, start - datetime.timedelta(hours=5), end, 60) is None, (
+        "Data which does not cover the requested window was returned."
+    )
+
+
+def test_lru_eviction():
+    cache = forecast_cache.ForecastCache(max_entries=2)
+    keys = [forecast_cache.make_cache_key(60 + i, 25.0, start, ["Temperature"]) for i in range(3)]
+
+    cache.put(keys[0], 0, start, end)
+    cache.put(keys[1], 1, start, end)
+    # using key 0 makes key 1 the least recently used
+    cache.get(keys[0], start, end, 60)
+    cache.put(keys[2], 2, start, end)
+
+    assert len(cache) == 2, "Cache grew over its size bound."
+    assert cache.get(keys[1], start, end, 60) is None, "Least recently used entry was not evicted."
+    assert cache.get(keys[0], start, end, 60) == 0, "Recently used entry was evicted."
+    assert cache.stats()["evictions"] == 1
+
+
+def test_collect_fmi_opendata_uses_cache_per_site(fake_fmi_download):
+    interval_start = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) - datetime.timedelta(hours=3)
+    interval_end = interval_start + datetime.timedelta(hours=68)
+
+    data1 = meps_loader.collect_fmi_opendata(60.0, 25.0, interval_start, interval_end)
+    meps_loader.collect_fmi_opendata(61.0, 24.0, interval_start, interval_end)
+    data2 = meps_loader.collect_fmi_opendata(60.0, 25.0, interval_start, interval_end)
+
+    assert len(fake_fmi_download) == 2, (
+        "Expected one server call per site, got " + str(len(fake_fmi_download))
+    )
+    assert data1 is data2, "Second call for the first site was not served from cache."
+
+
+def test_multi_site_collection(fake_fmi_download):
+    interval_start = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) - datetime.timedelta(hours=3)
+    interval_end = interval_start + datetime.timedelta(hours=68)
+
+    # first site is cached before the batch call
+    single = meps_loader.collect_fmi_opendata(60.0, 25.0, interval_start, interval_end)
+
+    sites = [(60.0, 25.0), (61.0, 24.0), (62.0, 23.0), (63.0, 22.0), (61.0, 24.0)]
+    frames = meps_loader.collect_fmi_opendata_for_sites(sites, interval_start, interval_end, sites_per_request=2)
+
+    # 1 single site call + 3 new sites in chunks of 2
+    assert len(fake_fmi_download) == 3, "Expected 3 server calls, got " + str(len(fake_fmi_download))
+    assert frames[0] is single, "Cached site was requested again."
+    assert frames[1] is frames[4], "Duplicate sites should share the same forecast."
+
+    for (latitude, longitude), frame in zip(sites, frames):
+        assert len(frame) == 66, "Site forecast had wrong length " + str(len(frame))
+        # generated air temperatures are offset by latitude - 60
+        assert abs(frame["T"].iloc[0] - (15.0 + latitude - 60)) < 1e-9, (
+            "Forecast of another site was returned for site " + str((latitude, longitude))
+        )
+
+
+def test_processed_forecast_cache(fake_fmi_download):
+    cache = pv_forecaster.processed_forecast_cache
+    cache.clear()
+    system = pvfc.PVSystem(latitude=60.2, longitude=24.9, tilt=30, azimuth=180, power_rating=2)
+
+    first = pvfc.get_default_fmi_forecast(system=system)
+    # callers modifying the output must not modify the cached output
+    first["output"] = 0.0
+    hits = cache.stats()["hits"]
+
+    second = pvfc.get_default_fmi_forecast(system=system)
+    pvfc.get_fmi_forecast_at_interpolated_time(second.index[3], system=system)
+
+    assert cache.stats()["hits"] == hits + 2, "Same system and weather should reuse the processed forecast."
+    assert second["output"].max() > 0, "Modifying a returned forecast modified the cached forecast."
+
+    # different parameters are processed separately
+    larger = pvfc.get_default_fmi_forecast(system=system.copy(power_rating=4))
+    assert np.allclose(larger["output"], 2 * second["output"]), "Forecast of another system was returned."
+
+    interpolated = pvfc.get_default_fmi_forecast(interpolate="15min", system=system)
+    assert len(interpolated) > len(second), "Forecast with other interpolation was returned."
+
+    # setters changing model wide settings clear processed forecasts
+    pvfc.set_solar_position_backend("spa")
+    assert len(cache) == 0, "Solar position backend change did not clear processed forecasts."
+
+
+def test_processed_forecast_follows_fmi_cache(fake_fmi_download):
+    system = pvfc.PVSystem(latitude=60.2, longitude=24.9, tilt=30, azimuth=180, power_rating=2)
+
+    pvfc.get_default_fmi_forecast(system=system)
+    misses = pv_forecaster.processed_forecast_cache.stats()["misses"]
+
+    # a new FMI forecast is processed again even though the key is the same
+    meps_loader.clear_cache()
+    pvfc.get_default_fmi_forecast(system=system)
+
+    assert len(fake_fmi_download) == 2
+    assert pv_forecaster.processed_forecast_cache.stats()["misses"] == misses + 1, (
+        "Output of an old FMI forecast was reused."
+    )
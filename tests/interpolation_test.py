@@ -0,0 +1,65 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+
+import fmi_pv_forecaster as pvfc
+
+"""
+This file contains tests for batch interpolation of forecasts at arbitrary times.
+"""
+
+
+def test_matches_pandas_interpolation():
+    # irregular index with a timezone
+    index = pd.DatetimeIndex(["2025-06-01 00:30", "2025-06-01 01:30", "2025-06-01 02:00", "2025-06-01 05:15"], tz="UTC")
+    data = pd.DataFrame({"output": [0.0, 100.0, 250.0, 1000.0], "T": [10.0, 11.0, 12.0, 15.0]}, index=index)
+
+    times = pd.date_range("2025-06-01 00:30", "2025-06-01 05:15", freq="7min", tz="UTC")
+    interpolated = pvfc.interpolate_to_times(data, times[::-1])
+
+    expected = data.reindex(index.union(times)).interpolate(method="time").reindex(times[::-1])
+    print(interpolated.head())
+
+    assert interpolated.index.equals(times[::-1]), "Output should follow the order of query times."
+    assert np.allclose(interpolated.to_numpy(), expected.to_numpy()), "Interpolated values differ from pandas."
+
+
+def test_exact_and_outside_times():
+    index = pd.date_range("2025-06-01 00:30", periods=4, freq="h")
+    data = pd.DataFrame({"output": [np.nan, 100.0, 200.0, 300.0]}, index=index)
+
+    # naive query times are UTC, same as the naive index
+    times = [datetime.datetime(2025, 6, 1, 0), datetime.datetime(2025, 6, 1, 1, 30),
+             datetime.datetime(2025, 6, 1, 2), datetime.datetime(2025, 6, 1, 3, 30),
+             datetime.datetime(2025, 6, 1, 4)]
+
+    output = pvfc.interpolate_to_times(data, times)["output"].to_numpy()
+    print(output)
+
+    assert np.isnan(output[0]) and np.isnan(output[4]), "Times outside the index should be NaN."
+    assert output[1] == 100.0, "Exact match should not be affected by NaN in the previous row."
+    assert output[2] == 150.0
+    assert output[3] == 300.0, "Last index value should be included."
+
+
+def test_empty_dataframe():
+    data = pd.DataFrame({"output": []}, index=pd.DatetimeIndex([], tz="UTC"))
+
+    output = pvfc.interpolate_to_times(data, ["2025-06-01", "2025-06-01 01:00"])
+    print(output)
+
+    assert list(output.columns) == ["output"]
+    assert len(output) == 2 and output["output"].isna().all(), "Empty dataframe should give NaN rows."
+
+
+def test_single_time_matches_batch(fake_fmi_download):
+    system = pvfc.PVSystem(latitude=60.2, longitude=24.9, tilt=30, azimuth=180, power_rating=2)
+    forecast = pvfc.get_default_fmi_forecast(system=system)
+
+    times = forecast.index[2] + pd.to_timedelta(np.arange(0, 600, 7), unit="min")
+    batch = pvfc.get_fmi_forecast_at_interpolated_times(times, system=system)
+
+    for i in [0, 5, 40, 85]:
+        single = pvfc.get_fmi_forecast_at_interpolated_time(times[i].to_pydatetime(), system=system)
+        assert np.isclose(single["output"], batch["output"].iloc[i]), "Single and batch interpolation differ."
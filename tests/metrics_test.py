@@ -0,0 +1,119 @@
+import numpy as np
+import pandas as pd
+
+import fmi_pv_forecaster as pvfc
+from fmi_pv_forecaster import metrics
+
+"""
+This file contains tests for aligning forecasts with measurements and the error metrics.
+"""
+
+
+def test_fmi_half_hour_convention():
+    # hourly FMI style forecast, rows at hh:30
+    forecast = pd.DataFrame({"output": [100.0, 200.0, 300.0]},
+                            index=pd.date_range("2025-06-01 09:30", periods=3, freq="h"))
+
+    # 1 minute samples, value is the hour of the sample
+    times = pd.date_range("2025-06-01 09:00", "2025-06-01 11:59", freq="min")
+    samples = pd.Series(times.hour.to_numpy(dtype=float), index=times)
+
+    aligned = metrics.align_measurements(forecast, samples)
+    print(aligned)
+    assert list(aligned["measured"]) == [9.0, 10.0, 11.0], "hh:30 rows should be compared to hh:00 to hh+1:00."
+
+    # 15 minute means labeled with the end of the period, 10:00 is the mean of 09:45 to 10:00
+    period_end = pd.date_range("2025-06-01 09:15", "2025-06-01 12:00", freq="15min")
+    means = pd.Series((period_end - pd.Timedelta(minutes=15)).hour.to_numpy(dtype=float), index=period_end)
+
+    aligned = metrics.align_measurements(forecast, means, measurement_label="end")
+    assert list(aligned["measured"]) == [9.0, 10.0, 11.0], "Period end labels were not handled."
+
+    # too few measurements for the last hour
+    aligned = metrics.align_measurements(forecast, samples[:-40], measurement_resolution="1min")
+    assert np.isnan(aligned["measured"].iloc[2]), "Hour with less than half of the measurements should be NaN."
+
+
+def test_read_measurements(tmp_path):
+    path = str(tmp_path / "measurements.csv")
+    pd.DataFrame({"timestamp": ["2025-06-01 12:00", "2025-06-01 12:15", "2025-06-01 12:30"],
+                  "power": [1.0, "bad", 3.0]}).to_csv(path, index=False)
+
+    measurements = metrics.read_measurements(path, time_column="timestamp", value_column="power",
+                                             timezone="Europe/Helsinki")
+    print(measurements)
+    assert list(measurements.index) == [pd.Timestamp("2025-06-01 09:00"), pd.Timestamp("2025-06-01 09:30")], \
+        "Local times should be converted to UTC and invalid values dropped."
+
+    path = str(tmp_path / "measurements.parquet")
+    pd.DataFrame({"time": ["2025-06-01T12:00:00+03:00", "2025-06-01T09:15:00Z"], "output": [1.0, 2.0],
+                  "site": ["a", "b"]}).to_parquet(path)
+
+    measurements = metrics.read_measurements(path, site_column="site")
+    assert list(measurements.index) == [pd.Timestamp("2025-06-01 09:00"), pd.Timestamp("2025-06-01 09:15")]
+    assert list(measurements["site"]) == ["a", "b"]
+
+
+def test_metrics_per_site_and_horizon():
+    rng = np.random.default_rng(1)
+
+    # backtest style long table, 2 runs 3 hours apart for 2 sites
+    rows = []
+    for run in [0, 3]:
+        for site in [0, 1]:
+            times = pd.date_range("2025-06-01 00:30", periods=12, freq="h") + pd.Timedelta(hours=run)
+            rows.append(pd.DataFrame({"site": site, "horizon_hours": np.arange(1, 13),
+                                      "output": rng.uniform(0, 1000, 12)}, index=times))
+    forecast = pd.concat(rows)
+
+    times = pd.date_range("2025-06-01 00:00", "2025-06-01 16:00", freq="10min", inclusive="left")
+    measurements = pd.DataFrame({"measured": rng.uniform(0, 1000, 2 * len(times)),
+                                 "site": np.repeat([0, 1], len(times))}, index=times.append(times))
+
+    aligned = metrics.align_measurements(forecast, measurements, measurement_label="start")
+
+    # expected with a plain pandas loop
+    for time, site, measured in zip(aligned.index[::7], aligned["site"].iloc[::7], aligned["measured"].iloc[::7]):
+        site_measurements = measurements[measurements["site"] == site]["measured"]
+        hour_start = time - pd.Timedelta(minutes=30)
+        expected = site_measurements[(site_measurements.index >= hour_start)
+                                     & (site_measurements.index < hour_start + pd.Timedelta(hours=1))].mean()
+        assert np.isclose(measured, expected), "Site measurements were not aligned."
+
+    aligned["clearsky"] = aligned["measured"] + 50
+    horizon_metrics = metrics.get_horizon_metrics(aligned, reference_column="clearsky")
+    print(horizon_metrics)
+
+    error = aligned["output"] - aligned["measured"]
+    expected_rmse = np.sqrt((error ** 2).groupby(aligned["horizon_hours"]).mean())
+    assert np.allclose(horizon_metrics["rmse"], expected_rmse), "Per-horizon rmse differs from pandas."
+    assert (horizon_metrics["count"] == 4).all()
+    assert np.allclose(horizon_metrics["reference_rmse"], 50)
+    assert np.allclose(horizon_metrics["skill"], 1 - expected_rmse / 50)
+
+    total = metrics.compute_metrics(aligned)
+    assert np.isclose(total["bias"].iloc[0], error.mean()) and np.isclose(total["mae"].iloc[0], error.abs().mean())
+
+    by_site = metrics.compute_metrics(aligned, by=["site", "horizon_hours"])
+    assert by_site.index.names == ["site", "horizon_hours"] and len(by_site) == 24
+
+
+def test_clearsky_skill(fake_fmi_download):
+    system = pvfc.PVSystem(latitude=60.2, longitude=24.9, tilt=30, azimuth=180, power_rating=2)
+    forecast = pvfc.get_default_fmi_forecast(system=system)
+
+    # measurements which match the forecast, skill against clear sky should be 1
+    times = pd.date_range(forecast.index[0] - pd.Timedelta(minutes=30), forecast.index[-1], freq="5min")
+    measurements = pd.Series(np.repeat(forecast["output"].to_numpy(), 12)[:len(times)], index=times)
+
+    aligned = metrics.add_clearsky_output(metrics.align_measurements(forecast, measurements, measurement_label="start"),
+                                          system)
+    result = metrics.compute_metrics(aligned, reference_column="clearsky")
+    print(result)
+
+    assert np.isclose(result["rmse"].iloc[0], 0), "Identical measurements should have no error."
+    assert np.isclose(result["skill"].iloc[0], 1)
+    night = aligned.index.hour == 22
+    noon = aligned.index.hour == 10
+    assert (aligned["clearsky"][night] == 0).all() and (aligned["clearsky"][noon] > 0).all(), \
+        "Clear sky output should follow the sun."
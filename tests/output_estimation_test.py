@@ -64,3 +64,32 @@ def test_power_output_estimation_function():
 
 
     print("Power output function is returning values which seem physically possible and reasonable.")
+
+
+def test_array_output_estimation_matches_row_function(monkeypatch):
+    """
+    This function tests that the array version of the output model gives the same values as the row by row version,
+    including the 0.1W threshold and nan handling.
+    """
+
+    random.seed(2)
+    # row function reads the module variable, restored after the test
+    monkeypatch.setattr(output_estimator, "rated_power", 5)
+
+    absorbed_radiation = np.array([random.random() * 1000 for i in range(0, 200)] + [0.0, 0.05, 0.1, np.nan, 500.0])
+    panel_temp = np.array([random.randint(-40, 100) for i in range(0, 200)] + [20, 20, 20, 20, np.nan], dtype=float)
+
+    estimated_outputs = output_estimator.estimate_output_array(absorbed_radiation, panel_temp)
+
+    for i in range(len(absorbed_radiation)):
+        if absorbed_radiation[i] < 0.1 or np.isnan(absorbed_radiation[i]) or np.isnan(panel_temp[i]):
+            expected_output = 0.0
+        else:
+            expected_output = output_estimator.__estimate_output(absorbed_radiation[i], panel_temp[i])
+
+        assert np.isclose(estimated_outputs[i], expected_output, rtol=1e-12, atol=1e-9), (
+            "Array output estimation differs from row by row estimation at index " + str(i) + ": "
+            + str(estimated_outputs[i]) + " != " + str(expected_output)
+        )
+
+    print("Array output estimation matches row by row output estimation.")
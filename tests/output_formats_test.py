@@ -0,0 +1,66 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import fmi_pv_forecaster as pvfc
+
+"""
+This file contains tests for the columnar output formats.
+"""
+
+system = pvfc.PVSystem(latitude=60.2, longitude=24.9, tilt=30, azimuth=180, power_rating=5)
+time_start = datetime.datetime(2025, 6, 1)
+time_end = datetime.datetime(2025, 6, 3)
+
+
+def test_numpy_and_dict_match_dataframe():
+    forecast = pvfc.get_clearsky_estimate_for_interval(time_start, time_end, 60, system=system)
+
+    arrays = pvfc.get_clearsky_estimate_for_interval(time_start, time_end, 60, system=system, output_format="dict")
+    structured = pvfc.get_clearsky_estimate_for_interval(time_start, time_end, 60, system=system,
+                                                         output_format="numpy", columns=["output", "module_temp"])
+
+    assert list(arrays.keys()) == ["time"] + list(forecast.columns)
+    assert np.array_equal(arrays["output"], forecast["output"].to_numpy())
+
+    assert structured.dtype.names == ("time", "output", "module_temp")
+    assert structured["time"][0] == np.datetime64("2025-06-01T00:00")
+    assert np.array_equal(structured["module_temp"], forecast["module_temp"].to_numpy())
+
+
+def test_dict_arrays_are_not_copied():
+    forecast = pvfc.get_clearsky_estimate_for_interval(time_start, time_end, 60, system=system)
+    arrays = pvfc.convert_output(forecast, "dict", ["output"])
+
+    assert np.shares_memory(arrays["output"], forecast["output"].to_numpy())
+
+
+def test_arrow_and_parquet(tmp_path):
+    pytest.importorskip("pyarrow")
+
+    extended_system = system.copy(extended_output=True)
+    forecast = pvfc.get_clearsky_estimate_for_interval(time_start, time_end, 60, system=extended_system)
+
+    table = pvfc.convert_output(forecast, "arrow", ["poa", "output"])
+    assert table.column_names == ["time", "poa", "output"]
+    assert np.array_equal(table.column("poa").to_numpy(), forecast["poa"].to_numpy())
+
+    path = tmp_path / "forecast.parquet"
+    pvfc.write_parquet(forecast, str(path), ["output"])
+    written = pd.read_parquet(path)
+
+    assert list(written.columns) == ["time", "output"]
+    assert np.array_equal(written["output"].to_numpy(), forecast["output"].to_numpy())
+
+
+def test_invalid_columns_and_format():
+    forecast = pvfc.get_clearsky_estimate_for_interval(time_start, time_end, 60, system=system)
+
+    # intermediate columns are only available with extended output
+    with pytest.raises(ValueError):
+        pvfc.convert_output(forecast, "dict", ["poa"])
+
+    with pytest.raises(ValueError):
+        pvfc.convert_output(forecast, "excel")
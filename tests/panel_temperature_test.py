@@ -81,4 +81,33 @@ def test_module_temp():
             "on ambient air temp."
         )
 
-    print("Module temperature equation does not fail in obvious ways.")
\ No newline at end of file
+    print("Module temperature equation does not fail in obvious ways.")
+
+
+def test_module_temp_array():
+    """
+    Tests that the array version of the module temperature equation matches the scalar version and that nans fall back
+    to air temperature.
+    """
+
+    radiation = np.array([random.randrange(0, 1000) for i in range(0, 300)] + [np.nan, 500], dtype=float)
+    wind = np.array([random.randrange(0, 10) for i in range(0, 300)] + [2, np.nan], dtype=float)
+    air_temperature = np.array([random.randrange(-30, 35) for i in range(0, 302)], dtype=float)
+    module_elevation = 7
+
+    module_t = fmi_pv_forecaster.helpers.panel_temperature_estimator.temperature_of_module_array(
+        radiation, wind, module_elevation, air_temperature)
+
+    for i in range(0, 300):
+        expected = fmi_pv_forecaster.helpers.panel_temperature_estimator.temperature_of_module(
+            radiation[i], wind[i], module_elevation, air_temperature[i])
+
+        assert np.isclose(module_t[i], expected, rtol=1e-12), (
+            "Array module temperature " + str(module_t[i]) + " differs from scalar version " + str(expected)
+        )
+
+    assert module_t[300] == air_temperature[300] and module_t[301] == air_temperature[301], (
+        "Module temperature should fall back to air temperature when inputs contain nans."
+    )
+
+    print("Array module temperature equation matches the scalar version.")
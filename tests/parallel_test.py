@@ -0,0 +1,85 @@
+import datetime
+
+import numpy as np
+
+import fmi_pv_forecaster as pvfc
+from fmi_pv_forecaster import parallel
+
+"""
+This file contains tests for the process pool runners. Parallel results should be identical to serial results and in the
+same order regardless of worker count.
+"""
+
+time_start = datetime.datetime(2025, 3, 1)
+time_end = datetime.datetime(2025, 3, 4)
+
+
+def test_systems_in_parallel():
+    systems = [pvfc.PVSystem(latitude=58 + i, longitude=21 + i, tilt=5 * i, azimuth=100 + 15 * i, power_rating=i + 1)
+               for i in range(6)]
+
+    serial = [pvfc.get_clearsky_estimate_for_interval(time_start, time_end, 60, system=system) for system in systems]
+    parallel_results = parallel.get_clearsky_estimates_for_interval(time_start, time_end, systems, 60, max_workers=2,
+                                                                    systems_per_task=2)
+
+    assert len(parallel_results) == len(systems)
+    for forecast1, forecast2 in zip(serial, parallel_results):
+        assert forecast1.index.equals(forecast2.index)
+        assert np.allclose(forecast1["output"], forecast2["output"]), "Parallel output differs from serial output."
+
+
+def test_time_chunks():
+    system = pvfc.PVSystem(latitude=62.5, longitude=25.5, tilt=40, azimuth=200, power_rating=3)
+    long_start = datetime.datetime(2024, 1, 1)
+    long_end = datetime.datetime(2024, 5, 1)
+
+    serial = pvfc.get_clearsky_estimate_for_interval(long_start, long_end, 60, system=system)
+    chunked = parallel.get_clearsky_estimate_in_time_chunks(long_start, long_end, 60, system, max_workers=3,
+                                                            days_per_task=25)
+
+    print(serial.shape, chunked.shape)
+    assert serial.index.equals(chunked.index), "Time chunked forecast has different timestamps."
+    assert np.allclose(serial["output"], chunked["output"]), "Time chunked output differs from serial output."
+
+
+def test_time_chunks_off_grid_timestep():
+    # 30 days is not a multiple of 7 minutes, chunks should still follow the grid of the whole interval
+    system = pvfc.PVSystem(latitude=62.5, longitude=25.5, tilt=40, azimuth=200, power_rating=3)
+    long_start = datetime.datetime(2025, 1, 1, 10, 17)
+    long_end = datetime.datetime(2025, 3, 15)
+
+    serial = pvfc.get_clearsky_estimate_for_interval(long_start, long_end, 7, system=system)
+    chunked = parallel.get_clearsky_estimate_in_time_chunks(long_start, long_end, 7, system, max_workers=2)
+
+    print(serial.shape, chunked.shape)
+    assert serial.index.equals(chunked.index), "Time chunked forecast has different timestamps."
+    assert np.allclose(serial["output"], chunked["output"]), "Time chunked output differs from serial output."
+
+
+def test_fmi_forecasts_in_parallel(fake_fmi_download):
+    systems = [pvfc.PVSystem(latitude=60 + i, longitude=24, tilt=30, azimuth=180, power_rating=2) for i in range(4)]
+
+    forecasts = parallel.get_default_fmi_forecasts(systems, max_workers=2, systems_per_task=1)
+
+    assert len(fake_fmi_download) == 1, "Sites should be downloaded with a single batched server call."
+    for system, forecast in zip(systems, forecasts):
+        single = pvfc.get_default_fmi_forecast(system=system)
+        assert np.allclose(single["output"], forecast["output"]), "Parallel FMI forecast differs from serial forecast."
+
+    interpolated = parallel.get_default_fmi_forecasts(systems[:2], interpolate="15min", upsampling="clearsky_index",
+                                                      max_workers=1)
+    single = pvfc.get_default_fmi_forecast(system=systems[1], interpolate="15min", upsampling="clearsky_index")
+    assert single.index.equals(interpolated[1].index)
+    assert np.allclose(single["output"], interpolated[1]["output"]), "Interpolated parallel forecast differs."
+
+
+def test_radiation_df_in_time_chunks():
+    system = pvfc.PVSystem(latitude=62.5, longitude=25.5, tilt=40, azimuth=200, power_rating=3)
+    radiation = getattr(parallel.pv_forecaster, "__get_clearsky_radiation_for_interval")(
+        datetime.datetime(2024, 4, 1), datetime.datetime(2024, 6, 1), 60, system)
+
+    serial = pvfc.process_radiation_df(radiation.copy(), system)
+    chunked = parallel.process_radiation_df_in_time_chunks(radiation.copy(), system, max_workers=2, days_per_task=7)
+
+    assert serial.index.equals(chunked.index)
+    assert np.allclose(serial["output"], chunked["output"]), "Time chunked output differs from serial output."
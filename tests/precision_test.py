@@ -0,0 +1,81 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import fmi_pv_forecaster as pvfc
+from fmi_pv_forecaster import fleet_engine
+
+"""
+This file contains tests for float32 model precision. Differences to float64 are bounded to 0.01% of nominal power.
+"""
+
+model_columns = ["dni_poa", "dhi_poa", "ghi_poa", "poa", "dni_rc", "dhi_rc", "ghi_rc", "poa_ref_cor", "module_temp",
+                 "output"]
+
+
+def test_float32_matches_float64():
+    system = pvfc.PVSystem(latitude=60.2, longitude=24.9, tilt=30, azimuth=180, power_rating=1, extended_output=True)
+
+    start = datetime.datetime(2025, 3, 1)
+    end = datetime.datetime(2025, 9, 1)
+    forecast64 = pvfc.get_clearsky_estimate_for_interval(start, end, 15, system=system)
+    forecast32 = pvfc.get_clearsky_estimate_for_interval(start, end, 15, system=system.copy(precision="float32"))
+
+    for column in model_columns:
+        assert forecast32[column].dtype == np.float32, column + " is not float32."
+
+    max_difference = np.abs(forecast64["output"] - forecast32["output"].astype(float)).max()
+    print("Max output difference: " + str(max_difference) + "W of 1000W")
+
+    assert max_difference < 0.1
+    assert np.abs(forecast64["module_temp"] - forecast32["module_temp"].astype(float)).max() < 0.01
+    assert forecast32[model_columns].memory_usage().sum() < 0.6 * forecast64[model_columns].memory_usage().sum()
+
+
+def test_fleet_float32_matches_float64():
+    rng = np.random.default_rng(1)
+    fleet = fleet_engine.Fleet(rng.uniform(59, 70, 300), rng.uniform(20, 30, 300), rng.uniform(0, 90, 300),
+                               rng.uniform(90, 270, 300), 5)
+    times = pd.date_range("2025-06-01", periods=72, freq="h", tz="UTC")
+    ghi = rng.uniform(0, 800, 72)
+
+    result64 = fleet_engine.simulate_fleet(fleet, times, ghi, ghi / 4, ghi / 2, extended_output=True)
+    result32 = fleet_engine.simulate_fleet(fleet, times, ghi, ghi / 4, ghi / 2, extended_output=True,
+                                           dtype=np.float32)
+
+    for key in result64:
+        assert result32[key].dtype == np.float32, key + " is not float32."
+
+    # 5kW systems, 0.01% is 0.5W
+    assert np.abs(result64["output"] - result32["output"]).max() < 0.5
+
+
+def test_fleet_float32_transpositions():
+    # transpositions are computed in float64 and rounded once, so float32 poa is within a few float32 steps of float64
+    rng = np.random.default_rng(2)
+    fleet = fleet_engine.Fleet(rng.uniform(59, 70, 200), rng.uniform(20, 30, 200), rng.uniform(0, 90, 200),
+                               rng.uniform(0, 360, 200), 1)
+    times = pd.date_range("2025-03-20", periods=96, freq="15min", tz="UTC")
+    ghi = rng.uniform(0, 900, 96)
+
+    result64 = fleet_engine.simulate_fleet(fleet, times, ghi * 0.7, ghi / 3, ghi, extended_output=True)
+    result32 = fleet_engine.simulate_fleet(fleet, times, ghi * 0.7, ghi / 3, ghi, extended_output=True,
+                                           dtype=np.float32)
+
+    tolerance = 4 * np.spacing(np.float32(result64["poa"].max()))
+    max_difference = np.abs(result64["poa"] - result32["poa"]).max()
+    print("Max poa difference: " + str(max_difference) + " W/m², tolerance " + str(tolerance))
+
+    assert max_difference <= tolerance, "float32 poa differs from float64 poa by more than float32 rounding."
+
+
+def test_invalid_precision():
+    with pytest.raises(ValueError):
+        pvfc.set_precision("float16")
+
+    with pytest.raises(ValueError):
+        pvfc.process_radiation_df(pd.DataFrame({"dni": [0.0], "dhi": [0.0], "ghi": [0.0]},
+                                               index=pd.DatetimeIndex(["2025-06-01"], tz="UTC")),
+                                  pvfc.PVSystem(60.2, 24.9, 30, 180, precision="half"))
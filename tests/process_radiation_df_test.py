@@ -0,0 +1,55 @@
+import datetime
+
+import numpy as np
+
+import fmi_pv_forecaster as pvfc
+from fmi_pv_forecaster import pv_forecaster
+
+"""
+This file contains tests for process_radiation_df() input handling. The input dataframe may be a cached forecast, so it
+must not be modified unless inplace=True is given.
+"""
+
+
+def __get_radiation(system):
+    return getattr(pv_forecaster, "__get_clearsky_radiation_for_interval")(
+        datetime.datetime(2025, 6, 1), datetime.datetime(2025, 6, 3), 60, system)
+
+
+def test_input_not_modified():
+    system = pvfc.PVSystem(latitude=60.2, longitude=24.9, tilt=30, azimuth=180, power_rating=2)
+    data = __get_radiation(system)
+    columns = list(data.columns)
+    ghi = data["ghi"].to_numpy().copy()
+
+    output = pvfc.process_radiation_df(data, system)
+
+    print(columns, list(output.columns))
+    assert list(data.columns) == columns, "Model columns were added to the input dataframe."
+    assert np.array_equal(data["ghi"].to_numpy(), ghi), "Input values were modified."
+    assert "output" in output.columns
+
+
+def test_inplace():
+    system = pvfc.PVSystem(latitude=60.2, longitude=24.9, tilt=30, azimuth=180, power_rating=2)
+    data = __get_radiation(system)
+    expected = pvfc.process_radiation_df(data, system)
+
+    output = pvfc.process_radiation_df(data, system, inplace=True)
+
+    assert "output" in data.columns, "Model columns were not added to the input dataframe."
+    assert np.allclose(output["output"], expected["output"]), "In-place output differs from copied output."
+
+
+def test_cached_forecast_not_modified(fake_fmi_download):
+    system = pvfc.PVSystem(latitude=60.2, longitude=24.9, tilt=30, azimuth=180, power_rating=2, extended_output=True)
+
+    first = pvfc.get_default_fmi_forecast(system=system)
+    radiation = pvfc.get_fmi_radiation_forecast(system)
+    second = pvfc.get_default_fmi_forecast(system=system)
+
+    assert len(fake_fmi_download) == 1, "Forecasts should come from the cache after the first call."
+    assert "dni_poa" not in radiation.columns and "output" not in radiation.columns, (
+        "Model columns ended up in the cached FMI forecast.")
+    assert np.allclose(first["output"], second["output"]), "Second forecast from cache differs from the first."
+    assert np.allclose(second["cloud_cover"], 20), "Cloud cover of FMI data should not be replaced."
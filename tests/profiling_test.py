@@ -0,0 +1,66 @@
+import datetime
+
+import pytest
+
+import fmi_pv_forecaster as pvfc
+from fmi_pv_forecaster import profiling
+from fmi_pv_forecaster import pv_forecaster
+
+"""
+This file contains tests for the per-stage profiling hooks.
+"""
+
+
+@pytest.fixture
+def disable_profiling():
+    yield
+    pvfc.set_profiling(False)
+
+
+def test_model_stages(disable_profiling):
+    records = []
+    pvfc.set_profiling(True, callback=records.append)
+
+    system = pvfc.PVSystem(latitude=60.2, longitude=24.9, tilt=30, azimuth=180, power_rating=2)
+    data = getattr(pv_forecaster, "__get_clearsky_radiation_for_interval")(
+        datetime.datetime(2025, 6, 1), datetime.datetime(2025, 6, 3), 60, system)
+    pvfc.process_radiation_df(data, system)
+
+    stats = pvfc.get_profiling_stats()
+    print(stats)
+
+    for stage in ["solar_geometry", "dni_transposition", "perez", "reflection", "temperature", "output"]:
+        assert stats[stage]["calls"] == 1, "Stage " + stage + " was not recorded once."
+        assert stats[stage]["rows"] == len(data), "Stage " + stage + " has wrong row count."
+        assert stats[stage]["seconds"] >= 0
+
+    assert len(records) == len(stats), "Callback should be called once per stage."
+    assert list(stats.keys()) == [stage for stage in profiling.stages if stage in stats], "Stages not in order."
+
+
+def test_fmi_stages_and_prometheus(fake_fmi_download, disable_profiling):
+    pvfc.set_profiling(True, trace_memory=True)
+
+    system = pvfc.PVSystem(latitude=60.2, longitude=24.9, tilt=30, azimuth=180, power_rating=2)
+    pvfc.get_default_fmi_forecast(interpolate="15min", system=system)
+
+    stats = pvfc.get_profiling_stats()
+    for stage in ["fmi_download", "fmi_parse", "fmi_processing", "interpolation"]:
+        assert stats[stage]["calls"] == 1, "Stage " + stage + " was not recorded."
+
+    assert stats["fmi_download"]["rows"] == 1, "Download rows should be the number of sites."
+    assert stats["fmi_processing"]["allocated_bytes"] > 0, "Allocated bytes were not measured."
+
+    text = pvfc.get_profiling_stats(prometheus=True)
+    print(text)
+    assert 'fmi_pv_forecaster_stage_seconds_total{stage="fmi_download"}' in text
+    assert "# TYPE fmi_pv_forecaster_stage_calls_total counter" in text
+
+
+def test_disabled():
+    pvfc.set_profiling(False)
+
+    with profiling.stage("perez", 10) as record:
+        assert record is None, "Disabled profiling should not create records."
+
+    assert pvfc.get_profiling_stats() == {}
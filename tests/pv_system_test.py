@@ -0,0 +1,104 @@
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import fmi_pv_forecaster as pvfc
+from fmi_pv_forecaster import pv_forecaster
+from fmi_pv_forecaster.helpers import output_estimator
+
+
+"""
+This file contains tests for PVSystem objects and using them instead of the setter functions.
+"""
+
+time_start = datetime.datetime(2025, 6, 1)
+time_end = datetime.datetime(2025, 6, 3)
+
+
+@pytest.fixture
+def restore_default_system(monkeypatch):
+    """
+    Setters change pv_forecaster.default_system in place, tests using them get a copy which is discarded afterwards.
+    """
+    monkeypatch.setattr(pv_forecaster, "default_system", pv_forecaster.default_system.copy())
+    monkeypatch.setattr(output_estimator, "rated_power", output_estimator.rated_power)
+
+
+def test_system_matches_setters(restore_default_system):
+    system = pvfc.PVSystem(latitude=60.2, longitude=24.9, tilt=30, azimuth=180, power_rating=5)
+
+    pvfc.set_location(60.2, 24.9)
+    pvfc.set_angles(30, 180)
+    pvfc.set_nominal_power_kw(5)
+
+    setter_forecast = pvfc.get_clearsky_estimate_for_interval(time_start, time_end, 60)
+    system_forecast = pvfc.get_clearsky_estimate_for_interval(time_start, time_end, 60, system=system)
+
+    assert np.allclose(setter_forecast["output"], system_forecast["output"]), (
+        "PVSystem based forecast differs from setter based forecast."
+    )
+
+
+def test_system_is_not_affected_by_setters(restore_default_system):
+    system = pvfc.PVSystem(latitude=60.2, longitude=24.9, tilt=30, azimuth=180, power_rating=5)
+
+    forecast1 = pvfc.get_clearsky_estimate_for_interval(time_start, time_end, 60, system=system)
+    pvfc.set_angles(90, 0)
+    pvfc.set_nominal_power_kw(100)
+    forecast2 = pvfc.get_clearsky_estimate_for_interval(time_start, time_end, 60, system=system)
+
+    assert np.allclose(forecast1["output"], forecast2["output"]), "Setters changed the output of an explicit system."
+    assert pv_forecaster.default_system.tilt == 90 and system.tilt == 30
+
+
+def test_output_uses_system_air_temperature():
+    # without a module temperature column the output step falls back to the air temperature given to it
+    data = pd.DataFrame({"poa_ref_cor": [800.0, 800.0]})
+
+    cold = output_estimator.add_output_to_df(data.copy(), 5, air_temperature=-10)["output"]
+    warm = output_estimator.add_output_to_df(data.copy(), 5, air_temperature=40)["output"]
+    print(cold.iloc[0], warm.iloc[0])
+
+    assert (cold > warm).all(), "Module temperature fallback did not use the given air temperature."
+
+
+def test_concurrent_forecasts():
+    systems = [pvfc.PVSystem(latitude=55 + i, longitude=20 + i, tilt=10 * i, azimuth=90 + 20 * i, power_rating=i + 1)
+               for i in range(8)]
+
+    sequential = [pvfc.get_clearsky_estimate_for_interval(time_start, time_end, 30, system=system)
+                  for system in systems]
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        concurrent = list(executor.map(
+            lambda system: pvfc.get_clearsky_estimate_for_interval(time_start, time_end, 30, system=system), systems))
+
+    for forecast1, forecast2 in zip(sequential, concurrent):
+        assert np.allclose(forecast1["output"], forecast2["output"]), (
+            "Concurrent forecast differs from sequential forecast."
+        )
+
+
+def test_site_matches_single_arrays():
+    site = pvfc.PVSite(latitude=61.5, longitude=23.8, albedo=0.2)
+    site.add_array(45, 180, 4, name="south")
+    site.add_array(90, 270, 2)
+    site.add_array(15, 90, 1.5, name="east")
+
+    site_forecast = pvfc.get_clearsky_estimate_for_interval_for_site(time_start, time_end, site, 30)
+
+    total = 0
+    for array, name in zip(site.arrays, ["south", "array_1", "east"]):
+        system = pvfc.PVSystem(latitude=61.5, longitude=23.8, tilt=array.tilt, azimuth=array.azimuth,
+                               power_rating=array.power_rating, albedo=0.2)
+        single = pvfc.get_clearsky_estimate_for_interval(time_start, time_end, 30, system=system)
+
+        assert np.allclose(site_forecast["output_" + name], single["output"]), (
+            "Site array " + name + " differs from single array forecast."
+        )
+        total = total + single["output"]
+
+    assert np.allclose(site_forecast["output"], total), "Site output is not the sum of array outputs."
@@ -0,0 +1,71 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import fmi_pv_forecaster as pvfc
+from fmi_pv_forecaster import pv_forecaster
+from fmi_pv_forecaster.helpers import astronomical_calculations
+
+"""
+This file contains tests for the selectable solar position backends. Angle bounds are the ones documented in
+astronomical_calculations.py.
+"""
+
+
+@pytest.fixture
+def reset_backend():
+    yield
+    pvfc.set_solar_position_backend("spa")
+
+
+def __get_spa_position(times, latitude, longitude):
+    pvfc.set_solar_position_backend("spa")
+    return astronomical_calculations.get_solar_azimuth_zenith_fast(times, latitude, longitude)
+
+
+@pytest.mark.parametrize("backend", ["ephemeris", "analytical"])
+def test_backend_angle_bounds(backend, reset_backend):
+    # 2 years with 10 minute steps, far north so that the sun crosses north during summer nights
+    times = pd.date_range("2025-01-01", "2027-01-01", freq="10min", tz="UTC")
+
+    for latitude, longitude in [(69.9, 27.0), (60.2, 24.9), (-30.0, 150.0)]:
+        spa_azimuth, spa_zenith = __get_spa_position(times, latitude, longitude)
+
+        pvfc.set_solar_position_backend(backend)
+        azimuth, zenith = astronomical_calculations.get_solar_azimuth_zenith_fast(times, latitude, longitude)
+
+        # near the horizon refraction differs as only SPA uses site altitude
+        sun_up = (spa_zenith < 85).to_numpy()
+        zenith_difference = np.abs(zenith - spa_zenith).to_numpy()[sun_up].max()
+        azimuth_difference = np.abs((azimuth - spa_azimuth + 180) % 360 - 180).to_numpy()[sun_up].max()
+
+        print(backend + " at " + str(latitude) + ", zenith difference: " + str(zenith_difference)
+              + ", azimuth difference: " + str(azimuth_difference))
+
+        assert zenith_difference < 0.03, "Zenith of " + backend + " differs too much from SPA."
+        assert azimuth_difference < 0.03, "Azimuth of " + backend + " differs too much from SPA."
+
+
+@pytest.mark.parametrize("backend", ["ephemeris", "analytical"])
+def test_backend_output_difference(backend, reset_backend):
+    system = pvfc.PVSystem(latitude=60.2, longitude=24.9, tilt=30, azimuth=180, power_rating=1)
+    data = pv_forecaster.__get_clearsky_radiation_for_interval(datetime.datetime(2025, 6, 18),
+                                                               datetime.datetime(2025, 6, 21), 60, system)
+
+    pvfc.set_solar_position_backend("spa")
+    spa_output = pvfc.process_radiation_df(data.copy(), system)["output"]
+
+    pvfc.set_solar_position_backend(backend)
+    output = pvfc.process_radiation_df(data.copy(), system)["output"]
+
+    max_difference = np.abs(output - spa_output).max()
+    print(backend + " max output difference: " + str(max_difference) + "W of 1000W")
+
+    assert max_difference < 1, "Output with " + backend + " differs over 0.1% of nominal power from SPA."
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        pvfc.set_solar_position_backend("fastest")
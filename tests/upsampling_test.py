@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import fmi_pv_forecaster as pvfc
+from fmi_pv_forecaster import clearsky_engine
+from fmi_pv_forecaster import upsampling
+from fmi_pv_forecaster.helpers import astronomical_calculations
+
+"""
+This file contains tests for upsampling hourly radiation forecasts. Hourly data is generated by averaging a 1 minute
+reference with slowly changing cloudiness, and upsampled data is compared to the reference.
+"""
+
+latitude = 60.2
+longitude = 24.9
+
+
+def __get_reference(day):
+    times = pd.date_range(day, periods=3 * 1440, freq="1min")
+    geometry = astronomical_calculations.get_solar_geometry(times, latitude, longitude)
+    clearsky = clearsky_engine.ClearskyEngine().get_clearsky_for_geometry(geometry)
+    cos_zenith = np.clip(np.cos(np.radians(geometry.solar_apparent_zenith.to_numpy())), 0, 1)
+
+    clearsky_index = 0.55 + 0.35 * np.sin(np.arange(len(times)) / 1440 * 2 * np.pi * 1.7)
+    ghi = clearsky["ghi"].to_numpy() * clearsky_index
+    beam = np.minimum(clearsky["dni"].to_numpy() * np.clip(clearsky_index - 0.2, 0, None) / 0.8 * cos_zenith, ghi)
+
+    reference = pd.DataFrame({"ghi": ghi, "dhi": ghi - beam, "T": 10.0}, index=times)
+
+    # FMI style hourly means with hh:30 timestamps and dni from beam at the middle of the hour
+    hourly = reference.resample("1h").mean()
+    hourly.index = hourly.index + pd.Timedelta(minutes=30)
+    hourly_geometry = astronomical_calculations.get_solar_geometry(hourly.index, latitude, longitude)
+    hourly_cos_zenith = np.cos(np.radians(hourly_geometry.solar_apparent_zenith.to_numpy()))
+    hourly["dni"] = np.where(hourly_cos_zenith > 0.01, (hourly["ghi"] - hourly["dhi"]) / hourly_cos_zenith, 0)
+
+    return reference, hourly
+
+
+@pytest.mark.parametrize("day", ["2025-03-20", "2025-06-20"])
+def test_clearsky_index_closer_to_reference(day):
+    reference, hourly = __get_reference(day)
+
+    errors = {}
+    for method in upsampling.upsampling_methods:
+        upsampled = upsampling.upsample_radiation(hourly, "1min", latitude, longitude, method)
+        errors[method] = np.sqrt(((upsampled["ghi"] - reference["ghi"].reindex(upsampled.index)) ** 2).mean())
+
+    print(day, errors)
+    assert errors["clearsky_index"] < 0.8 * errors["linear"], "Clear sky index upsampling should be more accurate."
+
+
+def test_components_add_up():
+    reference, hourly = __get_reference("2025-06-20")
+    upsampled = upsampling.upsample_radiation(hourly, "5min", latitude, longitude)
+
+    geometry = astronomical_calculations.get_solar_geometry(upsampled.index, latitude, longitude)
+    cos_zenith = np.clip(np.cos(np.radians(geometry.solar_apparent_zenith.to_numpy())), 0, 1)
+
+    assert list(upsampled.columns) == list(hourly.columns), "Columns should stay the same."
+    assert (upsampled[["ghi", "dni", "dhi"]] >= 0).all().all(), "Upsampled irradiance was negative."
+    assert np.allclose(upsampled["dhi"] + upsampled["dni"] * cos_zenith, upsampled["ghi"]), (
+        "Upsampled components do not add up to ghi.")
+
+
+def test_resolution_and_method_checks():
+    reference, hourly = __get_reference("2025-06-20")
+
+    with pytest.raises(ValueError):
+        upsampling.upsample_radiation(hourly, "30s", latitude, longitude)
+    with pytest.raises(ValueError):
+        upsampling.upsample_radiation(hourly, "5min", latitude, longitude, "cubic")
+
+
+def test_fmi_forecast_upsampling(fake_fmi_download):
+    system = pvfc.PVSystem(latitude=latitude, longitude=longitude, tilt=30, azimuth=180, power_rating=2)
+
+    linear = pvfc.get_default_fmi_forecast(interpolate="5min", system=system)
+    upsampled = pvfc.get_default_fmi_forecast(interpolate="5min", system=system, upsampling="clearsky_index")
+
+    assert upsampled.index.equals(linear.index), "Upsampling methods should return the same timestamps."
+    assert (upsampled["output"] >= 0).all()
+    assert not np.allclose(upsampled["output"], linear["output"]), "Upsampling method was not used."
+
+
+def test_geometry_is_passed_to_pv_model(monkeypatch):
+    reference, hourly = __get_reference("2025-06-20")
+    system = pvfc.PVSystem(latitude=latitude, longitude=longitude, tilt=30, azimuth=180, power_rating=2)
+
+    upsampled, geometry = upsampling.upsample_radiation(hourly, "5min", latitude, longitude, return_geometry=True)
+    expected = pvfc.process_radiation_df(upsampled, system)
+
+    # another caller computing solar position in between must not matter, the PV model should not compute it at all
+    astronomical_calculations.get_solar_geometry(hourly.index, latitude, longitude)
+    monkeypatch.setattr(astronomical_calculations, "get_solar_geometry", None)
+
+    output = pvfc.process_radiation_df(upsampled, system, geometry=geometry)
+    assert np.allclose(output["output"], expected["output"]), "Output with given geometry differs."
+
+    with pytest.raises(ValueError):
+        pvfc.process_radiation_df(hourly, system, geometry=geometry)
@@ -0,0 +1,54 @@
+import datetime
+import re
+
+import numpy as np
+from fmiopendata.multipoint import MultiPoint
+
+from conftest import generate_fmi_xml
+from fmi_pv_forecaster import meps_loader
+from fmi_pv_forecaster import wfs_parser
+
+"""
+This file contains tests for the streaming multipointcoverage parser. Results are compared to fmiopendata.
+"""
+
+start_time = datetime.datetime(2025, 6, 1, 0)
+sites = [(60.1, 24.9), (61.5, 23.8), (65.0, 25.5)]
+
+
+def __without_metadata_links(xml: bytes) -> bytes:
+    # fmiopendata reads parameter names from swe:label when fields have no xlink, avoids metadata server calls
+    return re.sub(rb'<swe:field name="(\w+)" xlink:href="[^"]*"/>',
+                  rb'<swe:field name="\1"><swe:Quantity><swe:label>\1</swe:label><swe:uom code="x"/></swe:Quantity>'
+                  rb'</swe:field>', xml)
+
+
+def test_parser_matches_fmiopendata():
+    xml = generate_fmi_xml(sites, start_time, hours=48)
+
+    coverage = wfs_parser.parse_multipointcoverage(xml)
+    reference = MultiPoint(__without_metadata_links(xml), meps_loader.collection_string)
+
+    assert len(coverage) == 48 * len(sites)
+    assert coverage.location_names == list(reference.location_metadata.keys())
+
+    for name in coverage.location_names:
+        times, columns = coverage.get_location(name)
+        reference_times = sorted(time for time in reference.data if name in reference.data[time])
+
+        assert list(times.astype(datetime.datetime)) == reference_times
+        for parameter in meps_loader.parameters:
+            reference_values = [reference.data[time][name][parameter]["value"] for time in reference_times]
+            assert np.allclose(columns[parameter], reference_values), parameter + " values differ from fmiopendata."
+
+
+def test_missing_values_and_empty_response():
+    xml = generate_fmi_xml(sites[:1], start_time, hours=3)
+    # first value of the first row is the temperature
+    xml = re.sub(rb"<gml:doubleOrNilReasonTupleList>[0-9.]+ ", b"<gml:doubleOrNilReasonTupleList>NaN ", xml)
+
+    coverage = wfs_parser.parse_multipointcoverage(xml)
+    assert np.isnan(coverage.columns["Temperature"][0]) and not np.isnan(coverage.columns["Temperature"][1:]).any()
+
+    empty = wfs_parser.parse_multipointcoverage(generate_fmi_xml([], start_time))
+    assert len(empty) == 0 and empty.location_names == []